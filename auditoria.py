@@ -0,0 +1,159 @@
+"""
+Auditoria do Painel Preço Parceiro — um comando para todos os relatórios.
+
+Carrega a Fact (snapshot local, Databricks ou agregada com --pushdown) e a
+planilha do formulário uma única vez e roda os relatórios de
+validar_formularios.py, consulta_auditoria.py e diagnostico_totais.py sobre
+os mesmos DataFrames em memória.
+
+Uso:
+  python auditoria.py all
+  python auditoria.py validar --excel "C:/caminho/para/Projeto Preço Parceiro.xlsx"
+  python auditoria.py consulta --offline
+  python auditoria.py diagnostico --pushdown
+  python auditoria.py all --profile          # relatório de tempo/memória por etapa (perfil.py)
+  python auditoria.py all --assincrono       # Fact em segundo plano enquanto lê a planilha
+  python auditoria.py all --distintas        # formulário como RespostasFormularioDistintasOS
+"""
+
+import os
+import sys
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(__file__))
+import perfil  # noqa: E402
+from perfil import etapa  # noqa: E402
+from validar_formularios import (  # noqa: E402
+    load_fact_data, load_fact_agregada, load_formulario, adicionar_argumentos_fact, opcoes_fact,
+    run_validation, em_segundo_plano, aguardar,
+)
+from consulta_auditoria import run_consulta  # noqa: E402
+from diagnostico_totais import run_diagnostico  # noqa: E402
+
+
+def carregar_dados(args):
+    """
+    Fact + formulário carregados uma vez para todos os relatórios.
+
+    Com --assincrono a Fact é carregada em segundo plano enquanto a planilha é lida.
+    """
+    from consultas import COLUNAS_AUDITORIA
+
+    dados = {"col_itens": None, "os_por_uf": None}
+    opcoes = opcoes_fact(args)
+    if args.pushdown:
+        carregar_fact = load_fact_agregada
+    else:
+        carregar_fact = load_fact_data
+        opcoes["colunas"] = COLUNAS_AUDITORIA
+
+    if args.assincrono:
+        with em_segundo_plano(carregar_fact, **opcoes) as futuro:
+            with etapa("carga.formulario"):
+                dados["form"] = load_formulario(args.excel, distintas=args.distintas)
+            with etapa("carga.fact"):
+                fact = aguardar(futuro)
+    else:
+        with etapa("carga.fact"):
+            fact = carregar_fact(**opcoes)
+        with etapa("carga.formulario"):
+            dados["form"] = load_formulario(args.excel, distintas=args.distintas)
+
+    if args.pushdown:
+        dados["fact"] = fact["os_cliente"]
+        dados["col_itens"] = "Itens"
+        dados["os_por_uf"] = dict(zip(fact["uf"]["UFEC"], fact["uf"]["OSDistintas"]))
+    else:
+        dados["fact"] = fact
+    return dados
+
+
+def relatorio_validar(dados):
+    run_validation(dados["fact"], dados["form"], col_itens=dados["col_itens"])
+
+
+def relatorio_consulta(dados):
+    if dados["form"] is None:
+        print("\n❌ Consulta direta: sem formulário. Pulando.")
+        return
+    run_consulta(dados["fact"], dados["form"], dados["os_por_uf"])
+
+
+def relatorio_diagnostico(dados):
+    if dados["form"] is None:
+        print("\n❌ Diagnóstico: sem formulário. Pulando.")
+        return
+    run_diagnostico(dados["fact"], dados["form"])
+
+
+RELATORIOS = {
+    "validar": relatorio_validar,
+    "consulta": relatorio_consulta,
+    "diagnostico": relatorio_diagnostico,
+}
+
+
+def main():
+    comum = argparse.ArgumentParser(add_help=False)
+    comum.add_argument(
+        "--excel",
+        type=str,
+        default=None,
+        help='Caminho para o arquivo "Projeto Preço Parceiro.xlsx" (opcional)',
+    )
+    comum.add_argument(
+        "--distintas",
+        action="store_true",
+        help="Usa o formulário como RespostasFormularioDistintasOS (sem OS de teste, última resposta por OS)",
+    )
+    comum.add_argument(
+        "--pushdown",
+        action="store_true",
+        help="Agrega a Fact no Databricks e traz só os pares OS×cliente (ver pushdown.py)",
+    )
+    comum.add_argument(
+        "--assincrono",
+        action="store_true",
+        help="Carrega a Fact em segundo plano enquanto lê a planilha (Ctrl-C cancela a query)",
+    )
+    adicionar_argumentos_fact(comum)
+    perfil.adicionar_argumento(comum)
+
+    parser = argparse.ArgumentParser(description="Auditoria do Painel Preço Parceiro")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    sub.add_parser("validar", parents=[comum], help="COUNT vs DISTINCTCOUNT por cliente (validar_formularios.py)")
+    sub.add_parser("consulta", parents=[comum], help="Formulários por cliente sem multiplicação (consulta_auditoria.py)")
+    sub.add_parser("diagnostico", parents=[comum], help="OS compartilhadas entre clientes (diagnostico_totais.py)")
+    sub.add_parser("all", parents=[comum], help="Todos os relatórios com uma única carga")
+    args = parser.parse_args()
+
+    with perfil.sessao(args.profile, f"auditoria-{args.comando}"):
+        print("=" * 80)
+        print("  AUDITORIA — Painel Preço Parceiro")
+        print(f"  {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
+        print("=" * 80)
+
+        try:
+            dados = carregar_dados(args)
+            comandos = list(RELATORIOS) if args.comando == "all" else [args.comando]
+            for comando in comandos:
+                with etapa(f"relatorio.{comando}"):
+                    RELATORIOS[comando](dados)
+
+        except KeyboardInterrupt:
+            print("\n⛔ Interrompido.")
+            sys.exit(130)
+        except ImportError as e:
+            print(f"\n❌ Dependência faltando: {e}")
+            print("   Instale com: pip install databricks-sql-connector pandas pyarrow openpyxl")
+            sys.exit(1)
+        except Exception as e:
+            print(f"\n❌ Erro: {e}")
+            import traceback
+            traceback.print_exc()
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Benchmark offline dos relatórios sobre dados sintéticos (dados_sinteticos.py).
+
+Para cada tamanho da Fact (padrão: 100k, 1M e 10M itens) gera a Fact e o
+formulário, monta o DataFrame tipado (esquema.para_pandas) e cronometra:
+  validar       run_validation (COUNT vs DISTINCTCOUNT por cliente)
+  consulta      run_consulta (formulários por cliente/UF)
+  diagnostico   run_diagnostico (OS compartilhadas entre clientes)
+  medidas       avaliar_medidas por cliente (medidas DAX do visual)
+
+Cada tamanho roda em um processo separado, para que o pico de memória
+(RSS) de um não contamine o do seguinte. As medidas vêm do perfil.py:
+tempo de parede/CPU, itens por segundo e pico de RSS (com --tracemalloc,
+também o pico de alocações Python por etapa, ao custo de deixar tudo mais
+lento). O pico de RSS também é medido por etapa (pico_rss_etapa): no Linux
+o pico do kernel é zerado antes de cada uma; nos demais sistemas o RSS é
+amostrado durante a etapa. Não precisa de Databricks nem da planilha.
+
+Uso:
+  python benchmark.py
+  python benchmark.py --tamanhos 100000 1000000 --saida baseline.json
+  python benchmark.py --comparar baseline.json
+"""
+
+import os
+import sys
+import io
+import json
+import argparse
+import subprocess
+import threading
+from contextlib import contextmanager, redirect_stdout
+
+sys.path.insert(0, os.path.dirname(__file__))
+from perfil import PERFIL, etapa, _mb, _memoria_processo  # noqa: E402
+
+TAMANHOS_PADRAO = (100_000, 1_000_000, 10_000_000)
+RELATORIOS = ("validar", "consulta", "diagnostico", "medidas")
+INTERVALO_AMOSTRA_S = 0.005
+
+
+def _zerar_pico_rss():
+    """Zera o pico de RSS do processo (VmHWM, Linux); False se não der."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def _pico_rss_linux():
+    with open("/proc/self/status") as f:
+        for linha in f:
+            if linha.startswith("VmHWM:"):
+                return int(linha.split()[1]) * 1024
+    return None
+
+
+@contextmanager
+def pico_rss(medidas):
+    """
+    Pico de RSS do bloco em medidas["pico_rss_etapa_mb"]: com o pico do kernel
+    zerado na entrada (Linux) ou, sem isso, amostrando o RSS numa thread.
+    """
+    if _zerar_pico_rss():
+        try:
+            yield
+        finally:
+            medidas["pico_rss_etapa_mb"] = _mb(_pico_rss_linux())
+        return
+
+    amostras = [_memoria_processo()[0] or 0]
+    parar = threading.Event()
+
+    def amostrar():
+        while not parar.wait(INTERVALO_AMOSTRA_S):
+            amostras.append(_memoria_processo()[0] or 0)
+
+    thread = threading.Thread(target=amostrar, name="pico_rss", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        parar.set()
+        thread.join()
+        amostras.append(_memoria_processo()[0] or 0)
+        medidas["pico_rss_etapa_mb"] = _mb(max(amostras))
+
+
+def _relatorios():
+    from validar_formularios import run_validation
+    from consulta_auditoria import run_consulta
+    from diagnostico_totais import run_diagnostico
+    from medidas import avaliar_medidas
+
+    return {
+        "validar": lambda fact, form: run_validation(fact, form),
+        "consulta": lambda fact, form: run_consulta(fact, form),
+        "diagnostico": lambda fact, form: run_diagnostico(fact, form),
+        "medidas": lambda fact, form: avaliar_medidas(fact, ("NomeCliente",)),
+    }
+
+
+def medir_tamanho(linhas, semente=42, usar_tracemalloc=False):
+    """Gera os dados de um tamanho, roda cada relatório e devolve as medidas."""
+    from dados_sinteticos import gerar_fact, gerar_formulario
+    from esquema import para_pandas
+
+    relatorios = _relatorios()
+    PERFIL.ativar(usar_tracemalloc=usar_tracemalloc)
+    try:
+        with etapa("geracao") as medidas, pico_rss(medidas):
+            tabela = gerar_fact(linhas, semente=semente)
+            df_form = gerar_formulario(tabela, semente=semente)
+        with etapa("dataframe.total") as medidas, pico_rss(medidas):
+            df_fact = para_pandas(tabela)
+        del tabela
+        for nome in RELATORIOS:
+            # a saída dos relatórios é descartada: só interessa o tempo
+            with etapa(f"relatorio.{nome}") as medidas, pico_rss(medidas), redirect_stdout(io.StringIO()):
+                relatorios[nome](df_fact, df_form)
+    finally:
+        relatorio = PERFIL.relatorio("benchmark")
+        PERFIL.desativar()
+
+    etapas = {r["nome"]: r for r in relatorio["etapas"] if r["nivel"] == 0}
+    # Zerar o pico do kernel também zera o do processo: o pico total é o
+    # maior entre as etapas
+    picos = [r["pico_rss_etapa_mb"] for r in etapas.values() if r.get("pico_rss_etapa_mb") is not None]
+    picos.append(relatorio["total"]["pico_rss_mb"] or 0)
+    resultado = {
+        "linhas": linhas,
+        "respostas_formulario": len(df_form),
+        "memoria_df_mb": _mb(int(df_fact.memory_usage(deep=True).sum())),
+        "etapas": {},
+        "pico_rss_mb": max(picos),
+    }
+    for nome, registro in etapas.items():
+        nome = nome.removeprefix("relatorio.").removesuffix(".total")
+        medidas = {
+            "parede_s": registro["parede_s"],
+            "cpu_s": registro["cpu_s"],
+            "itens_por_s": round(linhas / registro["parede_s"]) if registro["parede_s"] else None,
+            "rss_mb": registro["rss_mb"],
+            "pico_rss_mb": registro.get("pico_rss_etapa_mb"),
+        }
+        if "pico_tracemalloc_mb" in registro:
+            medidas["pico_tracemalloc_mb"] = registro["pico_tracemalloc_mb"]
+        resultado["etapas"][nome] = medidas
+    return resultado
+
+
+def _medir_em_processo(linhas, semente, usar_tracemalloc):
+    comando = [sys.executable, os.path.abspath(__file__), "--filho", str(linhas), "--semente", str(semente)]
+    if usar_tracemalloc:
+        comando.append("--tracemalloc")
+    saida = subprocess.run(comando, capture_output=True, text=True)
+    if saida.returncode != 0:
+        raise RuntimeError(f"Benchmark de {linhas:,} linhas falhou:\n{saida.stderr.strip()}")
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def imprimir_tabela(resultados, referencia=None):
+    colunas = ["geracao", "dataframe"] + list(RELATORIOS)
+    print(f"\n{'Itens':>12s}  " + "  ".join(f"{c:>12s}" for c in colunas) + f"  {'Pico RSS':>10s}")
+    print("-" * (14 + 14 * len(colunas) + 12))
+    anteriores = {r["linhas"]: r for r in (referencia or [])}
+    for r in resultados:
+        celulas = []
+        for c in colunas:
+            segundos = r["etapas"][c]["parede_s"]
+            base = anteriores.get(r["linhas"], {}).get("etapas", {}).get(c)
+            if base and base["parede_s"]:
+                celulas.append(f"{segundos:6.2f}s {segundos / base['parede_s'] - 1:+4.0%}")
+            else:
+                celulas.append(f"{segundos:11.2f}s")
+        pico = r["pico_rss_mb"]
+        print(f"{r['linhas']:>12,}  " + "  ".join(f"{c:>12s}" for c in celulas) + f"  {pico or 0:>7,.0f} MB")
+
+    print("\n  Pico de RSS por etapa (MB):")
+    print(f"{'Itens':>12s}  " + "  ".join(f"{c:>12s}" for c in colunas))
+    for r in resultados:
+        celulas = []
+        for c in colunas:
+            pico = r["etapas"][c].get("pico_rss_mb")
+            base = anteriores.get(r["linhas"], {}).get("etapas", {}).get(c, {}).get("pico_rss_mb")
+            if pico is None:
+                celulas.append("-")
+            elif base:
+                celulas.append(f"{pico:6,.0f} {pico / base - 1:+4.0%}")
+            else:
+                celulas.append(f"{pico:12,.0f}")
+        print(f"{r['linhas']:>12,}  " + "  ".join(f"{c:>12s}" for c in celulas))
+
+    print("\n  Itens/s por relatório:")
+    for r in resultados:
+        taxas = ", ".join(f"{c} {r['etapas'][c]['itens_por_s'] or 0:,}" for c in RELATORIOS)
+        print(f"   {r['linhas']:>12,}: {taxas}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline dos relatórios de auditoria")
+    parser.add_argument(
+        "--tamanhos", type=int, nargs="+", default=list(TAMANHOS_PADRAO),
+        help="Itens da Fact sintética (padrão: 100000 1000000 10000000)",
+    )
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--tracemalloc", action="store_true", help="Mede também o pico de alocações Python por etapa")
+    parser.add_argument("--saida", type=str, default=None, help="Grava os resultados em JSON")
+    parser.add_argument("--comparar", type=str, default=None, help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--filho", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho is not None:
+        print(json.dumps(medir_tamanho(args.filho, args.semente, args.tracemalloc)))
+        return
+
+    print("=" * 80)
+    print("  BENCHMARK — relatórios sobre dados sintéticos")
+    print("=" * 80)
+    resultados = []
+    for linhas in sorted(args.tamanhos):
+        print(f"\n⏳ {linhas:,} itens...", flush=True)
+        resultado = _medir_em_processo(linhas, args.semente, args.tracemalloc)
+        total = sum(e["parede_s"] for e in resultado["etapas"].values())
+        print(f"   ✅ {total:.1f}s, DataFrame {resultado['memoria_df_mb']:,} MB, pico RSS {resultado['pico_rss_mb']:,} MB")
+        resultados.append(resultado)
+
+    referencia = None
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            referencia = json.load(f)["resultados"]
+    imprimir_tabela(resultados, referencia)
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": sys.version.split()[0],
+                "semente": args.semente,
+                "tracemalloc": args.tracemalloc,
+                "resultados": resultados,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Resultados em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Cache local (Parquet) do extrato da FactAprovacaoPrecoParceiro.
+
+O snapshot é identificado por um hash do texto da query + HTTP_PATH do
+warehouse (+ valores dos bind parameters, se houver), então qualquer mudança
+na query ou no warehouse gera um snapshot novo. Cada snapshot tem um arquivo
+.parquet e um .json de metadados; ambos são gravados em arquivo temporário e
+renomeados (os.replace), então uma execução interrompida nunca deixa um
+snapshot pela metade. Ao atualizar a Fact, a versão substituída fica como
+<chave>.anterior (ver diff_snapshot.py).
+
+Diretório: ~/.cache/painel-preco-parceiro (ou variável PAINEL_PP_CACHE).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+from perfil import etapa
+
+DIRETORIO_CACHE = os.environ.get(
+    "PAINEL_PP_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "painel-preco-parceiro"),
+)
+TTL_HORAS_PADRAO = 12
+SUFIXO_ANTERIOR = ".anterior"
+
+
+class SnapshotIndisponivel(RuntimeError):
+    """Modo --offline sem snapshot local para a query pedida."""
+
+
+def chave_snapshot(query, http_path, parametros=None):
+    """Hash estável da query + warehouse (+ bind parameters), usado como nome do snapshot."""
+    h = hashlib.sha256()
+    h.update(http_path.encode("utf-8"))
+    h.update(b"\0")
+    h.update(query.strip().encode("utf-8"))
+    if parametros:
+        h.update(b"\0")
+        h.update(json.dumps(parametros, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()[:20]
+
+
+def _caminhos(chave, diretorio=None):
+    base = os.path.join(diretorio or DIRETORIO_CACHE, chave)
+    return base + ".parquet", base + ".json"
+
+
+def caminho_snapshot(chave, diretorio=None):
+    """Caminho do .parquet do snapshot (exista ou não)."""
+    return _caminhos(chave, diretorio)[0]
+
+
+def ler_metadados(chave, diretorio=None):
+    """
+    Lê o .json do snapshot; None se não existir. Um .json sem o .parquet
+    (dados apagados à mão, disco limpo) conta como snapshot ausente.
+    """
+    caminho_dados, caminho_meta = _caminhos(chave, diretorio)
+    if not (os.path.exists(caminho_meta) and os.path.exists(caminho_dados)):
+        return None
+    with open(caminho_meta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def procurar_snapshots(criterio, diretorio=None):
+    """(chave, metadados) dos snapshots do cache cujos metadados satisfazem criterio(meta)."""
+    diretorio = diretorio or DIRETORIO_CACHE
+    if not os.path.isdir(diretorio):
+        return []
+    encontrados = []
+    for arquivo in sorted(os.listdir(diretorio)):
+        chave, ext = os.path.splitext(arquivo)
+        if ext != ".json" or chave.startswith(".") or chave.endswith(SUFIXO_ANTERIOR):
+            continue
+        meta = ler_metadados(chave, diretorio)
+        if meta is not None and criterio(meta):
+            encontrados.append((chave, meta))
+    return encontrados
+
+
+def ler_snapshot(chave, diretorio=None, colunas=None):
+    """
+    Lê o snapshot como pyarrow.Table; None se não existir. colunas: lê só
+    essas (as que o snapshot não tiver são ignoradas); None lê todas.
+    """
+    import pyarrow.parquet as pq
+
+    caminho_dados, _ = _caminhos(chave, diretorio)
+    meta = ler_metadados(chave, diretorio)
+    if meta is None or not os.path.exists(caminho_dados):
+        return None
+    with etapa("leitura_snapshot") as medidas:
+        if colunas is not None:
+            existentes = pq.read_schema(caminho_dados).names
+            colunas = [c for c in colunas if c in existentes]
+        tabela = pq.read_table(caminho_dados, columns=colunas, memory_map=True)
+        medidas["linhas"] = tabela.num_rows
+        medidas["bytes"] = tabela.nbytes
+    return tabela
+
+
+def _substituir_atomico(caminho, escrever):
+    """Escreve em um temporário no mesmo diretório e renomeia por cima do destino."""
+    diretorio = os.path.dirname(caminho)
+    fd, tmp = tempfile.mkstemp(dir=diretorio, prefix=".tmp-", suffix=os.path.splitext(caminho)[1])
+    os.close(fd)
+    try:
+        escrever(tmp)
+        os.replace(tmp, caminho)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _guardar_anterior(chave, diretorio=None):
+    """A versão atual do snapshot passa a ser <chave>.anterior (hard link; cópia se o disco não suportar)."""
+    for atual, anterior in zip(_caminhos(chave, diretorio), _caminhos(chave + SUFIXO_ANTERIOR, diretorio)):
+        if not os.path.exists(atual):
+            continue
+
+        def vincular(tmp, atual=atual):
+            os.remove(tmp)
+            try:
+                os.link(atual, tmp)
+            except OSError:
+                shutil.copyfile(atual, tmp)
+
+        _substituir_atomico(anterior, vincular)
+
+
+def gravar_snapshot(chave, tabela, meta, diretorio=None, manter_anterior=False):
+    """
+    Grava dados + metadados de forma atômica. O .json é gravado por último.
+
+    manter_anterior: guarda a versão que está sendo substituída como <chave>.anterior.
+    """
+    import pyarrow.parquet as pq
+
+    os.makedirs(diretorio or DIRETORIO_CACHE, exist_ok=True)
+    caminho_dados, caminho_meta = _caminhos(chave, diretorio)
+    if manter_anterior and ler_metadados(chave, diretorio) is not None:
+        _guardar_anterior(chave, diretorio)
+
+    with etapa("gravacao_snapshot", linhas=tabela.num_rows, bytes=tabela.nbytes):
+        _substituir_atomico(caminho_dados, lambda tmp: pq.write_table(tabela, tmp, compression="zstd"))
+
+    meta = dict(meta)
+    meta.setdefault("criado_em", datetime.now().isoformat(timespec="seconds"))
+    meta["linhas"] = tabela.num_rows
+
+    def escrever_meta(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    _substituir_atomico(caminho_meta, escrever_meta)
+    return meta
+
+
+def remover_snapshot(chave, diretorio=None):
+    """Apaga o .json e o .parquet do snapshot (o .json primeiro: nunca fica meta sem dados)."""
+    caminho_dados, caminho_meta = _caminhos(chave, diretorio)
+    for caminho in (caminho_meta, caminho_dados):
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+
+
+def snapshot_valido(meta, ttl_horas):
+    """True se o snapshot ainda está dentro do TTL."""
+    if meta is None:
+        return False
+    criado_em = datetime.fromisoformat(meta["criado_em"])
+    return datetime.now() - criado_em < timedelta(hours=ttl_horas)
+
+
+def projetar(tabela, colunas):
+    """tabela só com `colunas` (as que ela tiver); colunas=None devolve a tabela inteira."""
+    if tabela is None or colunas is None:
+        return tabela
+    return tabela.select([c for c in colunas if c in tabela.column_names])
+
+
+def carregar_com_cache(query, buscar, http_path, ttl_horas=TTL_HORAS_PADRAO,
+                       refresh=False, offline=False, atualizar=None, diretorio=None,
+                       parametros=None, meta=None, reaproveitar=None, colunas=None):
+    """
+    Devolve o resultado da query (pyarrow.Table) usando o snapshot local quando possível.
+
+    buscar: função sem argumentos que executa a query no warehouse e devolve pyarrow.Table.
+    refresh: ignora o snapshot e busca de novo.
+    offline: nunca acessa o warehouse; usa o snapshot mesmo vencido.
+    atualizar: opcional; recebe o snapshot vencido e devolve (tabela, metadados) com as
+               mudanças aplicadas, em vez de buscar tudo de novo (ver incremental.py).
+    parametros: bind parameters da query (entram na chave do snapshot).
+    meta: metadados extras gravados com o snapshot.
+    reaproveitar: opcional; sem snapshot próprio válido, reaproveitar(ttl_horas) pode
+                  devolver o resultado a partir de outro snapshot (ex.: um superconjunto
+                  filtrado localmente, ver filtros_fact.py) ou None. ttl_horas=None
+                  aceita snapshots vencidos (modo offline).
+    colunas: devolve só essas colunas; com o snapshot válido, só elas são lidas
+             do Parquet. O snapshot gravado continua com todas.
+    """
+    meta_extra = meta or {}
+    chave = chave_snapshot(query, http_path, parametros)
+    meta = ler_metadados(chave, diretorio)
+
+    if offline:
+        if meta is None:
+            tabela = reaproveitar(None) if reaproveitar is not None else None
+            if tabela is not None:
+                return projetar(tabela, colunas)
+            raise SnapshotIndisponivel(
+                f"Sem snapshot local para esta query ({chave}) em {diretorio or DIRETORIO_CACHE}. "
+                f"Rode uma vez sem --offline."
+            )
+        idade = datetime.now() - datetime.fromisoformat(meta["criado_em"])
+        print(f"   📦 Modo offline: usando snapshot {chave} ({meta['criado_em']}, "
+              f"{idade.total_seconds() / 3600:.1f}h atrás)")
+        return ler_snapshot(chave, diretorio, colunas)
+
+    if not refresh and snapshot_valido(meta, ttl_horas):
+        print(f"   📦 Usando snapshot local {chave} ({meta['criado_em']}, {meta['linhas']:,} linhas)")
+        return ler_snapshot(chave, diretorio, colunas)
+
+    if not refresh and reaproveitar is not None:
+        tabela = reaproveitar(ttl_horas)
+        if tabela is not None:
+            return projetar(tabela, colunas)
+
+    if refresh:
+        print("   🔄 --refresh: ignorando snapshot local")
+    elif meta is not None and atualizar is not None:
+        print(f"   ⌛ Snapshot local vencido (TTL {ttl_horas}h) — atualizando incrementalmente")
+        tabela, meta_atualizacao = atualizar(ler_snapshot(chave, diretorio))
+        gravar_snapshot(
+            chave, tabela, {"http_path": http_path, **meta_extra, **meta_atualizacao}, diretorio, manter_anterior=True,
+        )
+        print(f"   💾 Snapshot atualizado: {chave} ({tabela.num_rows:,} linhas)")
+        return projetar(tabela, colunas)
+    elif meta is not None:
+        print(f"   ⌛ Snapshot local vencido (TTL {ttl_horas}h) — buscando de novo")
+
+    tabela = buscar()
+    gravar_snapshot(
+        chave, tabela, {"http_path": http_path, "modo": "completo", **meta_extra}, diretorio, manter_anterior=True,
+    )
+    print(f"   💾 Snapshot salvo: {chave}")
+    return projetar(tabela, colunas)
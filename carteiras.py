@@ -0,0 +1,137 @@
+"""
+Carga das carteiras de aprovação (dim_carteiras.xlsx): DimAprovadores,
+DimSupervisores e DimCoordenadores.
+
+As três dimensões do modelo vêm de abas da mesma planilha do SharePoint e
+são a base das roles de RLS (Aprovadores, Supervisores, Coordenadores).
+Os passos M de cada partição são repetidos aqui:
+  - Text.Trim + Text.Clean nas colunas de texto;
+  - Table.Distinct pela chave (a primeira linha de cada chave fica);
+  - linhas com chave nula removidas.
+
+As chaves das relações (Fact.NomeUsuario → dUsuario → Supervisor →
+Coordenador) e os e-mails comparados com USERNAME() são casados sem
+diferenciar maiúsculas, como o motor do Power BI faz com texto.
+
+Uso:
+  from carteiras import load_carteiras, hierarquia
+  dims = load_carteiras("dim_carteiras.xlsx")
+  hier = hierarquia(dims)    # um aprovador por linha, com supervisor e coordenador
+"""
+
+import os
+import re
+
+CAMINHOS_PADRAO = [
+    os.path.expanduser("~/Downloads/dim_carteiras.xlsx"),
+    os.path.expanduser("~/Documents/dim_carteiras.xlsx"),
+    os.path.expanduser("~/OneDrive - EDENRED/Documents/Power BI - Produtividade Aprovação/dim_carteiras.xlsx"),
+]
+
+# aba → (coluna chave, colunas mantidas pela partição)
+DIMENSOES = {
+    "Aprovadores": ("dUsuario", ["Nome Aprovador", "E-mail", "dUsuario", "Carteira", "Supervisor"]),
+    "Supervisores": ("Supervisor", ["Supervisor", "E-mail", "Coordenador"]),
+    "Coordenadores": ("Coordenador", ["Coordenador", "E-mail"]),
+}
+
+_CONTROLE = re.compile(r"[\x00-\x1f\x7f-\x9f]")
+
+
+def _limpar(valor):
+    """Text.Trim + Text.Clean: tira espaços das pontas e caracteres de controle."""
+    if valor is None:
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return _CONTROLE.sub("", str(valor).strip())
+
+
+def chave_relacao(serie):
+    """Texto como o Power BI compara em relações e filtros: sem diferenciar maiúsculas."""
+    return serie.astype("string").str.casefold()
+
+
+def _dimensao(ws, chave, colunas):
+    import pandas as pd
+
+    linhas = ws.iter_rows(values_only=True)
+    cabecalho = [str(c).strip() if c is not None else "" for c in next(linhas, ())]
+    faltando = [c for c in colunas if c not in cabecalho]
+    if faltando:
+        raise ValueError(f"Aba '{ws.title}' sem as colunas {faltando} (colunas: {cabecalho})")
+
+    indices = [cabecalho.index(c) for c in colunas]
+    dados = [[_limpar(linha[i]) if i < len(linha) else None for i in indices] for linha in linhas]
+    df = pd.DataFrame(dados, columns=colunas, dtype="object")
+    df = df.drop_duplicates(subset=[chave], keep="first")
+    return df[df[chave].notna()].reset_index(drop=True)
+
+
+def ler_carteiras(excel_path):
+    """Lê as três abas da planilha em uma única abertura read-only."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        faltando = [aba for aba in DIMENSOES if aba not in wb.sheetnames]
+        if faltando:
+            raise ValueError(f"{excel_path} sem as abas {faltando} (abas: {wb.sheetnames})")
+        return {aba: _dimensao(wb[aba], chave, colunas) for aba, (chave, colunas) in DIMENSOES.items()}
+    finally:
+        wb.close()
+
+
+def load_carteiras(excel_path=None):
+    """
+    Carrega DimAprovadores/DimSupervisores/DimCoordenadores da planilha de carteiras.
+
+    Devolve {"Aprovadores": df, "Supervisores": df, "Coordenadores": df} ou None
+    se a planilha não for encontrada.
+    """
+    from perfil import etapa
+
+    if not (excel_path and os.path.exists(excel_path)):
+        excel_path = next((p for p in CAMINHOS_PADRAO if os.path.exists(p)), None)
+        if excel_path is None:
+            print("\n⚠️  Planilha de carteiras (dim_carteiras.xlsx) não encontrada. Use --carteiras.")
+            return None
+
+    print(f"\n👥 Carregando carteiras de: {excel_path}")
+    with etapa("carteiras") as medidas:
+        dims = ler_carteiras(excel_path)
+        medidas["linhas"] = sum(len(df) for df in dims.values())
+    print(
+        f"   ✅ {len(dims['Coordenadores']):,} coordenadores, {len(dims['Supervisores']):,} supervisores, "
+        f"{len(dims['Aprovadores']):,} aprovadores"
+    )
+    return dims
+
+
+def hierarquia(dims):
+    """
+    Um aprovador por linha com o caminho Coordenador → Supervisor → Aprovador.
+
+    Colunas: dUsuario, Nome Aprovador, Carteira, E-mail Aprovador, Supervisor,
+    E-mail Supervisor, Coordenador, E-mail Coordenador. Supervisor/Coordenador
+    ficam nulos quando não existem na dimensão de cima — a relação não casa e
+    o aprovador fica fora do filtro das roles Supervisores/Coordenadores.
+    """
+    aprovadores = dims["Aprovadores"].rename(columns={"E-mail": "E-mail Aprovador"})
+    supervisores = dims["Supervisores"].rename(columns={"E-mail": "E-mail Supervisor"})
+    coordenadores = dims["Coordenadores"].rename(columns={"E-mail": "E-mail Coordenador"})
+
+    coordenadores = coordenadores.assign(_chave=chave_relacao(coordenadores["Coordenador"]))
+    supervisores = supervisores.assign(_chave_coord=chave_relacao(supervisores["Coordenador"]))
+    supervisores = supervisores.drop(columns="Coordenador").merge(
+        coordenadores.rename(columns={"_chave": "_chave_coord"}), on="_chave_coord", how="left",
+    )
+    supervisores["_chave"] = chave_relacao(supervisores["Supervisor"])
+
+    hier = aprovadores.assign(_chave=chave_relacao(aprovadores["Supervisor"])).drop(columns="Supervisor").merge(
+        supervisores.drop(columns="_chave_coord"), on="_chave", how="left",
+    )
+    return hier[[
+        "dUsuario", "Nome Aprovador", "Carteira", "E-mail Aprovador",
+        "Supervisor", "E-mail Supervisor", "Coordenador", "E-mail Coordenador",
+    ]]
@@ -1,59 +1,49 @@
 """
 Consulta direta nos dados do formulário + Fact para mostrar os valores CORRETOS.
 Sem multiplicação, sem cross-filter — dados brutos.
+
+Uso:
+  python consulta_auditoria.py [--refresh | --offline] [--pushdown] [--profile]
 """
-import os, sys, pandas as pd
+import os, sys, argparse, pandas as pd
 sys.path.insert(0, os.path.dirname(__file__))
-from validar_formularios import get_databricks_connection, QUERY_FACT, load_formulario
+import perfil
+from validar_formularios import (
+    load_fact_data, load_fact_agregada, load_formulario, adicionar_argumentos_fact, opcoes_fact,
+)
 
 
-def main():
+def run_consulta(df_fact, df_form, os_por_uf=None):
+    """
+    Formulários por cliente sem multiplicação, sobre dados já carregados.
+
+    os_por_uf: {UF: OS distintas} já agregado (--pushdown); None calcula da Fact.
+    """
     print("=" * 90)
     print("  CONSULTA DIRETA — Dados corretos de formulário por Cliente")
     print("=" * 90)
 
-    conn = get_databricks_connection()
-
-    # 1. Carregar Fact
-    print("\n📊 Carregando Fact do Databricks...")
-    cursor = conn.cursor()
-    cursor.execute(QUERY_FACT)
-    rows = cursor.fetchall()
-    cols = [desc[0] for desc in cursor.description]
-    df_fact = pd.DataFrame(rows, columns=cols)
-    cursor.close()
-    print(f"   ✅ {len(df_fact):,} linhas na Fact")
-
-    # 2. Carregar Formulário
-    df_form = load_formulario()
-    if df_form is None:
-        print("❌ Sem formulário. Abortando.")
-        conn.close()
-        return
-
-    # 3. Normalizar OS
-    df_fact["os_str"] = df_fact["NumeroOS"].astype(str).str.strip()
-    df_form["os_str"] = df_form["Número da ordem"].astype(str).str.strip()
+    # 3. OS já normalizada: NumeroOS é chave inteira na Fact e no formulário (esquema.py)
 
     # 4. Mapear OS → Cliente (usando DISTINCT OS da Fact)
     #    Uma OS deve pertencer a um único cliente
-    os_cliente = df_fact[["os_str", "NomeCliente"]].drop_duplicates(subset=["os_str"])
-    dups = os_cliente.groupby("os_str").size()
+    os_cliente = df_fact[["NumeroOS", "NomeCliente"]].drop_duplicates(subset=["NumeroOS"])
+    dups = os_cliente.groupby("NumeroOS", observed=True).size()
     os_multi = dups[dups > 1]
     if len(os_multi) > 0:
         print(f"\n   ⚠️ {len(os_multi)} OS aparecem em MÚLTIPLOS clientes:")
         for os_num in os_multi.index[:10]:
-            clientes = os_cliente[os_cliente["os_str"] == os_num]["NomeCliente"].tolist()
+            clientes = os_cliente[os_cliente["NumeroOS"] == os_num]["NomeCliente"].tolist()
             print(f"      OS {os_num}: {', '.join(clientes)}")
         # Manter apenas o primeiro cliente por OS
-        os_cliente = os_cliente.drop_duplicates(subset=["os_str"], keep="first")
+        os_cliente = os_cliente.drop_duplicates(subset=["NumeroOS"], keep="first")
     else:
         print(f"\n   ✅ Cada OS pertence a um único cliente.")
 
     # 5. Formulários que existem na Fact
-    df_form_in_fact = df_form.merge(os_cliente, on="os_str", how="inner")
+    df_form_in_fact = df_form.merge(os_cliente, on="NumeroOS", how="inner")
     print(f"\n   📋 Formulários com match na Fact: {len(df_form_in_fact):,}")
-    print(f"   📋 OS distintas com formulário: {df_form_in_fact['os_str'].nunique()}")
+    print(f"   📋 OS distintas com formulário: {df_form_in_fact['NumeroOS'].nunique()}")
     print(f"   📋 Formulários sem match na Fact: {len(df_form) - len(df_form_in_fact):,}")
 
     # 6. Contar por cliente — CORRETO (sem multiplicação)
@@ -65,18 +55,18 @@ def main():
     print(f"  {'='*90}")
 
     # Método A: COUNT de linhas do formulário por cliente
-    count_por_cliente = df_form_in_fact.groupby("NomeCliente").agg(
-        count_linhas=("os_str", "count"),
-        distinctcount_os=("os_str", "nunique")
+    count_por_cliente = df_form_in_fact.groupby("NomeCliente", observed=True).agg(
+        count_linhas=("NumeroOS", "count"),
+        distinctcount_os=("NumeroOS", "nunique")
     ).reset_index().sort_values("count_linhas", ascending=False)
 
     # Recusas
     has_recusa = "EC aceitou a negociação?" in df_form_in_fact.columns
     if has_recusa:
         recusas = df_form_in_fact[df_form_in_fact["EC aceitou a negociação?"] == "Não"]
-        count_recusas = recusas.groupby("NomeCliente").agg(
-            count_recusas_linhas=("os_str", "count"),
-            distinctcount_recusas_os=("os_str", "nunique")
+        count_recusas = recusas.groupby("NomeCliente", observed=True).agg(
+            count_recusas_linhas=("NumeroOS", "count"),
+            distinctcount_recusas_os=("NumeroOS", "nunique")
         ).reset_index()
         count_por_cliente = count_por_cliente.merge(count_recusas, on="NomeCliente", how="left").fillna(0)
 
@@ -105,10 +95,10 @@ def main():
 
     # Total global (o que o Power BI mostra no Total row)
     global_count = len(df_form_in_fact)
-    global_distinct = df_form_in_fact['os_str'].nunique()
+    global_distinct = df_form_in_fact['NumeroOS'].nunique()
     if has_recusa:
         global_rec_count = len(recusas)
-        global_rec_distinct = recusas['os_str'].nunique()
+        global_rec_distinct = recusas['NumeroOS'].nunique()
     else:
         global_rec_count = 0
         global_rec_distinct = 0
@@ -147,12 +137,44 @@ def main():
     print(f"  {'='*90}")
 
     # Mostrar supervisores disponíveis
-    if "NomeEC" in df_fact.columns:
-        uf_stats = df_fact.groupby("UFEC")["os_str"].nunique().reset_index()
-        print(f"\n  OS por UF: {dict(zip(uf_stats['UFEC'], uf_stats['os_str']))}")
+    if os_por_uf is None and "NomeEC" in df_fact.columns:
+        uf_stats = df_fact.groupby("UFEC", observed=True)["NumeroOS"].nunique().reset_index()
+        os_por_uf = dict(zip(uf_stats['UFEC'], uf_stats['NumeroOS']))
+    if os_por_uf is not None:
+        print(f"\n  OS por UF: {os_por_uf}")
 
-    conn.close()
-    print("\n🔒 Conexão encerrada.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Consulta direta — formulários por cliente")
+    parser.add_argument(
+        "--pushdown",
+        action="store_true",
+        help="Agrega a Fact no Databricks e traz só os pares OS×cliente (ver pushdown.py)",
+    )
+    adicionar_argumentos_fact(parser)
+    perfil.adicionar_argumento(parser)
+    args = parser.parse_args()
+
+    with perfil.sessao(args.profile, "consulta_auditoria"):
+        # 1. Carregar Fact (item a item, ou só os pares OS×cliente com --pushdown)
+        os_por_uf = None
+        if args.pushdown:
+            niveis = load_fact_agregada(**opcoes_fact(args))
+            df_fact = niveis["os_cliente"]
+            os_por_uf = dict(zip(niveis["uf"]["UFEC"], niveis["uf"]["OSDistintas"]))
+        else:
+            from consultas import COLUNAS_AUDITORIA
+
+            df_fact = load_fact_data(**opcoes_fact(args), colunas=COLUNAS_AUDITORIA)
+
+        # 2. Carregar Formulário
+        df_form = load_formulario()
+        if df_form is None:
+            print("❌ Sem formulário. Abortando.")
+            return
+
+        with perfil.etapa("relatorio.consulta"):
+            run_consulta(df_fact, df_form, os_por_uf)
 
 
 if __name__ == "__main__":
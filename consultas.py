@@ -0,0 +1,393 @@
+"""
+Montagem das queries da FactAprovacaoPrecoParceiro.
+
+QUERY_FACT é a mesma query da partição FactAprovacaoPrecoParceiro do Power BI,
+com as colunas usadas pelas medidas e auditorias (sem as descrições de peça,
+complemento e fabricante, que exigiriam mais três joins).
+As partes (CTEs, colunas, joins, filtro) ficam separadas para que variantes
+— como a extração incremental — sejam geradas a partir do mesmo SQL.
+
+Os filtros de auditoria (--desde/--ate/--cliente/--aprovador/--uf) entram
+como bind parameters (:nome) no WHERE externo e no CTE param_logs, com os
+valores fora do texto da query (ver montar_query_fact_filtrada).
+"""
+
+CTES_FACT = """
+WITH param_logs AS (
+  SELECT
+    dmplv.ClientId AS CodigoCliente,
+    CAST(dmplv.ParameterLogOrgValueModificationTimestamp AS TIMESTAMP) AS ts,
+    COALESCE(dmplv.OldValueDescription, '') AS old_values,
+    COALESCE(dmplv.NewValueDescription, '') AS new_values
+  FROM hive_metastore.gold.Dim_MaintenanceParameterLogValue AS dmplv
+  WHERE dmplv.ParameterId = 586
+),
+sets AS (
+  SELECT
+    CodigoCliente,
+    ts,
+    array_distinct(
+      filter(
+        split(regexp_replace(old_values, '\\\\s+', ''), '[;,]+'),
+        x -> x <> ''
+      )
+    ) AS old_set,
+    array_distinct(
+      filter(
+        split(regexp_replace(new_values, '\\\\s+', ''), '[;,]+'),
+        x -> x <> ''
+      )
+    ) AS new_set
+  FROM param_logs
+),
+adds AS (
+  SELECT CodigoCliente, ts, CAST(approver AS STRING) AS approver
+  FROM sets LATERAL VIEW explode(new_set) ns AS approver
+  WHERE NOT array_contains(old_set, approver)
+),
+removes AS (
+  SELECT CodigoCliente, ts, CAST(approver AS STRING) AS approver
+  FROM sets LATERAL VIEW explode(old_set) os AS approver
+  WHERE NOT array_contains(new_set, approver)
+),
+events AS (
+  SELECT CodigoCliente, approver, ts, 'ADD' AS event_type FROM adds
+  UNION ALL
+  SELECT CodigoCliente, approver, ts, 'REMOVE' AS event_type FROM removes
+),
+ordered_events AS (
+  SELECT
+    CodigoCliente, approver, event_type, ts,
+    LEAD(ts) OVER (PARTITION BY CodigoCliente, approver ORDER BY ts) AS DataFim
+  FROM events
+),
+param_intervals AS (
+  SELECT CodigoCliente, approver AS Aprovador, ts AS DataInicio, DataFim
+  FROM ordered_events WHERE event_type = 'ADD'
+),
+tabela_preco_parceiro AS (
+  SELECT DISTINCT OrderServiceId
+  FROM gold.dim_maintenancelogpriceregulatorpartner
+  WHERE SendDate IS NOT NULL
+)"""
+
+COLUNAS_FACT = """
+    fmi.Sk_MaintenanceItem AS ChaveItem,
+    fmi.MaintenanceId AS NumeroOS,
+    fms.FirstApprovalTimestamp AS DataAprovacao1OS,
+
+    dwu.WebUserName AS NomeUsuario,
+    dwu.WebUserSourceCode AS CodigoUsuario,
+
+    dfc.CustomerShortName AS NomeCliente,
+    dmv.CustomerId AS CodigoCliente,
+
+    dmm.MerchantShortenedName AS NomeEC,
+    dmm.NameMerchantsTypes AS TipoEC,
+    dmm.StateName AS UFEC,
+
+    fmi.PartQuantity AS QuantidadePeca,
+    fmi.PartUnitaryPrice AS ValorUnitarioPeca,
+    fmi.PartQuantity * fmi.PartUnitaryPrice AS ValorTotalPeca,
+
+    COALESCE(fmi.PartPriceNegociatedCustomer, fmi.PartPriceNegociated) AS ValorUnitarioNegociado,
+    COALESCE(fmi.PartPriceReferenceCustomer, fmi.PartReferencePrice) AS ValorUnitarioReferencial,
+    COALESCE(
+      fmi.PartPriceNegociatedCustomer, fmi.PartPriceNegociated,
+      fmi.PartPriceReferenceCustomer, fmi.PartReferencePrice
+    ) AS ValorUnitarioHierarquiaReferencial,
+
+    CASE
+      WHEN fmi.PartUnitaryPrice IS NULL THEN 'NA'
+      WHEN fmi.PartUnitaryPrice <= 0.01 THEN 'NA'
+      WHEN COALESCE(fmi.PartPriceNegociatedCustomer, fmi.PartPriceNegociated,
+                    fmi.PartPriceReferenceCustomer, fmi.PartReferencePrice) IS NULL THEN 'NA'
+      WHEN COALESCE(fmi.PartPriceNegociatedCustomer, fmi.PartPriceNegociated,
+                    fmi.PartPriceReferenceCustomer, fmi.PartReferencePrice) <= 0.01 THEN 'NA'
+      WHEN fmi.PartUnitaryPrice > COALESCE(fmi.PartPriceNegociatedCustomer, fmi.PartPriceNegociated,
+                                           fmi.PartPriceReferenceCustomer, fmi.PartReferencePrice) THEN 'NOK'
+      ELSE 'OK' END AS AderenciaPrecoReferencial,
+
+    dmlprp.SendDate AS DataEnvioNegociacaoPrecoParceiro,
+    dmlprp.PricePartInfo AS InfoPrecoParceiro"""
+
+JOINS_FACT = """
+FROM hive_metastore.gold.fact_maintenanceitems AS fmi
+
+  LEFT JOIN hive_metastore.gold.fact_maintenanceservices AS fms
+    ON fmi.MaintenanceId = fms.OrderServiceCode
+
+  LEFT JOIN hive_metastore.gold.dim_maintenancetypes AS fmt
+    ON fms.Sk_MaintenanceType = fmt.Sk_MaintenanceType
+
+  LEFT JOIN hive_metastore.gold.dim_maintenancemerchants AS dmm
+    ON fms.Sk_MaintenanceMerchant = dmm.Sk_MaintenanceMerchant
+
+  LEFT JOIN hive_metastore.gold.dim_maintenancevehicles AS dmv
+    ON fms.Sk_MaintenanceVehicle = dmv.Sk_MaintenanceVehicle
+
+  LEFT JOIN hive_metastore.gold.dim_fuelcustomers AS dfc
+    ON fms.Sk_FuelCustomer = dfc.Sk_FuelCustomer
+
+  LEFT JOIN hive_metastore.gold.dim_webusers AS dwu
+    ON fms.FirstApproverCode = dwu.WebUserSourceCode
+
+  LEFT JOIN gold.dim_maintenancelogpriceregulatorpartner AS dmlprp
+    ON fmi.MaintenanceItemSourceCode = dmlprp.OrderServiceItemId
+
+  LEFT JOIN hive_metastore.gold.dim_maintenanceitemmanufacturers AS dmif
+    ON fmi.Sk_ServiceItemManufacturer = dmif.Sk_ServiceItemManufacturer
+
+  LEFT JOIN tabela_preco_parceiro
+    ON fmi.MaintenanceId = tabela_preco_parceiro.OrderServiceId
+
+  LEFT JOIN hive_metastore.gold.dim_maintenancelabors AS dml
+    ON fmi.Sk_MaintenanceLabor = dml.Sk_MaintenanceLabor"""
+
+DATA_INICIAL = "2025-04-01"
+FILTRO_DATA_INICIAL = f"fms.FirstApprovalTimestamp >= TIMESTAMP '{DATA_INICIAL}'"
+
+FILTRO_FACT_SEM_APROVADOR = f"""
+WHERE 1=1
+  AND fmi.CancellationTimestamp IS NULL
+  AND fmi.ItemDisapprovalTimestamp IS NULL
+  AND {FILTRO_DATA_INICIAL}
+  AND (dml.LaborName IS NULL OR dml.LaborName NOT LIKE '%GUINCHO%')"""
+
+# Caso 1: OS com negociação de preço parceiro (sempre incluir)
+# Caso 2: aprovador ativo no cliente na data de aprovação (DataInicio <= DataAprovacao1OS < DataFim)
+FILTRO_APROVADOR_ATIVO = """(
+    tabela_preco_parceiro.OrderServiceId IS NOT NULL
+    OR
+    EXISTS (
+      SELECT 1
+      FROM param_intervals pi
+      WHERE pi.CodigoCliente = dmv.CustomerId
+        AND pi.Aprovador = CAST(dwu.WebUserSourceCode AS STRING)
+        AND fms.FirstApprovalTimestamp >= pi.DataInicio
+        AND (pi.DataFim IS NULL OR fms.FirstApprovalTimestamp < pi.DataFim)
+    )
+  )"""
+
+FILTRO_FACT = FILTRO_FACT_SEM_APROVADOR + "\n  AND " + FILTRO_APROVADOR_ATIVO
+
+
+FILTRO_PARAM_LOGS = "WHERE dmplv.ParameterId = 586"
+
+
+def montar_query_fact(colunas=COLUNAS_FACT, filtro=FILTRO_FACT, filtros_extras=(), agrupamento=None,
+                      filtros_logs=()):
+    """
+    Monta a query da Fact; filtros_extras são condições SQL somadas ao WHERE com AND.
+
+    agrupamento (opcional) é a cláusula GROUP BY, para colunas agregadas.
+    filtros_logs são condições somadas ao WHERE do CTE param_logs.
+    """
+    ctes = CTES_FACT.replace(
+        FILTRO_PARAM_LOGS, FILTRO_PARAM_LOGS + "".join(f"\n    AND {c}" for c in filtros_logs), 1,
+    )
+    partes = [
+        ctes.strip("\n"),
+        "SELECT\n" + colunas.strip("\n"),
+        JOINS_FACT.strip("\n"),
+        filtro.strip("\n") + "".join(f"\n  AND {c}" for c in filtros_extras),
+    ]
+    if agrupamento:
+        partes.append(agrupamento.strip("\n"))
+    return "\n\n".join(partes) + "\n"
+
+
+QUERY_FACT = montar_query_fact()
+
+# Colunas da Fact que os relatórios de contagem (validar, consulta,
+# diagnóstico) usam: o snapshot é lido só com elas, sem o JSON de
+# InfoPrecoParceiro e as colunas de preço
+COLUNAS_AUDITORIA = ["ChaveItem", "NumeroOS", "NomeCliente", "NomeEC", "UFEC"]
+
+
+# ============================================================
+# Filtros de auditoria com bind parameters (filtros_fact.py)
+# ============================================================
+def _marcadores(nome, valores):
+    """(:nome_0, :nome_1, ...) e o dict de parâmetros correspondente."""
+    parametros = {f"{nome}_{i}": str(v) for i, v in enumerate(valores)}
+    return "(" + ", ".join(f":{p}" for p in parametros) + ")", parametros
+
+
+def condicoes_filtros(filtros):
+    """
+    Condições SQL dos filtros de auditoria.
+
+    filtros: dict normalizado por filtros_fact.normalizar (desde/ate em
+    yyyy-mm-dd, ate inclusivo; cliente/aprovador/uf listas de texto). Cliente
+    e aprovador casam pelo nome ou pelo código.
+    Devolve (condições do WHERE externo, condições do param_logs, parâmetros).
+
+    No param_logs só entram os cortes que não mudam os intervalos de aprovador
+    das linhas pedidas: o cliente (os intervalos são por cliente; o nome vira
+    dmv.CustomerId pelo mesmo caminho fms → dfc/dmv da Fact), logs depois
+    de `ate` (o LEAD de um ADD anterior a `ate` só precisa do próximo evento
+    se ele também for anterior) e, por aprovador, os logs que citam o código
+    dele no old/new (os eventos de um aprovador só saem desses logs).
+    """
+    from datetime import date, timedelta
+
+    where, logs, parametros = [], [], {}
+    if "desde" in filtros:
+        parametros["desde"] = filtros["desde"]
+        where.append("fms.FirstApprovalTimestamp >= CAST(:desde AS TIMESTAMP)")
+    if "ate" in filtros:
+        parametros["ate"] = (date.fromisoformat(filtros["ate"]) + timedelta(days=1)).isoformat()
+        where.append("fms.FirstApprovalTimestamp < CAST(:ate AS TIMESTAMP)")
+        logs.append("CAST(dmplv.ParameterLogOrgValueModificationTimestamp AS TIMESTAMP) < CAST(:ate AS TIMESTAMP)")
+    if "cliente" in filtros:
+        lista, p = _marcadores("cliente", filtros["cliente"])
+        parametros.update(p)
+        where.append(f"(dfc.CustomerShortName IN {lista} OR CAST(dmv.CustomerId AS STRING) IN {lista})")
+        logs.append(f"""(
+      CAST(dmplv.ClientId AS STRING) IN {lista}
+      OR dmplv.ClientId IN (
+        SELECT veic.CustomerId
+        FROM hive_metastore.gold.fact_maintenanceservices AS os
+        JOIN hive_metastore.gold.dim_fuelcustomers AS cli
+          ON os.Sk_FuelCustomer = cli.Sk_FuelCustomer
+        JOIN hive_metastore.gold.dim_maintenancevehicles AS veic
+          ON os.Sk_MaintenanceVehicle = veic.Sk_MaintenanceVehicle
+        WHERE cli.CustomerShortName IN {lista}
+      )
+    )""")
+    if "aprovador" in filtros:
+        lista, p = _marcadores("aprovador", filtros["aprovador"])
+        parametros.update(p)
+        where.append(f"(dwu.WebUserName IN {lista} OR CAST(dwu.WebUserSourceCode AS STRING) IN {lista})")
+        logs.append(f"""EXISTS (
+      SELECT 1
+      FROM hive_metastore.gold.dim_webusers AS apr
+      WHERE (apr.WebUserName IN {lista} OR CAST(apr.WebUserSourceCode AS STRING) IN {lista})
+        AND (
+          instr(COALESCE(dmplv.OldValueDescription, ''), CAST(apr.WebUserSourceCode AS STRING)) > 0
+          OR instr(COALESCE(dmplv.NewValueDescription, ''), CAST(apr.WebUserSourceCode AS STRING)) > 0
+        )
+    )""")
+    if "uf" in filtros:
+        lista, p = _marcadores("uf", filtros["uf"])
+        parametros.update(p)
+        where.append(f"dmm.StateName IN {lista}")
+    return where, logs, parametros
+
+
+def montar_query_fact_filtrada(filtros, colunas=COLUNAS_FACT, agrupamento=None):
+    """Query da Fact com os filtros de auditoria; devolve (query, parâmetros)."""
+    where, logs, parametros = condicoes_filtros(filtros)
+    query = montar_query_fact(colunas=colunas, filtros_extras=where, agrupamento=agrupamento, filtros_logs=logs)
+    return query, parametros
+
+
+# ============================================================
+# Filtro de aprovadores aplicado localmente (intervalos_aprovador.py)
+# ============================================================
+QUERY_LOGS_APROVADORES = """
+SELECT
+  dmplv.ClientId AS CodigoCliente,
+  CAST(dmplv.ParameterLogOrgValueModificationTimestamp AS TIMESTAMP) AS ts,
+  COALESCE(dmplv.OldValueDescription, '') AS old_values,
+  COALESCE(dmplv.NewValueDescription, '') AS new_values
+FROM hive_metastore.gold.Dim_MaintenanceParameterLogValue AS dmplv
+WHERE dmplv.ParameterId = 586
+"""
+
+COLUNAS_FILTRO_APROVADOR = """
+    fmi.Sk_MaintenanceItem AS ChaveItem,
+    fmi.MaintenanceId AS NumeroOS,
+    dmv.CustomerId AS CodigoCliente,
+    CAST(dwu.WebUserSourceCode AS STRING) AS CodigoUsuario,
+    fms.FirstApprovalTimestamp AS DataAprovacao1OS,
+    tabela_preco_parceiro.OrderServiceId IS NOT NULL AS OSComPrecoParceiro"""
+
+# Itens com todos os filtros da Fact, exceto o de aprovador ativo (sem o EXISTS)
+QUERY_ITENS_SEM_FILTRO_APROVADOR = montar_query_fact(
+    colunas=COLUNAS_FILTRO_APROVADOR,
+    filtro=FILTRO_FACT_SEM_APROVADOR,
+)
+
+
+# ============================================================
+# Extração incremental
+# ============================================================
+def _janela_incremental(desde):
+    """
+    Condição que seleciona os itens que podem ter mudado desde `desde`:
+    aprovados depois, cancelados/reprovados depois, OS que ganharam envio de
+    preço parceiro depois, ou clientes cujo parâmetro 586 (aprovadores) mudou.
+    """
+    limite = f"TIMESTAMP '{desde:%Y-%m-%d %H:%M:%S}'"
+    return f"""(
+    fms.FirstApprovalTimestamp >= {limite}
+    OR fmi.CancellationTimestamp >= {limite}
+    OR fmi.ItemDisapprovalTimestamp >= {limite}
+    OR fmi.MaintenanceId IN (
+      SELECT OrderServiceId
+      FROM gold.dim_maintenancelogpriceregulatorpartner
+      WHERE SendDate >= {limite}
+    )
+    OR dmv.CustomerId IN (
+      SELECT CodigoCliente FROM param_logs WHERE ts >= {limite}
+    )
+  )"""
+
+
+def montar_query_fact_incremental(desde):
+    """Linhas da Fact (já com todos os filtros) entre os itens tocados desde `desde`."""
+    return montar_query_fact(filtros_extras=[_janela_incremental(desde)])
+
+
+def montar_query_chaves_incremental(desde):
+    """ChaveItem de todos os itens tocados desde `desde`, inclusive os que saíram da Fact."""
+    return montar_query_fact(
+        colunas="    DISTINCT fmi.Sk_MaintenanceItem AS ChaveItem",
+        filtro=f"WHERE 1=1\n  AND {FILTRO_DATA_INICIAL}",
+        filtros_extras=[_janela_incremental(desde)],
+    )
+
+
+# ============================================================
+# Extração em fatias de DataAprovacao1OS (extracao_paralela.py)
+# ============================================================
+def montar_query_fact_fatia(desde, ate=None):
+    """Linhas da Fact com DataAprovacao1OS em [desde, ate); ate=None deixa a fatia aberta."""
+    filtros = [f"fms.FirstApprovalTimestamp >= TIMESTAMP '{desde:%Y-%m-%d}'"]
+    if ate is not None:
+        filtros.append(f"fms.FirstApprovalTimestamp < TIMESTAMP '{ate:%Y-%m-%d}'")
+    return montar_query_fact(filtros_extras=filtros)
+
+
+# ============================================================
+# Agregação no warehouse (--pushdown, ver pushdown.py)
+# ============================================================
+# Uma única varredura com três níveis de agrupamento:
+#   os_cliente → pares distintos (OS, cliente) com o nº de itens de cada par
+#   cliente    → COUNT(*) e COUNT(DISTINCT OS) por cliente
+#   uf         → COUNT(DISTINCT OS) por UF do EC
+COLUNAS_FACT_AGREGADA = """
+    CASE
+      WHEN GROUPING(fmi.MaintenanceId) = 0 THEN 'os_cliente'
+      WHEN GROUPING(dfc.CustomerShortName) = 0 THEN 'cliente'
+      ELSE 'uf'
+    END AS Nivel,
+    fmi.MaintenanceId AS NumeroOS,
+    dfc.CustomerShortName AS NomeCliente,
+    dmm.StateName AS UFEC,
+    COUNT(*) AS Itens,
+    COUNT(DISTINCT fmi.MaintenanceId) AS OSDistintas"""
+
+AGRUPAMENTO_FACT_AGREGADA = """
+GROUP BY GROUPING SETS (
+  (fmi.MaintenanceId, dfc.CustomerShortName),
+  (dfc.CustomerShortName),
+  (dmm.StateName)
+)"""
+
+QUERY_FACT_AGREGADA = montar_query_fact(
+    colunas=COLUNAS_FACT_AGREGADA,
+    agrupamento=AGRUPAMENTO_FACT_AGREGADA,
+)
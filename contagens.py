@@ -0,0 +1,99 @@
+"""
+Motores de contagem vetorizados para as análises COUNT vs DISTINCTCOUNT.
+
+Em vez de percorrer cliente a cliente (sets Python + isin por cliente), monta
+uma única vez o índice distinto OS → cliente e deriva dele, em uma passada,
+as OS em múltiplos clientes, o DISTINCTCOUNT global e a soma dos
+DISTINCTCOUNT por cliente.
+"""
+
+COL_ACEITE = "EC aceitou a negociação?"
+
+
+def indice_os_clientes(df_fact, col_os="NumeroOS", col_cliente="NomeCliente"):
+    """
+    Pares distintos (OS, cliente) da Fact, com o número de clientes de cada OS.
+
+    Clientes nulos são descartados, como no groupby("NomeCliente") original.
+    """
+    pares = df_fact[[col_os, col_cliente]].dropna(subset=[col_cliente]).drop_duplicates()
+    pares = pares.reset_index(drop=True)
+    pares["n_clientes"] = pares.groupby(col_os, observed=True)[col_cliente].transform("size")
+    return pares
+
+
+def diagnostico_os_clientes(indice, df_form, col_os="NumeroOS", col_cliente="NomeCliente"):
+    """
+    Diagnóstico de OS do formulário compartilhadas entre clientes.
+
+    A soma dos DISTINCTCOUNT por cliente é o número de pares (OS, cliente) cujas
+    OS estão no formulário; o DISTINCTCOUNT global é o número de OS distintas.
+    """
+    os_formulario = df_form[col_os].drop_duplicates()
+    pares_form = indice[indice[col_os].isin(os_formulario)]
+
+    multi = pares_form[pares_form["n_clientes"] > 1].sort_values([col_os, col_cliente])
+    os_multi_cliente = {
+        os_num: grupo.tolist()
+        for os_num, grupo in multi.groupby(col_os, sort=True, observed=True)[col_cliente]
+    }
+
+    resultado = {
+        "os_formulario": len(os_formulario),
+        "os_form_na_fact": pares_form[col_os].nunique(),
+        "os_multi_cliente": os_multi_cliente,
+        "global_distinct": pares_form[col_os].nunique(),
+        "soma_distinct": len(pares_form),
+    }
+
+    if COL_ACEITE in df_form.columns:
+        os_recusa = df_form.loc[df_form[COL_ACEITE] == "Não", col_os].drop_duplicates()
+        pares_recusa = pares_form[pares_form[col_os].isin(os_recusa)]
+        resultado["global_recusas"] = pares_recusa[col_os].nunique()
+        resultado["soma_recusas"] = len(pares_recusa)
+
+    return resultado
+
+
+def contagens_por_cliente(df_fact, df_form, col_os="NumeroOS", col_cliente="NomeCliente", col_itens=None):
+    """
+    COUNT e DISTINCTCOUNT de respostas/recusas por cliente, sem materializar o join.
+
+    O join many-to-many Fact × Formulário gera, para cada (cliente, OS),
+    itens_na_fact × respostas_da_os linhas. Basta então contar itens por
+    (cliente, OS) e respostas/recusas por OS e multiplicar: a memória fica
+    proporcional às OS distintas, não às linhas do join.
+
+    Retorna um DataFrame por NomeCliente com as colunas os_distintas,
+    count_formularios, distinctcount_formularios, count_recusas e
+    distinctcount_recusas (mesmos números do join explícito).
+
+    col_itens: coluna com o nº de itens de cada linha quando df_fact já vem
+    agregada por (OS, cliente) do warehouse (--pushdown); None conta as linhas.
+    """
+    import pandas as pd
+
+    grupos = df_fact.groupby([col_cliente, col_os], observed=True)
+    itens = (grupos[col_itens].sum() if col_itens else grupos.size()).rename("itens").reset_index()
+
+    recusa = (df_form[COL_ACEITE] == "Não").rename("recusas")
+    respostas = pd.concat([df_form[col_os], recusa], axis=1).groupby(col_os).agg(
+        respostas=("recusas", "size"),
+        recusas=("recusas", "sum"),
+    )
+
+    por_os = itens.merge(respostas, left_on=col_os, right_index=True, how="inner")
+    por_os["count_formularios"] = por_os["itens"] * por_os["respostas"]
+    por_os["count_recusas"] = por_os["itens"] * por_os["recusas"]
+    por_os["tem_recusa"] = por_os["recusas"] > 0
+
+    com_form = por_os.groupby(col_cliente, observed=True).agg(
+        count_formularios=("count_formularios", "sum"),
+        distinctcount_formularios=(col_os, "size"),
+        count_recusas=("count_recusas", "sum"),
+        distinctcount_recusas=("tem_recusa", "sum"),
+    )
+    os_distintas = itens.groupby(col_cliente, observed=True).size().rename("os_distintas")
+
+    resultado = os_distintas.to_frame().join(com_form, how="left").fillna(0).reset_index()
+    return resultado
@@ -0,0 +1,347 @@
+"""
+Cubo pré-calculado da hierarquia Coordenador → Supervisor → Aprovador × mês.
+
+As roles de RLS do painel filtram DimCoordenadores → DimSupervisores →
+DimAprovadores → FactAprovacaoPrecoParceiro.NomeUsuario. Para saber "o que o
+supervisor X vê" sem refiltrar a Fact inteira, o cubo guarda, para cada membro
+de cada nível e cada mês:
+  - as medidas aditivas de _Medidas (VA Peças, Potencial, Travado,
+    Aderente/Não Aderente/Sem Referencial...) e a contagem de Itens;
+  - os conjuntos de OS distintas (lista ordenada de NumeroOS) de todos os
+    itens e dos itens travados — conjuntos se unem entre meses e membros,
+    então DISTINCTCOUNT de qualquer recorte sai exato, sem reler a Fact.
+
+Construção em uma passada: as máscaras e somas são calculadas uma vez por
+(aprovador, mês) e os níveis de cima são somados a partir dessas células.
+O cubo fica no diretório de cache (cache_snapshot.py) como Parquet + .json.
+
+Níveis: total (o que a role Admin vê), coordenador, supervisor, aprovador.
+Aprovadores da Fact que não estão na planilha de carteiras aparecem no nível
+aprovador sem E-mail e sem supervisor — nenhuma role além de Admin os vê.
+
+Uso:
+  python cubo_hierarquia.py construir --carteiras dim_carteiras.xlsx --offline
+  python cubo_hierarquia.py consultar --supervisor "Fulano de Tal" --desde 2025-06 --ate 2025-09
+  python cubo_hierarquia.py consultar --email fulano@edenred.com --por-mes
+  python cubo_hierarquia.py consultar --nivel coordenador
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+CHAVE_CUBO = "cubo-hierarquia"
+
+# nível → colunas do caminho até o membro (o membro é a última)
+NIVEIS = {
+    "total": [],
+    "coordenador": ["Coordenador"],
+    "supervisor": ["Coordenador", "Supervisor"],
+    "aprovador": ["Coordenador", "Supervisor", "Aprovador"],
+}
+EMAIL_DO_NIVEL = {
+    "coordenador": "E-mail Coordenador",
+    "supervisor": "E-mail Supervisor",
+    "aprovador": "E-mail Aprovador",
+}
+
+# conjunto de OS distintas → máscara de medidas.mascaras()
+CONJUNTOS_OS = {
+    "OS": "todas",
+    "OS Travado": "travado",
+}
+
+
+def pares_distintos(chave, os_):
+    """Pares (chave, OS) sem repetição, ordenados por chave e OS."""
+    import numpy as np
+
+    ordem = np.lexsort((os_, chave))
+    chave, os_ = chave[ordem], os_[ordem]
+    novo = np.ones(len(chave), dtype=bool)
+    novo[1:] = (chave[1:] != chave[:-1]) | (os_[1:] != os_[:-1])
+    return chave[novo], os_[novo]
+
+
+def _caminhos_usuarios(usuarios, dims):
+    """NomeUsuario distintos da Fact → Coordenador/Supervisor/Aprovador e e-mails (via carteiras)."""
+    import pandas as pd
+    from carteiras import hierarquia, chave_relacao
+
+    hier = hierarquia(dims)
+    hier = hier.assign(_chave=chave_relacao(hier["dUsuario"])).drop_duplicates("_chave")
+    nomes = pd.Series(usuarios, dtype="object")
+    caminhos = pd.DataFrame({"_chave": chave_relacao(nomes).to_numpy()}).merge(hier, on="_chave", how="left")
+    caminhos["Aprovador"] = caminhos["dUsuario"].where(caminhos["dUsuario"].notna(), nomes.to_numpy())
+    return caminhos.drop(columns=["_chave", "dUsuario"])
+
+
+def construir_cubo(df, dims):
+    """
+    Cubo (pyarrow.Table) a partir da Fact (DataFrame de load_fact_data) e das carteiras.
+
+    Uma linha por nível × membro × mês com: Nivel, Coordenador, Supervisor,
+    Aprovador, E-mail, Mes (yyyy-mm), as MEDIDAS_ADITIVAS, Itens e uma coluna
+    lista de NumeroOS por conjunto de CONJUNTOS_OS.
+    """
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    from medidas import mascaras, base_aditiva
+    from perfil import etapa
+
+    with etapa("cubo_hierarquia", linhas=len(df)) as medidas:
+        masc = mascaras(df)
+        base = base_aditiva(df, masc)
+
+        usuario, usuarios = pd.factorize(df["NomeUsuario"], use_na_sentinel=False)
+        datas = pd.to_datetime(df["DataAprovacao1OS"]).to_numpy().astype("datetime64[M]")
+        mes, meses = pd.factorize(datas, sort=True, use_na_sentinel=False)
+        meses = [None if pd.isna(m) else str(np.datetime64(m, "M")) for m in meses]
+        n_meses = len(meses)
+        celula = usuario.astype("int64") * n_meses + mes
+
+        # passada única sobre os itens: somas e OS distintas por (aprovador, mês)
+        n_folhas = len(usuarios) * n_meses
+        colunas = list(base.columns)
+        somas = {c: np.bincount(celula, weights=base[c].to_numpy(), minlength=n_folhas) for c in colunas}
+        numero_os = df["NumeroOS"]
+        tem_os = numero_os.notna().to_numpy()
+        os_valores = numero_os.to_numpy(dtype="int64", na_value=0)
+        folhas_os = {
+            nome: pares_distintos(celula[tem_os & masc[m].to_numpy()], os_valores[tem_os & masc[m].to_numpy()])
+            for nome, m in CONJUNTOS_OS.items()
+        }
+        caminhos = _caminhos_usuarios(usuarios, dims)
+
+        partes = []
+        for nivel, caminho in NIVEIS.items():
+            if caminho:
+                grupos = caminhos.groupby(caminho, dropna=False, sort=True)
+                membro_do_usuario = grupos.ngroup().to_numpy()
+                membros = grupos.size().index.to_frame(index=False)
+                membros["E-mail"] = grupos[EMAIL_DO_NIVEL[nivel]].first().to_numpy()
+            else:
+                membro_do_usuario = np.zeros(len(usuarios), dtype="int64")
+                membros = pd.DataFrame(index=[0])
+            n_celulas = len(membros) * n_meses
+
+            def celula_do_nivel(folha):
+                return membro_do_usuario[folha // n_meses] * n_meses + folha % n_meses
+
+            destino = celula_do_nivel(np.arange(n_folhas))
+            tabela = {c: np.bincount(destino, weights=somas[c], minlength=n_celulas) for c in colunas}
+            manter = np.flatnonzero(tabela["Itens"] > 0)
+
+            linhas = membros.iloc[manter // n_meses].reset_index(drop=True)
+            for coluna in ("Coordenador", "Supervisor", "Aprovador", "E-mail"):
+                if coluna not in linhas.columns:
+                    linhas[coluna] = None
+            arrays = {
+                "Nivel": pa.array([nivel] * len(manter), pa.string()),
+                **{c: pa.array(linhas[c].astype("object").where(linhas[c].notna(), None), pa.string())
+                   for c in ("Coordenador", "Supervisor", "Aprovador", "E-mail")},
+                "Mes": pa.array([meses[i] for i in manter % n_meses], pa.string()),
+                **{c: pa.array(tabela[c][manter], pa.float64()) for c in colunas if c != "Itens"},
+                "Itens": pa.array(tabela["Itens"][manter].astype("int64")),
+            }
+            for nome, (folha, os_) in folhas_os.items():
+                chave, os_ = pares_distintos(celula_do_nivel(folha), os_)
+                offsets = np.concatenate([[0], np.cumsum(np.bincount(chave, minlength=n_celulas))])
+                lista = pa.ListArray.from_arrays(pa.array(offsets, pa.int32()), pa.array(os_, pa.int64()))
+                arrays[nome] = lista.take(pa.array(manter))
+            partes.append(pa.table(arrays))
+
+        cubo = pa.concat_tables(partes)
+        medidas["celulas"] = cubo.num_rows
+        medidas["bytes"] = cubo.nbytes
+    return cubo
+
+
+def gravar_cubo(cubo, meta, diretorio=None):
+    from cache_snapshot import gravar_snapshot
+
+    return gravar_snapshot(CHAVE_CUBO, cubo, meta, diretorio)
+
+
+def carregar_cubo(diretorio=None):
+    """Cubo gravado (pyarrow.Table); erro se ainda não foi construído."""
+    from cache_snapshot import ler_snapshot, DIRETORIO_CACHE
+
+    cubo = ler_snapshot(CHAVE_CUBO, diretorio)
+    if cubo is None:
+        raise FileNotFoundError(
+            f"Cubo não encontrado em {diretorio or DIRETORIO_CACHE}. Rode 'python cubo_hierarquia.py construir'."
+        )
+    return cubo
+
+
+def selecao_email(cubo, email):
+    """
+    Membros que um USERNAME() vê pelas roles: os níveis em que o e-mail aparece.
+
+    Membros contidos em outro membro selecionado (ex.: o próprio aprovador
+    dentro da carteira do supervisor) são descartados, para não somar duas vezes.
+    """
+    import pyarrow.compute as pc
+
+    linhas = cubo.filter(pc.equal(pc.utf8_lower(cubo["E-mail"]), email.strip().lower()))
+    caminhos = set()
+    for linha in linhas.select(["Nivel", "Coordenador", "Supervisor", "Aprovador"]).to_pylist():
+        caminhos.add((linha["Nivel"], tuple(linha[c] for c in NIVEIS[linha["Nivel"]])))
+
+    def contido(caminho, outro):
+        return len(outro) < len(caminho) and caminho[:len(outro)] == outro
+
+    return [
+        (nivel, caminho[-1]) for nivel, caminho in sorted(caminhos)
+        if not any(contido(caminho, outro) for _, outro in caminhos)
+    ]
+
+
+def consultar(cubo, selecao=None, desde=None, ate=None, por=()):
+    """
+    Medidas de um recorte do cubo, sem tocar nos itens.
+
+    selecao: lista de (nivel, membro); membro None = todos os membros do nível.
+             Vazia → total. Os membros devem ser disjuntos (ver selecao_email).
+    desde/ate: meses yyyy-mm (inclusive).
+    por: colunas do cubo para agrupar (ex.: ["Supervisor"], ["Mes"]).
+    Devolve DataFrame com as medidas aditivas, as derivadas (percentuais) e
+    "<conjunto> distintas" para cada conjunto de OS.
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from medidas import MEDIDAS_ADITIVAS, medidas_derivadas
+
+    filtro = pa.array(np.zeros(cubo.num_rows, dtype=bool))
+    for nivel, membro in selecao or [("total", None)]:
+        if nivel not in NIVEIS:
+            raise ValueError(f"Nível desconhecido: {nivel} (níveis: {', '.join(NIVEIS)})")
+        condicao = pc.equal(cubo["Nivel"], nivel)
+        if membro is not None:
+            coluna = NIVEIS[nivel][-1]
+            condicao = pc.and_(condicao, pc.equal(pc.utf8_lower(cubo[coluna]), str(membro).lower()))
+        filtro = pc.or_(filtro, pc.fill_null(condicao, False))
+    if desde:
+        filtro = pc.and_(filtro, pc.fill_null(pc.greater_equal(cubo["Mes"], desde), False))
+    if ate:
+        filtro = pc.and_(filtro, pc.fill_null(pc.less_equal(cubo["Mes"], ate), False))
+    recorte = cubo.filter(filtro)
+
+    aditivas = list(MEDIDAS_ADITIVAS) + ["Itens"]
+    df = recorte.drop_columns(list(CONJUNTOS_OS)).to_pandas()
+    if por:
+        grupos = df.groupby(list(por), dropna=False, sort=True)
+        grupo = grupos.ngroup().to_numpy()
+        resultado = grupos[aditivas].sum().reset_index()
+    else:
+        grupo = np.zeros(len(df), dtype="int64")
+        resultado = df[aditivas].sum().to_frame().T
+        resultado["Itens"] = resultado["Itens"].astype("int64")
+
+    for nome in CONJUNTOS_OS:
+        lista = recorte[nome].combine_chunks()
+        os_ = pc.list_flatten(lista).to_numpy()
+        chave, _ = pares_distintos(grupo[pc.list_parent_indices(lista).to_numpy()], os_)
+        resultado[f"{nome} distintas"] = np.bincount(chave, minlength=len(resultado))
+
+    return medidas_derivadas(resultado)
+
+
+def _construir(args):
+    from carteiras import load_carteiras
+    from validar_formularios import load_fact_data, opcoes_fact
+
+    dims = load_carteiras(args.carteiras)
+    if dims is None:
+        sys.exit(1)
+    df_fact = load_fact_data(**opcoes_fact(args))
+
+    print("\n🧊 Construindo cubo da hierarquia...")
+    inicio = time.perf_counter()
+    cubo = construir_cubo(df_fact, dims)
+    decorrido = time.perf_counter() - inicio
+
+    import pyarrow.compute as pc
+    niveis = pc.value_counts(cubo["Nivel"]).to_pylist()
+    meta = gravar_cubo(cubo, {
+        "carteiras": os.path.abspath(args.carteiras) if args.carteiras else None,
+        "itens": len(df_fact),
+        "celulas_por_nivel": {n["values"]: n["counts"] for n in niveis},
+    })
+    print(f"   ✅ {meta['linhas']:,} células ({cubo.nbytes / 1024 ** 2:,.1f} MB) em {decorrido:.1f}s")
+    for n in niveis:
+        print(f"      {n['values']:<12s} {n['counts']:>8,} células")
+
+
+def _consultar(args):
+    import pandas as pd
+
+    cubo = carregar_cubo()
+    inicio = time.perf_counter()
+    selecao = []
+    por = []
+    if args.email:
+        selecao = selecao_email(cubo, args.email)
+        if not selecao:
+            print(f"   ⚠️ {args.email} não está em nenhuma carteira: as roles não mostram nenhum item.")
+            return
+    for nivel in ("coordenador", "supervisor", "aprovador"):
+        selecao += [(nivel, membro) for membro in getattr(args, nivel) or []]
+    if args.nivel:
+        selecao.append((args.nivel, None))
+        por = list(NIVEIS[args.nivel])
+    if args.por_mes:
+        por.append("Mes")
+
+    resultado = consultar(cubo, selecao, args.desde, args.ate, por)
+    decorrido_ms = (time.perf_counter() - inicio) * 1000
+
+    descricao = ", ".join(f"{n} {m}" if m else f"todos os {n}es" for n, m in selecao) or "total"
+    print(f"\n  🧊 {descricao}: {len(resultado):,} linhas em {decorrido_ms:.1f} ms")
+    if args.saida:
+        resultado.to_csv(args.saida, index=False, sep=";", decimal=",")
+        print(f"   💾 Resultado salvo em {args.saida}")
+    elif len(resultado) == 1 and not por:
+        with pd.option_context("display.float_format", "{:,.2f}".format):
+            print(resultado.T.to_string(header=False))
+    else:
+        with pd.option_context("display.max_columns", None, "display.width", 200):
+            print(resultado.head(50).to_string(index=False))
+
+
+def main():
+    from validar_formularios import adicionar_argumentos_fact
+
+    parser = argparse.ArgumentParser(description="Cubo de medidas por Coordenador → Supervisor → Aprovador × mês")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    construir = sub.add_parser("construir", help="Monta o cubo a partir da Fact e das carteiras e grava no cache")
+    construir.add_argument("--carteiras", type=str, default=None, help='Caminho da "dim_carteiras.xlsx"')
+    adicionar_argumentos_fact(construir)
+
+    consulta = sub.add_parser("consultar", help="Medidas de um membro, nível ou e-mail a partir do cubo")
+    consulta.add_argument("--coordenador", action="append", help="Coordenador (repetível)")
+    consulta.add_argument("--supervisor", action="append", help="Supervisor (repetível)")
+    consulta.add_argument("--aprovador", action="append", help="Aprovador (dUsuario; repetível)")
+    consulta.add_argument("--email", type=str, default=None, help="O que este USERNAME() vê pelas roles")
+    consulta.add_argument("--nivel", choices=[n for n in NIVEIS if n != "total"], help="Uma linha por membro do nível")
+    consulta.add_argument("--desde", type=str, default=None, help="Primeiro mês (yyyy-mm)")
+    consulta.add_argument("--ate", type=str, default=None, help="Último mês (yyyy-mm)")
+    consulta.add_argument("--por-mes", action="store_true", help="Uma linha por mês")
+    consulta.add_argument("--saida", type=str, default=None, help="Grava o resultado em CSV")
+    args = parser.parse_args()
+
+    if args.comando == "construir":
+        _construir(args)
+    else:
+        _consultar(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Gerador de dados sintéticos no esquema da QUERY_FACT e do formulário.
+
+Permite medir e testar os relatórios sem Databricks nem a planilha do
+SharePoint. A distribuição imita a dos dados reais:
+  - itens por OS com cauda longa (geométrica, média ~4 peças);
+  - clientes, ECs e aprovadores com popularidade Zipf (poucos concentram
+    a maior parte das OS); UFs com peso desigual;
+  - uma fração pequena de OS aparece sob dois clientes (o caso que o
+    diagnostico_totais.py investiga);
+  - ~5% das peças com negociação de preço parceiro (InfoPrecoParceiro com o
+    JSON de "valornegociar"/"tempovigenciameses" e DataEnvio preenchida);
+  - no formulário, respostas repetidas por OS, "Sim"/"Não", OS de teste
+    1–5 e números de OS digitados como "123.0" ou com espaços;
+  - nas carteiras, alguns aprovadores da Fact fora da planilha e um
+    supervisor sem coordenador cadastrado (casos que somem do RLS).
+
+Uso:
+  from dados_sinteticos import gerar_fact, gerar_formulario
+  tabela = gerar_fact(1_000_000)          # pyarrow.Table (mesmas colunas da QUERY_FACT)
+  df_form = gerar_formulario(tabela)      # DataFrame no formato de load_formulario()
+  dims = gerar_carteiras(tabela)          # dict no formato de carteiras.load_carteiras()
+
+  python dados_sinteticos.py --linhas 1000000 --saida fact.parquet --formulario form.xlsx \
+      --carteiras dim_carteiras.xlsx
+"""
+
+import argparse
+
+UFS = ["SP", "MG", "RJ", "PR", "RS", "SC", "BA", "GO", "PE", "CE", "ES", "DF", "MT", "MS", "PA", "AM"]
+PESOS_UF = [30, 12, 10, 8, 7, 6, 5, 4, 4, 3, 3, 2, 2, 2, 1, 1]
+TIPOS_EC = ["Oficina", "Concessionaria", "Centro Automotivo", "Autopeças"]
+PESOS_TIPO_EC = [55, 20, 15, 10]
+DATA_INICIAL = "2025-04-01"
+
+
+def _zipf(rng, n, total, s=1.1):
+    """Índices 0..total-1 com popularidade Zipf (o índice 0 é o mais frequente)."""
+    import numpy as np
+
+    pesos = 1.0 / np.arange(1, total + 1) ** s
+    return rng.choice(total, size=n, p=pesos / pesos.sum())
+
+
+def _rotulos(prefixo, total):
+    import pyarrow as pa
+
+    return pa.array([f"{prefixo} {i:05d}" for i in range(total)], pa.string())
+
+
+def gerar_fact(linhas, semente=42, clientes=None, ecs=None, aprovadores=None,
+               fracao_multi_cliente=0.01, fracao_preco_parceiro=0.05):
+    """
+    pyarrow.Table com `linhas` itens nas colunas de COLUNAS_FACT.
+
+    O número de clientes/ECs/aprovadores cresce com o volume quando não informado.
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    rng = np.random.default_rng(semente)
+    clientes = clientes or max(20, int(linhas ** 0.5 / 5))
+    ecs = ecs or max(50, int(linhas ** 0.5 * 2))
+    aprovadores = aprovadores or max(10, clientes * 3)
+
+    # OS com número geométrico de itens (≥ 1), até completar as linhas
+    itens_por_os = rng.geometric(0.25, size=linhas // 3 + 10)
+    fim = np.searchsorted(np.cumsum(itens_por_os), linhas) + 1
+    itens_por_os = itens_por_os[:fim]
+    itens_por_os[-1] -= itens_por_os.sum() - linhas
+    n_os = len(itens_por_os)
+    numeros_os = np.sort(rng.choice(np.arange(1_000_000, 1_000_000 + n_os * 3), size=n_os, replace=False))
+
+    cliente_os = _zipf(rng, n_os, clientes)
+    ec_os = _zipf(rng, n_os, ecs)
+    aprovador_os = (cliente_os * 3 + rng.integers(0, 3, n_os)) % aprovadores
+    inicio = np.datetime64(DATA_INICIAL, "s")
+    segundos = int((np.datetime64("today", "s") - inicio).astype(np.int64))
+    data_os = inicio + np.sort(rng.integers(0, max(segundos, 1), n_os)).astype("timedelta64[s]")
+
+    ec_uf = rng.choice(len(UFS), size=ecs, p=np.array(PESOS_UF) / sum(PESOS_UF))
+    ec_tipo = rng.choice(len(TIPOS_EC), size=ecs, p=np.array(PESOS_TIPO_EC) / sum(PESOS_TIPO_EC))
+
+    os_do_item = np.repeat(np.arange(n_os), itens_por_os)
+    cliente = cliente_os[os_do_item]
+    # OS compartilhadas: parte dos itens de algumas OS fica com outro cliente
+    multi = rng.random(n_os) < fracao_multi_cliente
+    troca = multi[os_do_item] & (rng.random(linhas) < 0.5)
+    cliente = np.where(troca, (cliente + 1) % clientes, cliente)
+    ec = ec_os[os_do_item]
+
+    quantidade = rng.geometric(0.6, size=linhas).astype("float64")
+    preco = np.round(rng.lognormal(4.5, 1.0, size=linhas), 2)
+    referencial = np.where(rng.random(linhas) < 0.7, np.round(preco * rng.normal(1.05, 0.15, linhas), 2), np.nan)
+    negociado = np.where(rng.random(linhas) < 0.15, np.round(preco * rng.normal(0.95, 0.05, linhas), 2), np.nan)
+    hierarquia = np.where(np.isnan(negociado), referencial, negociado)
+    aderencia = np.where(
+        (preco <= 0.01) | np.isnan(hierarquia) | (hierarquia <= 0.01), "NA",
+        np.where(preco > hierarquia, "NOK", "OK"),
+    )
+
+    com_pp = rng.random(linhas) < fracao_preco_parceiro
+    valor_pp = np.round(preco * rng.normal(0.9, 0.05, linhas), 2)
+    vigencia = rng.choice([3, 6, 12], size=linhas)
+    info = np.full(linhas, None, dtype=object)
+    info[com_pp] = [
+        f'{{"valornegociar" : {v:.2f}, "tempovigenciameses" : {m}, "origem" : "sintetico"}}'
+        for v, m in zip(valor_pp[com_pp], vigencia[com_pp])
+    ]
+    envio = np.where(com_pp, data_os[os_do_item] - np.timedelta64(1, "D"), np.datetime64("NaT"))
+
+    def rotulos(prefixo, total, indices):
+        return pc.take(_rotulos(prefixo, total), pa.array(indices))
+
+    def opcional(valores):
+        return pa.array(valores, pa.float64(), mask=np.isnan(valores))
+
+    return pa.table({
+        "ChaveItem": pa.array(np.arange(1, linhas + 1), pa.int64()),
+        "NumeroOS": pa.array(numeros_os[os_do_item], pa.int64()),
+        "DataAprovacao1OS": pa.array(data_os[os_do_item], pa.timestamp("us")),
+        "NomeUsuario": rotulos("Aprovador", aprovadores, aprovador_os[os_do_item]),
+        "CodigoUsuario": pc.cast(pa.array(aprovador_os[os_do_item] + 5000), pa.string()),
+        "NomeCliente": rotulos("Cliente", clientes, cliente),
+        "CodigoCliente": pa.array(cliente + 100, pa.int64()),
+        "NomeEC": rotulos("EC", ecs, ec),
+        "TipoEC": pc.take(pa.array(TIPOS_EC), pa.array(ec_tipo[ec])),
+        "UFEC": pc.take(pa.array(UFS), pa.array(ec_uf[ec])),
+        "QuantidadePeca": pa.array(quantidade),
+        "ValorUnitarioPeca": pa.array(preco),
+        "ValorTotalPeca": pa.array(np.round(quantidade * preco, 2)),
+        "ValorUnitarioNegociado": opcional(negociado),
+        "ValorUnitarioReferencial": opcional(referencial),
+        "ValorUnitarioHierarquiaReferencial": opcional(hierarquia),
+        "AderenciaPrecoReferencial": pa.array(aderencia, pa.string()),
+        "DataEnvioNegociacaoPrecoParceiro": pa.array(envio, pa.timestamp("us")),
+        "InfoPrecoParceiro": pa.array(info, pa.string()),
+    })
+
+
+def gerar_formulario(fact, fracao_os=0.02, semente=7, taxa_recusa=0.3):
+    """
+    Respostas do formulário (formato de load_formulario) para uma fração das OS da Fact.
+
+    Cada OS sorteada recebe 1 + geométrica respostas; ~1% das OS respondidas
+    não existem na Fact. Inclui as OS de teste "1".."5" e variações de digitação.
+    """
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from esquema import normalizar_os
+
+    rng = np.random.default_rng(semente)
+    coluna = fact["NumeroOS"] if isinstance(fact, pa.Table) else pa.array(fact["NumeroOS"])
+    os_distintas = pc.unique(coluna).to_numpy(zero_copy_only=False)
+    n = max(1, int(len(os_distintas) * fracao_os))
+    escolhidas = rng.choice(os_distintas, size=n, replace=False)
+    fora = np.arange(n // 100) + os_distintas.max() + 1
+    escolhidas = np.concatenate([escolhidas, fora, np.arange(1, 6)])
+
+    repeticoes = rng.geometric(0.7, size=len(escolhidas))
+    numeros = np.repeat(escolhidas, repeticoes)
+    rng.shuffle(numeros)
+
+    texto = numeros.astype(str).astype(object)
+    variacao = rng.random(len(numeros))
+    texto[variacao < 0.05] = [f"{t}.0" for t in texto[variacao < 0.05]]
+    texto[variacao > 0.97] = [f" {t} " for t in texto[variacao > 0.97]]
+
+    recusa = rng.random(len(numeros)) < taxa_recusa
+    df = pd.DataFrame({
+        "Número da ordem": texto,
+        "EC aceitou a negociação?": np.where(recusa, "Não", "Sim"),
+        "Qual o motivo da recusa?": np.where(recusa, "Preço acima do praticado", None),
+        "Id": pd.array(np.arange(1, len(numeros) + 1), dtype="Int64"),
+    })
+    df["NumeroOS"] = normalizar_os(df["Número da ordem"])
+    return df
+
+
+def gravar_planilha(df_form, caminho):
+    """Grava o formulário como a planilha do SharePoint (aba TabelaPrecoParceiro)."""
+    colunas = ["Id", "Número da ordem", "EC aceitou a negociação?", "Qual o motivo da recusa?"]
+    df_form[colunas].to_excel(caminho, sheet_name="TabelaPrecoParceiro", index=False)
+
+
+def gerar_carteiras(fact, supervisores=None, coordenadores=None, semente=11, fracao_sem_carteira=0.05):
+    """
+    DimAprovadores/DimSupervisores/DimCoordenadores para os aprovadores da Fact.
+
+    ~`fracao_sem_carteira` dos aprovadores fica fora da planilha e o último
+    supervisor aponta para um coordenador que não existe.
+    """
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    rng = np.random.default_rng(semente)
+    if isinstance(fact, pa.Table):
+        usuarios = pc.unique(fact["NomeUsuario"]).drop_null().to_pylist()
+    else:
+        usuarios = fact["NomeUsuario"].dropna().unique().tolist()
+    usuarios = sorted(str(u) for u in usuarios)
+    supervisores = supervisores or max(2, len(usuarios) // 8)
+    coordenadores = coordenadores or max(2, supervisores // 4)
+
+    cadastrados = [u for u in usuarios if rng.random() >= fracao_sem_carteira]
+    nomes_sup = [f"Supervisor {i:03d}" for i in range(supervisores)]
+    nomes_coord = [f"Coordenador {i:02d}" for i in range(coordenadores)]
+    coord_do_sup = [nomes_coord[i % coordenadores] for i in range(supervisores)]
+    coord_do_sup[-1] = "Coordenador sem cadastro"
+
+    def email(nome):
+        return nome.lower().replace(" ", ".") + "@exemplo.com"
+
+    return {
+        "Aprovadores": pd.DataFrame({
+            "Nome Aprovador": [u.replace("Aprovador", "Pessoa") for u in cadastrados],
+            "E-mail": [email(u) for u in cadastrados],
+            "dUsuario": cadastrados,
+            "Carteira": [f"Carteira {i % 5}" for i in range(len(cadastrados))],
+            "Supervisor": [nomes_sup[i] for i in rng.integers(0, supervisores, len(cadastrados))],
+        }, dtype="object"),
+        "Supervisores": pd.DataFrame({
+            "Supervisor": nomes_sup,
+            "E-mail": [email(n) for n in nomes_sup],
+            "Coordenador": coord_do_sup,
+        }, dtype="object"),
+        "Coordenadores": pd.DataFrame({
+            "Coordenador": nomes_coord,
+            "E-mail": [email(n) for n in nomes_coord],
+        }, dtype="object"),
+    }
+
+
+def gravar_carteiras(dims, caminho):
+    """Grava as carteiras como a dim_carteiras.xlsx do SharePoint (uma aba por dimensão)."""
+    import pandas as pd
+
+    with pd.ExcelWriter(caminho) as escritor:
+        for aba, df in dims.items():
+            df.to_excel(escritor, sheet_name=aba, index=False)
+
+
+def main():
+    import pyarrow.parquet as pq
+
+    parser = argparse.ArgumentParser(description="Gera Fact e formulário sintéticos")
+    parser.add_argument("--linhas", type=int, default=100_000, help="Itens na Fact (padrão: 100000)")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", type=str, default="fact_sintetica.parquet", help="Parquet da Fact")
+    parser.add_argument("--formulario", type=str, default=None, help="Grava também a planilha do formulário (.xlsx)")
+    parser.add_argument("--carteiras", type=str, default=None, help="Grava também a dim_carteiras.xlsx")
+    args = parser.parse_args()
+
+    tabela = gerar_fact(args.linhas, semente=args.semente)
+    pq.write_table(tabela, args.saida, compression="zstd")
+    print(f"💾 {tabela.num_rows:,} itens em {args.saida}")
+    if args.formulario:
+        df_form = gerar_formulario(tabela)
+        gravar_planilha(df_form, args.formulario)
+        print(f"💾 {len(df_form):,} respostas em {args.formulario}")
+    if args.carteiras:
+        dims = gerar_carteiras(tabela)
+        gravar_carteiras(dims, args.carteiras)
+        print(f"💾 {len(dims['Aprovadores']):,} aprovadores em {args.carteiras}")
+
+
+if __name__ == "__main__":
+    main()
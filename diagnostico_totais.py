@@ -4,65 +4,51 @@ sob múltiplos clientes na FactAprovacaoPrecoParceiro.
 
 Isso explicaria por que DISTINCTCOUNT no Total do Power BI
 não bate com a soma das linhas individuais.
+
+Uso:
+  python diagnostico_totais.py [--refresh | --offline] [--profile]
 """
 
 import os
 import sys
-import pandas as pd
+import argparse
 
-# Reutilizar conexão do script principal
+# Reutilizar a carga do script principal
 sys.path.insert(0, os.path.dirname(__file__))
-from validar_formularios import get_databricks_connection, QUERY_FACT, load_formulario
-
+import perfil
+from validar_formularios import load_fact_data, load_formulario, adicionar_argumentos_fact, opcoes_fact
+from contagens import indice_os_clientes, diagnostico_os_clientes
 
-def diagnostico():
-    print("=" * 80)
-    print("  DIAGNÓSTICO: OS compartilhadas entre clientes")
-    print("=" * 80)
 
-    conn = get_databricks_connection()
+def diagnostico(opcoes=None):
+    from consultas import COLUNAS_AUDITORIA
 
-    print("\n📊 Carregando FactAprovacaoPrecoParceiro...")
-    cursor = conn.cursor()
-    cursor.execute(QUERY_FACT)
-    rows = cursor.fetchall()
-    cols = [desc[0] for desc in cursor.description]
-    df_fact = pd.DataFrame(rows, columns=cols)
-    cursor.close()
-    print(f"   ✅ {len(df_fact):,} linhas")
+    df_fact = load_fact_data(**(opcoes or {}), colunas=COLUNAS_AUDITORIA)
 
     df_form = load_formulario()
     if df_form is None:
         print("❌ Sem formulário.")
         return
 
-    # Converter para string
-    df_fact["NumeroOS_str"] = df_fact["NumeroOS"].astype(str).str.strip()
-    df_form["NumeroOS_str"] = df_form["Número da ordem"].astype(str).str.strip()
-
-    # OS unique por cliente na Fact
-    os_por_cliente = df_fact.groupby("NomeCliente")["NumeroOS_str"].apply(set).to_dict()
+    with perfil.etapa("relatorio.diagnostico"):
+        run_diagnostico(df_fact, df_form)
 
-    # OS no formulário
-    os_formulario = set(df_form["NumeroOS_str"].unique())
 
-    # OS do formulário que estão na Fact
-    os_form_na_fact = set()
-    os_form_multi_cliente = {}
+def run_diagnostico(df_fact, df_form):
+    """Diagnóstico de OS compartilhadas sobre dados já carregados (Fact ou pares OS×cliente)."""
+    print("=" * 80)
+    print("  DIAGNÓSTICO: OS compartilhadas entre clientes")
+    print("=" * 80)
 
-    for os_num in os_formulario:
-        clientes_desta_os = []
-        for cliente, os_set in os_por_cliente.items():
-            if os_num in os_set:
-                clientes_desta_os.append(cliente)
-        if len(clientes_desta_os) > 1:
-            os_form_multi_cliente[os_num] = clientes_desta_os
-        if clientes_desta_os:
-            os_form_na_fact.add(os_num)
+    # Índice distinto OS → clientes (uma passada), em vez de testar cada OS
+    # do formulário contra o set de OS de cada cliente
+    indice = indice_os_clientes(df_fact)
+    r = diagnostico_os_clientes(indice, df_form)
+    os_form_multi_cliente = r["os_multi_cliente"]
 
     print(f"\n  📊 Resumo:")
-    print(f"     OS no formulário: {len(os_formulario)}")
-    print(f"     OS do formulário encontradas na Fact: {len(os_form_na_fact)}")
+    print(f"     OS no formulário: {r['os_formulario']}")
+    print(f"     OS do formulário encontradas na Fact: {r['os_form_na_fact']}")
     print(f"     OS do formulário em MÚLTIPLOS clientes: {len(os_form_multi_cliente)}")
 
     if os_form_multi_cliente:
@@ -76,20 +62,8 @@ def diagnostico():
         print("     O problema de totalização pode ser outro.")
 
     # Simular: Total DISTINCTCOUNT global vs soma por cliente
-    # Filtrar apenas respostas de OS que estão na Fact
-    df_form_in_fact = df_form[df_form["NumeroOS_str"].isin(os_form_na_fact)]
-
-    # Global DISTINCTCOUNT
-    global_distinct = df_form_in_fact["NumeroOS_str"].nunique()
-
-    # Soma de DISTINCTCOUNT por cliente
-    # Para cada cliente, filtrar OS que pertencem a ele
-    soma_distinct = 0
-    for cliente, os_set in os_por_cliente.items():
-        os_form_cliente = df_form_in_fact[df_form_in_fact["NumeroOS_str"].isin(os_set)]
-        dc = os_form_cliente["NumeroOS_str"].nunique()
-        if dc > 0:
-            soma_distinct += dc
+    global_distinct = r["global_distinct"]
+    soma_distinct = r["soma_distinct"]
 
     print(f"\n  📊 Comparação Totais:")
     print(f"     DISTINCTCOUNT global (o que o Total do PBI mostra): {global_distinct}")
@@ -101,26 +75,22 @@ def diagnostico():
         print(f"     causando a diferença entre a soma das linhas e o total.")
 
     # Recusas
-    if "EC aceitou a negociação?" in df_form_in_fact.columns:
-        df_recusas = df_form_in_fact[df_form_in_fact["EC aceitou a negociação?"] == "Não"]
-        global_recusas = df_recusas["NumeroOS_str"].nunique()
-
-        soma_recusas = 0
-        for cliente, os_set in os_por_cliente.items():
-            os_rec_cliente = df_recusas[df_recusas["NumeroOS_str"].isin(os_set)]
-            dc = os_rec_cliente["NumeroOS_str"].nunique()
-            if dc > 0:
-                soma_recusas += dc
+    if "global_recusas" in r:
+        global_recusas = r["global_recusas"]
+        soma_recusas = r["soma_recusas"]
 
         print(f"\n  📊 Recusas:")
         print(f"     DISTINCTCOUNT global recusas: {global_recusas}")
         print(f"     Soma DISTINCTCOUNT recusas por cliente: {soma_recusas}")
         print(f"     Diferença: {soma_recusas - global_recusas}")
 
-    conn.close()
-    print("\n🔒 Conexão encerrada.")
     print("=" * 80)
 
 
 if __name__ == "__main__":
-    diagnostico()
+    parser = argparse.ArgumentParser(description="Diagnóstico de OS compartilhadas entre clientes")
+    adicionar_argumentos_fact(parser)
+    perfil.adicionar_argumento(parser)
+    args = parser.parse_args()
+    with perfil.sessao(args.profile, "diagnostico_totais"):
+        diagnostico(opcoes_fact(args))
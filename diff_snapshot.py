@@ -0,0 +1,367 @@
+"""
+Diferença entre dois snapshots da Fact, item a item (ChaveItem).
+
+Quando os números do painel mudam de um dia para o outro, a pergunta é quais
+itens mudaram: cancelamentos (o item some da query), reaprovações
+(DataAprovacao1OS), novas DataEnvio de preço parceiro, troca de aprovador
+pelos intervalos de aprovador (NomeUsuario)...
+
+Para funcionar com dezenas de milhões de linhas em memória limitada:
+  1. cada lado é lido em lotes do Parquet; de cada linha ficam só a chave,
+     um hash por coluna, a impressão digital da linha (hash dos hashes), o
+     cliente, a aderência e as medidas de impacto (VA Peças, VA Travado...);
+  2. as linhas são distribuídas em N partições pelo hash da ChaveItem e
+     gravadas em disco (Arrow IPC) — o mesmo item cai na mesma partição nos
+     dois lados;
+  3. cada partição é comparada sozinha: chave só no novo = inserido, só no
+     antigo = removido, impressões diferentes = alterado (e quais colunas).
+A memória de pico é a de um lote de leitura mais uma partição.
+
+O snapshot da Fact guarda a versão anterior a cada atualização
+(<chave>.anterior no cache), então sem argumentos a comparação é
+"snapshot atual × anterior".
+
+Uso:
+  python diff_snapshot.py                                   # snapshot atual × anterior
+  python diff_snapshot.py antigo.parquet novo.parquet --particoes 64
+  python diff_snapshot.py --saida clientes.csv --detalhe itens_alterados.parquet
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+COLUNA_CHAVE = "ChaveItem"
+PARTICOES_PADRAO = 32
+BATCH_SIZE_PADRAO = 500_000
+MEDIDAS_IMPACTO = (
+    "VA Peças",
+    "VA Peças Travado Preço Parceiro",
+    "VA Travado Aderente",
+    "VA Travado Não Aderente",
+    "VA Travado Sem Referencial",
+)
+
+# colunas cuja mudança tem uma leitura conhecida no painel
+SIGNIFICADO = {
+    "DataAprovacao1OS": "reaprovação da OS",
+    "DataEnvioNegociacaoPrecoParceiro": "DataEnvio de preço parceiro",
+    "InfoPrecoParceiro": "negociação de preço parceiro",
+    "NomeUsuario": "aprovador (intervalos de aprovador)",
+    "AderenciaPrecoReferencial": "aderência ao referencial",
+    "NomeCliente": "cliente da OS",
+    "ValorUnitarioReferencial": "preço referencial",
+}
+
+_PRIMO = 0x100000001B3
+
+
+def _hashes(df, colunas):
+    """Hash (uint64) de cada coluna e a impressão digital da linha."""
+    import numpy as np
+    import pandas as pd
+
+    por_coluna = [pd.util.hash_pandas_object(df[c], index=False).to_numpy() for c in colunas]
+    impressao = np.zeros(len(df), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for h in por_coluna:
+            impressao = (impressao * np.uint64(_PRIMO)) ^ h
+    return por_coluna, impressao
+
+
+def _resumir_lote(lote, colunas):
+    """RecordBatch do snapshot → RecordBatch compacto (chave, hashes, cliente, aderência, medidas)."""
+    import pyarrow as pa
+    from esquema import tipar_tabela
+    from medidas import base_aditiva
+    from transformacoes import derivar_preco_parceiro
+
+    tabela = pa.Table.from_batches([lote])
+    df_bruto = tabela.select(colunas).to_pandas()
+    por_coluna, impressao = _hashes(df_bruto, colunas)
+    df = tipar_tabela(derivar_preco_parceiro(tabela)).to_pandas()
+    base = base_aditiva(df)
+
+    return pa.RecordBatch.from_pydict({
+        COLUNA_CHAVE: pa.array(df[COLUNA_CHAVE].to_numpy(), pa.int64()),
+        "impressao": pa.array(impressao),
+        **{f"h{i}": pa.array(h) for i, h in enumerate(por_coluna)},
+        "NomeCliente": pa.array(df["NomeCliente"].astype("object").to_numpy(), pa.string()),
+        "Aderencia": pa.array(df["AderenciaPrecoReferencial"].astype("object").to_numpy(), pa.string()),
+        **{m: pa.array(base[m].to_numpy(), pa.float64()) for m in MEDIDAS_IMPACTO},
+    })
+
+
+def _particionar(caminho, colunas, diretorio, lado, particoes, batch_size):
+    """Lê o Parquet em lotes e espalha os resumos em `particoes` arquivos Arrow IPC."""
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arquivo = pq.ParquetFile(caminho)
+    escritores = [None] * particoes
+    linhas = 0
+    try:
+        for lote in arquivo.iter_batches(batch_size=batch_size, columns=colunas + [COLUNA_CHAVE]):
+            resumo = _resumir_lote(lote, colunas)
+            chave = pd.util.hash_array(resumo[COLUNA_CHAVE].to_numpy())
+            particao = (chave % np.uint64(particoes)).astype(np.int64)
+            ordem = np.argsort(particao, kind="stable")
+            limites = np.searchsorted(particao[ordem], np.arange(particoes + 1))
+            resumo = resumo.take(pa.array(ordem))
+            for p in range(particoes):
+                if limites[p] == limites[p + 1]:
+                    continue
+                if escritores[p] is None:
+                    escritores[p] = pa.ipc.new_stream(os.path.join(diretorio, f"{lado}-{p:04d}.arrow"), resumo.schema)
+                escritores[p].write_batch(resumo.slice(limites[p], limites[p + 1] - limites[p]))
+            linhas += lote.num_rows
+    finally:
+        for escritor in escritores:
+            if escritor is not None:
+                escritor.close()
+    return linhas
+
+
+def _ler_particao(diretorio, lado, p):
+    import pyarrow as pa
+
+    caminho = os.path.join(diretorio, f"{lado}-{p:04d}.arrow")
+    if not os.path.exists(caminho):
+        return None
+    with pa.memory_map(caminho) as fonte:
+        df = pa.ipc.open_stream(fonte).read_all().to_pandas()
+    repetidas = int(df[COLUNA_CHAVE].duplicated().sum())
+    return df.drop_duplicates(COLUNA_CHAVE) if repetidas else df, repetidas
+
+
+def _comparar_particao(antigo, novo, colunas, detalhe=None):
+    """Compara uma partição; devolve (contagens, mudanças por coluna, por cliente, transições de aderência)."""
+    import numpy as np
+    import pandas as pd
+
+    vazio = pd.DataFrame(columns=[
+        COLUNA_CHAVE, "impressao", *(f"h{i}" for i in range(len(colunas))), "NomeCliente", "Aderencia", *MEDIDAS_IMPACTO,
+    ])
+    antigo = vazio if antigo is None else antigo
+    novo = vazio if novo is None else novo
+    junto = antigo.merge(novo, on=COLUNA_CHAVE, how="outer", suffixes=("_a", "_n"), indicator=True)
+
+    inserido = (junto["_merge"] == "right_only").to_numpy()
+    removido = (junto["_merge"] == "left_only").to_numpy()
+    ambos = (junto["_merge"] == "both").to_numpy()
+    alterado = ambos & (junto["impressao_a"].to_numpy() != junto["impressao_n"].to_numpy())
+
+    mudancas = np.zeros(len(colunas), dtype=np.int64)
+    mascaras_coluna = []
+    for i in range(len(colunas)):
+        difere = alterado & (junto[f"h{i}_a"].to_numpy() != junto[f"h{i}_n"].to_numpy())
+        mudancas[i] = difere.sum()
+        mascaras_coluna.append(difere)
+
+    cliente = junto["NomeCliente_n"].where(junto["NomeCliente_n"].notna(), junto["NomeCliente_a"])
+    delta = {
+        f"Δ {m}": junto[f"{m}_n"].astype("float64").fillna(0.0) - junto[f"{m}_a"].astype("float64").fillna(0.0)
+        for m in MEDIDAS_IMPACTO
+    }
+    por_cliente = pd.DataFrame({
+        "NomeCliente": cliente.fillna("(sem cliente)").to_numpy(),
+        "Inseridos": inserido,
+        "Removidos": removido,
+        "Alterados": alterado,
+        **{nome: serie.to_numpy() for nome, serie in delta.items()},
+    }).groupby("NomeCliente", sort=False).sum()
+
+    mudou_aderencia = inserido | removido | (alterado & (
+        junto["Aderencia_a"].fillna("∅").to_numpy() != junto["Aderencia_n"].fillna("∅").to_numpy()
+    ))
+    de = np.where(inserido, "—", junto["Aderencia_a"].fillna("∅").to_numpy(dtype=object))
+    para = np.where(removido, "—", junto["Aderencia_n"].fillna("∅").to_numpy(dtype=object))
+    transicoes = pd.DataFrame({"De": de[mudou_aderencia], "Para": para[mudou_aderencia]}).value_counts()
+
+    if detalhe is not None:
+        afetado = inserido | removido | alterado
+        nomes = np.full(afetado.sum(), "", dtype=object)
+        for nome, difere in zip(colunas, mascaras_coluna):
+            marcado = difere[afetado]
+            nomes[marcado] = nomes[marcado] + nome + ","
+        tipo = np.where(inserido, "inserido", np.where(removido, "removido", "alterado"))[afetado]
+        detalhe.append(pd.DataFrame({
+            COLUNA_CHAVE: junto.loc[afetado, COLUNA_CHAVE].to_numpy(),
+            "Tipo": tipo,
+            "NomeCliente": cliente[afetado].to_numpy(),
+            "Colunas": [n.rstrip(",") for n in nomes],
+            **{nome: serie[afetado].to_numpy() for nome, serie in delta.items()},
+        }))
+
+    contagens = {
+        "inseridos": int(inserido.sum()),
+        "removidos": int(removido.sum()),
+        "alterados": int(alterado.sum()),
+        "iguais": int((ambos & ~alterado).sum()),
+    }
+    return contagens, mudancas, por_cliente, transicoes
+
+
+def comparar_snapshots(caminho_antigo, caminho_novo, particoes=PARTICOES_PADRAO,
+                       batch_size=BATCH_SIZE_PADRAO, diretorio_temp=None, detalhe=False):
+    """
+    Compara dois snapshots Parquet da Fact pela ChaveItem.
+
+    Devolve dict com linhas de cada lado, contagens (inseridos, removidos,
+    alterados, iguais), mudancas (Series coluna → itens alterados nela),
+    por_cliente (DataFrame), aderencia (transições De → Para), colunas só de um
+    lado e, com detalhe=True, o DataFrame dos itens afetados.
+    """
+    import numpy as np
+    import pandas as pd
+    import pyarrow.parquet as pq
+    from perfil import etapa
+
+    esquema_antigo = pq.ParquetFile(caminho_antigo).schema_arrow.names
+    esquema_novo = pq.ParquetFile(caminho_novo).schema_arrow.names
+    for nome, esquema in (("antigo", esquema_antigo), ("novo", esquema_novo)):
+        if COLUNA_CHAVE not in esquema:
+            raise ValueError(f"Snapshot {nome} sem a coluna {COLUNA_CHAVE}")
+    colunas = [c for c in esquema_novo if c in esquema_antigo and c != COLUNA_CHAVE]
+
+    resultado = {
+        "so_antigo": [c for c in esquema_antigo if c not in esquema_novo],
+        "so_novo": [c for c in esquema_novo if c not in esquema_antigo],
+    }
+    with tempfile.TemporaryDirectory(prefix="diff-", dir=diretorio_temp) as temp:
+        with etapa("diff.particionar") as medidas:
+            resultado["linhas_antigo"] = _particionar(caminho_antigo, colunas, temp, "antigo", particoes, batch_size)
+            resultado["linhas_novo"] = _particionar(caminho_novo, colunas, temp, "novo", particoes, batch_size)
+            medidas["linhas"] = resultado["linhas_antigo"] + resultado["linhas_novo"]
+
+        contagens = {"inseridos": 0, "removidos": 0, "alterados": 0, "iguais": 0, "chaves_repetidas": 0}
+        mudancas = np.zeros(len(colunas), dtype=np.int64)
+        por_cliente, transicoes, itens = [], [], [] if detalhe else None
+        with etapa("diff.comparar", particoes=particoes):
+            for p in range(particoes):
+                lados = [_ler_particao(temp, lado, p) for lado in ("antigo", "novo")]
+                for lado in lados:
+                    if lado is not None:
+                        contagens["chaves_repetidas"] += lado[1]
+                antigo, novo = (lado[0] if lado is not None else None for lado in lados)
+                if antigo is None and novo is None:
+                    continue
+                c, m, cliente, trans = _comparar_particao(antigo, novo, colunas, itens)
+                for k, v in c.items():
+                    contagens[k] += v
+                mudancas += m
+                por_cliente.append(cliente)
+                transicoes.append(trans)
+
+    resultado["contagens"] = contagens
+    resultado["mudancas"] = pd.Series(mudancas, index=colunas).sort_values(ascending=False)
+    clientes = pd.concat(por_cliente).groupby(level=0).sum() if por_cliente else pd.DataFrame()
+    if not clientes.empty:
+        clientes = clientes[(clientes[["Inseridos", "Removidos", "Alterados"]].sum(axis=1) > 0)]
+        clientes = clientes.reindex(
+            clientes["Δ VA Peças Travado Preço Parceiro"].abs().sort_values(ascending=False).index
+        ).reset_index()
+    resultado["por_cliente"] = clientes
+    resultado["aderencia"] = (
+        pd.concat(transicoes).groupby(level=[0, 1]).sum().sort_values(ascending=False) if transicoes else pd.Series()
+    )
+    if detalhe:
+        resultado["detalhe"] = pd.concat(itens, ignore_index=True) if itens else pd.DataFrame()
+    return resultado
+
+
+def imprimir_relatorio(resultado, top=15):
+    import pandas as pd
+
+    c = resultado["contagens"]
+    print("\n" + "=" * 80)
+    print("  DIFERENÇA ENTRE SNAPSHOTS DA FACT (por ChaveItem)")
+    print("=" * 80)
+    print(f"\n  Antigo: {resultado['linhas_antigo']:,} itens | Novo: {resultado['linhas_novo']:,} itens")
+    print(f"  ➕ Inseridos: {c['inseridos']:,}   ➖ Removidos: {c['removidos']:,}   "
+          f"✏️  Alterados: {c['alterados']:,}   = Iguais: {c['iguais']:,}")
+    if c["chaves_repetidas"]:
+        print(f"  ⚠️ {c['chaves_repetidas']:,} ChaveItem repetidas (comparada só a primeira ocorrência)")
+    for lado in ("so_antigo", "so_novo"):
+        if resultado[lado]:
+            print(f"  ⚠️ Colunas só no {lado[3:]}: {', '.join(resultado[lado])}")
+
+    mudancas = resultado["mudancas"][resultado["mudancas"] > 0]
+    if not mudancas.empty:
+        print("\n  Itens alterados por coluna:")
+        for coluna, n in mudancas.items():
+            leitura = f"  ({SIGNIFICADO[coluna]})" if coluna in SIGNIFICADO else ""
+            print(f"     {coluna:<40s} {n:>12,}{leitura}")
+
+    if not resultado["aderencia"].empty:
+        print("\n  Aderência ao referencial (De → Para, — = item inexistente, ∅ = sem aderência):")
+        for (de, para), n in resultado["aderencia"].head(top).items():
+            print(f"     {de:>4s} → {para:<4s} {n:>12,}")
+
+    clientes = resultado["por_cliente"]
+    if not clientes.empty:
+        deltas = [f"Δ {m}" for m in MEDIDAS_IMPACTO]
+        total = clientes[deltas].sum()
+        print("\n  Impacto nas medidas (novo − antigo):")
+        for nome, valor in total.items():
+            print(f"     {nome:<45s} {valor:>18,.2f}")
+        print(f"\n  {min(top, len(clientes))} clientes com maior |Δ VA Peças Travado Preço Parceiro|:")
+        colunas = ["NomeCliente", "Inseridos", "Removidos", "Alterados", "Δ VA Peças", "Δ VA Peças Travado Preço Parceiro"]
+        with pd.option_context("display.width", 200, "display.float_format", "{:,.2f}".format):
+            print(clientes[colunas].head(top).to_string(index=False))
+
+
+def main():
+    from cache_snapshot import caminho_snapshot, chave_snapshot, SUFIXO_ANTERIOR
+    from consultas import QUERY_FACT
+    from validar_formularios import http_path_origem
+
+    parser = argparse.ArgumentParser(description="Itens inseridos, removidos e alterados entre dois snapshots da Fact")
+    parser.add_argument("antigo", nargs="?", default=None, help="Parquet antigo (padrão: versão anterior do snapshot)")
+    parser.add_argument("novo", nargs="?", default=None, help="Parquet novo (padrão: snapshot atual)")
+    parser.add_argument("--particoes", type=int, default=PARTICOES_PADRAO, help="Partições por hash da ChaveItem (padrão: 32)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE_PADRAO, help="Linhas por lote de leitura (padrão: 500000)")
+    parser.add_argument("--temp", type=str, default=None, help="Diretório para as partições temporárias")
+    parser.add_argument("--top", type=int, default=15, help="Clientes no relatório (padrão: 15)")
+    parser.add_argument("--saida", type=str, default=None, help="Grava o resumo por cliente em CSV")
+    parser.add_argument("--detalhe", type=str, default=None, help="Grava os itens afetados em Parquet")
+    parser.add_argument(
+        "--sql-local", nargs="?", const="", default=None, metavar="DIR",
+        help="Usa os snapshots das fixtures locais (ver sql_local.py)",
+    )
+    args = parser.parse_args()
+
+    if args.antigo is None or args.novo is None:
+        chave = chave_snapshot(QUERY_FACT, http_path_origem(args.sql_local))
+        args.novo = args.novo or caminho_snapshot(chave)
+        args.antigo = args.antigo or caminho_snapshot(chave + SUFIXO_ANTERIOR)
+    for caminho in (args.antigo, args.novo):
+        if not os.path.exists(caminho):
+            print(f"❌ Snapshot não encontrado: {caminho}")
+            print("   A versão anterior só existe depois de uma atualização do snapshot (TTL vencido ou --refresh).")
+            sys.exit(1)
+
+    print(f"🔍 Antigo: {args.antigo}\n   Novo:   {args.novo}")
+    inicio = time.perf_counter()
+    resultado = comparar_snapshots(
+        args.antigo, args.novo, args.particoes, args.batch_size, args.temp, detalhe=bool(args.detalhe),
+    )
+    imprimir_relatorio(resultado, args.top)
+    print(f"\n  ⏱️  {time.perf_counter() - inicio:.1f}s")
+
+    if args.saida:
+        resultado["por_cliente"].to_csv(args.saida, index=False, sep=";", decimal=",")
+        print(f"   💾 Resumo por cliente em {args.saida}")
+    if args.detalhe:
+        resultado["detalhe"].to_parquet(args.detalhe, index=False)
+        print(f"   💾 {len(resultado['detalhe']):,} itens afetados em {args.detalhe}")
+
+
+if __name__ == "__main__":
+    main()
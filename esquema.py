@@ -0,0 +1,82 @@
+"""
+Esquema tipado em memória da Fact e do formulário.
+
+Em vez de cada script criar cópias texto de NumeroOS (`astype(str).str.strip()`)
+e manter os textos repetidos como objetos Python, a conversão Arrow → pandas
+passa por aqui uma vez:
+  - NumeroOS vira chave inteira (int64); no formulário, normalizar_os aceita
+    "123", " 123 ", 123.0 e "123.0" e devolve a mesma chave (Int64);
+  - colunas de texto de baixa cardinalidade viram categóricas (dicionário
+    Arrow), com categorias em ordem alfabética para que ordenações e groupby
+    saiam na mesma ordem dos textos;
+  - colunas de valor (DECIMAL no warehouse, que o pandas traria como
+    objetos Decimal) viram float64.
+"""
+
+CHAVE_OS = "NumeroOS"
+
+COLUNAS_CATEGORICAS = (
+    "NomeUsuario",
+    "NomeCliente",
+    "NomeEC",
+    "TipoEC",
+    "UFEC",
+    "AderenciaPrecoReferencial",
+)
+
+COLUNAS_VALOR = (
+    "QuantidadePeca",
+    "ValorUnitarioPeca",
+    "ValorTotalPeca",
+    "ValorUnitarioNegociado",
+    "ValorUnitarioReferencial",
+    "ValorUnitarioHierarquiaReferencial",
+)
+
+
+def normalizar_os(serie):
+    """Número de OS como inteiro (Int64); textos que não são número de OS viram <NA>."""
+    import pandas as pd
+
+    if pd.api.types.is_integer_dtype(serie):
+        return serie.astype("Int64")
+    texto = serie.astype("string").str.strip().str.replace(r"\.0+$", "", regex=True)
+    texto = texto.where(texto.str.fullmatch(r"\d+"))
+    return pd.to_numeric(texto, errors="coerce").astype("Int64")
+
+
+def tipar_tabela(tabela):
+    """Aplica o esquema compacto às colunas presentes de uma pyarrow.Table."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    colunas = []
+    for campo, coluna in zip(tabela.schema, tabela.columns):
+        tipo = campo.type
+        if campo.name == CHAVE_OS and (
+            pa.types.is_integer(tipo) or pa.types.is_decimal(tipo) or pa.types.is_floating(tipo)
+        ):
+            coluna = pc.cast(coluna, pa.int64())
+        elif campo.name in COLUNAS_CATEGORICAS and (pa.types.is_string(tipo) or pa.types.is_large_string(tipo)):
+            coluna = pc.dictionary_encode(coluna)
+        elif campo.name in COLUNAS_VALOR and (pa.types.is_decimal(tipo) or pa.types.is_integer(tipo)):
+            coluna = pc.cast(coluna, pa.float64())
+        colunas.append(coluna)
+    return pa.Table.from_arrays(colunas, names=tabela.column_names).unify_dictionaries()
+
+
+def para_pandas(tabela):
+    """pyarrow.Table → DataFrame já no esquema compacto."""
+    import pandas as pd
+    from perfil import etapa
+
+    with etapa("dataframe") as medidas:
+        df = tipar_tabela(tabela).to_pandas(self_destruct=True, split_blocks=True)
+        for coluna in COLUNAS_CATEGORICAS:
+            if coluna in df.columns and isinstance(df[coluna].dtype, pd.CategoricalDtype):
+                df[coluna] = df[coluna].cat.reorder_categories(sorted(df[coluna].cat.categories))
+        if CHAVE_OS in df.columns and not pd.api.types.is_integer_dtype(df[CHAVE_OS]):
+            df[CHAVE_OS] = normalizar_os(df[CHAVE_OS])
+        medidas["linhas"] = len(df)
+        medidas["bytes"] = int(df.memory_usage().sum())
+    return df
@@ -0,0 +1,148 @@
+"""
+Camada compartilhada de extração do SQL Warehouse.
+
+Em vez de cursor.fetchall() (milhões de tuplas Python convertidas depois em
+DataFrame), busca o resultado em lotes Arrow de tamanho limitado e monta as
+colunas tipadas diretamente. Mostra o progresso (linhas e bytes) e aborta se
+o resultado ultrapassar o teto de memória configurado.
+
+Com `cancelar` (threading.Event), a query é submetida com execute_async e
+acompanhada por polling: acionar o evento (ex.: Ctrl-C na thread principal)
+cancela o statement no warehouse em vez de deixá-lo rodando até o fim.
+
+Uso:
+  from extracao import fetch_dataframe
+  df = fetch_dataframe(conn, QUERY_FACT, batch_size=200_000, limite_memoria_mb=2048)
+"""
+
+import sys
+import time
+
+from perfil import etapa
+
+BATCH_SIZE_PADRAO = 100_000
+LIMITE_MEMORIA_MB_PADRAO = 4096
+INTERVALO_POLLING_S = 0.5
+
+
+class LimiteMemoriaExcedido(RuntimeError):
+    """O resultado da query passou do teto de memória configurado."""
+
+
+class ExtracaoCancelada(RuntimeError):
+    """A extração foi cancelada (o statement remoto também)."""
+
+
+def _formatar_bytes(n):
+    """Formata bytes em MB/GB para o indicador de progresso."""
+    if n >= 1024 ** 3:
+        return f"{n / 1024 ** 3:.2f} GB"
+    return f"{n / 1024 ** 2:.1f} MB"
+
+
+def _imprimir_progresso(linhas, nbytes, inicio, final=False):
+    decorrido = time.perf_counter() - inicio
+    msg = f"   ⏳ {linhas:>12,} linhas | {_formatar_bytes(nbytes):>10} | {decorrido:6.1f}s"
+    if final:
+        print(msg + " " * 4)
+    else:
+        print(msg, end="\r")
+        sys.stdout.flush()
+
+
+def _cancelar(cursor):
+    cursor.cancel()
+    raise ExtracaoCancelada("Extração cancelada; statement cancelado no warehouse.")
+
+
+def _executar(cursor, query, cancelar=None, parametros=None):
+    """
+    cursor.execute, ou execute_async + polling quando há `cancelar` e o
+    conector suporta (databricks-sql-connector, sql_local.CursorLocal).
+    parametros: bind parameters nomeados (:nome na query).
+    """
+    argumentos = (query, parametros) if parametros else (query,)
+    if cancelar is None or not hasattr(cursor, "execute_async"):
+        cursor.execute(*argumentos)
+        return
+    cursor.execute_async(*argumentos)
+    intervalo = 0.05
+    while cursor.is_query_pending():
+        if cancelar.wait(intervalo):
+            _cancelar(cursor)
+        intervalo = min(intervalo * 2, INTERVALO_POLLING_S)
+    cursor.get_async_execution_result()
+
+
+def fetch_arrow(conn, query, batch_size=BATCH_SIZE_PADRAO,
+                limite_memoria_mb=LIMITE_MEMORIA_MB_PADRAO, progresso=True, cancelar=None,
+                parametros=None):
+    """
+    Executa a query e devolve o resultado como pyarrow.Table, lendo em lotes.
+
+    parametros: dict dos bind parameters nomeados (:nome) da query.
+    cancelar: threading.Event opcional; se acionado durante a execução ou a
+    transferência, cancela o statement e levanta ExtracaoCancelada.
+    """
+    import pyarrow as pa
+
+    limite_bytes = limite_memoria_mb * 1024 * 1024 if limite_memoria_mb else None
+    cursor = conn.cursor()
+    try:
+        with etapa("execucao"):
+            _executar(cursor, query, cancelar, parametros)
+
+        lotes = []
+        schema = None
+        linhas = 0
+        nbytes = 0
+        inicio = time.perf_counter()
+
+        with etapa("transferencia") as medidas:
+            while True:
+                if cancelar is not None and cancelar.is_set():
+                    if progresso:
+                        print()
+                    _cancelar(cursor)
+                tabela = cursor.fetchmany_arrow(batch_size)
+                if schema is None:
+                    schema = tabela.schema
+                if tabela.num_rows == 0:
+                    break
+
+                linhas += tabela.num_rows
+                nbytes += tabela.nbytes
+                medidas["linhas"] = linhas
+                medidas["bytes"] = nbytes
+                if limite_bytes and nbytes > limite_bytes:
+                    if progresso:
+                        print()
+                    raise LimiteMemoriaExcedido(
+                        f"Resultado passou de {limite_memoria_mb:,} MB após {linhas:,} linhas. "
+                        f"Aumente --max-memoria-mb ou restrinja a query."
+                    )
+                lotes.extend(tabela.to_batches())
+
+                if progresso:
+                    _imprimir_progresso(linhas, nbytes, inicio)
+
+        if progresso:
+            _imprimir_progresso(linhas, nbytes, inicio, final=True)
+
+        return pa.Table.from_batches(lotes, schema=schema)
+    finally:
+        cursor.close()
+
+
+def fetch_dataframe(conn, query, batch_size=BATCH_SIZE_PADRAO,
+                    limite_memoria_mb=LIMITE_MEMORIA_MB_PADRAO, progresso=True):
+    """Executa a query e devolve um DataFrame construído a partir dos lotes Arrow."""
+    tabela = fetch_arrow(
+        conn, query,
+        batch_size=batch_size,
+        limite_memoria_mb=limite_memoria_mb,
+        progresso=progresso,
+    )
+    # self_destruct libera cada coluna Arrow assim que ela é convertida,
+    # evitando manter as duas cópias (Arrow + pandas) inteiras ao mesmo tempo.
+    return tabela.to_pandas(self_destruct=True, split_blocks=True)
@@ -0,0 +1,226 @@
+"""
+Extração da Fact em fatias mensais de DataAprovacao1OS, em paralelo.
+
+A QUERY_FACT é uma única instrução que varre tudo desde 2025-04-01: se a
+leitura trava no meio, começa-se do zero. Aqui o intervalo é dividido em
+fatias de N meses alinhadas ao calendário (as mesmas fronteiras de
+DimCalendario), executadas ao mesmo tempo em um pool limitado de conexões
+do warehouse e concatenadas na ordem das fatias.
+
+Cada fatia é uma unidade de cache própria (cache_snapshot): uma execução
+interrompida reaproveita as fatias já gravadas, e só as fatias que falharam
+são tentadas de novo, depois de uma espera exponencial com jitter (um
+warehouse sobrecarregado não recebe a mesma rajada em seguida).
+
+Uso:
+  python validar_formularios.py --paralelo 4
+  python validar_formularios.py --paralelo 8 --fatia-meses 2
+"""
+
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+
+PARALELO_PADRAO = 4
+FATIA_MESES_PADRAO = 1
+TENTATIVAS_PADRAO = 3
+ESPERA_INICIAL_S = 2.0
+ESPERA_MAXIMA_S = 60.0
+
+
+class FalhaExtracaoFatias(RuntimeError):
+    """Alguma fatia continuou falhando depois de todas as tentativas."""
+
+
+def _somar_meses(dia, meses):
+    total = dia.year * 12 + dia.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def fatias_mensais(inicio, fatia_meses=FATIA_MESES_PADRAO, hoje=None):
+    """
+    Fatias [desde, ate) de fatia_meses meses, do mês de `inicio` até o mês atual.
+
+    A primeira fatia começa em `inicio`; a última fica aberta (ate=None), para
+    não perder aprovações com data futura.
+    """
+    hoje = hoje or date.today()
+    fatias = []
+    desde = inicio
+    while True:
+        ate = _somar_meses(date(desde.year, desde.month, 1), fatia_meses)
+        if ate > hoje:
+            fatias.append((desde, None))
+            return fatias
+        fatias.append((desde, ate))
+        desde = ate
+
+
+def _rotulo(fatia):
+    desde, ate = fatia
+    return f"{desde:%Y-%m-%d} → {ate:%Y-%m-%d}" if ate else f"{desde:%Y-%m-%d} → …"
+
+
+def espera_tentativa(tentativa):
+    """Segundos antes da tentativa N (N ≥ 2): exponencial limitado, com jitter de ±50%."""
+    base = min(ESPERA_MAXIMA_S, ESPERA_INICIAL_S * 2 ** (tentativa - 2))
+    return base * random.uniform(0.5, 1.5)
+
+
+def extrair_em_fatias(abrir_conexao, http_path, paralelo=PARALELO_PADRAO,
+                      fatia_meses=FATIA_MESES_PADRAO, tentativas=TENTATIVAS_PADRAO,
+                      batch_size=None, limite_memoria_mb=None, ttl_horas=None,
+                      refresh=False, diretorio=None, cancelar=None, conn=None):
+    """
+    Extrai a QUERY_FACT fatia a fatia e devolve a pyarrow.Table concatenada.
+
+    abrir_conexao: função sem argumentos que abre uma conexão do warehouse;
+    as conexões ficam em um pool (no máximo `paralelo` abertas) e são
+    reutilizadas entre fatias e tentativas. conn: conexão do chamador, que
+    entra no pool como a primeira (e não é encerrada aqui).
+    O teto de memória vale para cada fatia e para o resultado concatenado.
+    cancelar (threading.Event) cancela os statements em andamento e a espera
+    entre tentativas.
+    """
+    import pyarrow as pa
+
+    from cache_snapshot import (
+        chave_snapshot, gravar_snapshot, ler_metadados, ler_snapshot, snapshot_valido, TTL_HORAS_PADRAO,
+    )
+    from consultas import DATA_INICIAL, montar_query_fact_fatia
+    from extracao import (
+        fetch_arrow, BATCH_SIZE_PADRAO, LIMITE_MEMORIA_MB_PADRAO, ExtracaoCancelada, LimiteMemoriaExcedido,
+    )
+
+    batch_size = batch_size or BATCH_SIZE_PADRAO
+    limite_memoria_mb = limite_memoria_mb or LIMITE_MEMORIA_MB_PADRAO
+    fatias = fatias_mensais(date.fromisoformat(DATA_INICIAL), fatia_meses)
+    print(f"   🧩 {len(fatias)} fatias de {fatia_meses} mês(es), até {paralelo} em paralelo")
+
+    livres = queue.SimpleQueue()
+    conexoes = []  # só as abertas aqui; a do chamador fica com ele
+    if conn is not None:
+        livres.put(conn)
+    trava = threading.Lock()
+
+    def avisar(msg):
+        with trava:
+            print(msg, flush=True)
+
+    def pegar_conexao():
+        try:
+            return livres.get_nowait()
+        except queue.Empty:
+            conn = abrir_conexao()
+            with trava:
+                conexoes.append(conn)
+            return conn
+
+    def descartar_conexao(conn):
+        with trava:
+            if conn not in conexoes:
+                return
+            conexoes.remove(conn)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def extrair_fatia(fatia):
+        query = montar_query_fact_fatia(*fatia)
+        inicio = time.perf_counter()
+
+        def buscar():
+            conn = pegar_conexao()
+            try:
+                tabela = fetch_arrow(
+                    conn, query,
+                    batch_size=batch_size, limite_memoria_mb=limite_memoria_mb, progresso=False,
+                    cancelar=cancelar,
+                )
+            except (LimiteMemoriaExcedido, ExtracaoCancelada):
+                livres.put(conn)
+                raise
+            except Exception:
+                # conexão possivelmente quebrada: a próxima tentativa abre outra
+                descartar_conexao(conn)
+                raise
+            livres.put(conn)
+            return tabela
+
+        chave = chave_snapshot(query, http_path)
+        if not refresh and snapshot_valido(ler_metadados(chave, diretorio), TTL_HORAS_PADRAO if ttl_horas is None else ttl_horas):
+            tabela = ler_snapshot(chave, diretorio)
+            origem = "snapshot"
+        else:
+            tabela = buscar()
+            desde, ate = fatia
+            gravar_snapshot(chave, tabela, {
+                "http_path": http_path,
+                "modo": "fatia",
+                "desde": desde.isoformat(),
+                "ate": ate.isoformat() if ate else None,
+            }, diretorio)
+            origem = "Databricks"
+        avisar(
+            f"   ✅ Fatia {_rotulo(fatia)}: {tabela.num_rows:,} linhas "
+            f"({origem}, {time.perf_counter() - inicio:.1f}s)"
+        )
+        return tabela
+
+    resultados = {}
+    pendentes = list(fatias)
+    try:
+        for tentativa in range(1, tentativas + 1):
+            if tentativa > 1:
+                espera = espera_tentativa(tentativa)
+                print(
+                    f"   🔁 Tentativa {tentativa}/{tentativas} em {espera:.1f}s: "
+                    f"{len(pendentes)} fatia(s) pendente(s)"
+                )
+                if cancelar is not None:
+                    if cancelar.wait(espera):
+                        raise ExtracaoCancelada("Extração em fatias cancelada durante a espera entre tentativas.")
+                else:
+                    time.sleep(espera)
+            with ThreadPoolExecutor(max_workers=paralelo, thread_name_prefix="fatia") as executor:
+                futuros = {executor.submit(extrair_fatia, fatia): fatia for fatia in pendentes}
+                for futuro in as_completed(futuros):
+                    fatia = futuros[futuro]
+                    try:
+                        resultados[fatia] = futuro.result()
+                    except (LimiteMemoriaExcedido, ExtracaoCancelada):
+                        for f in futuros:
+                            f.cancel()
+                        raise
+                    except Exception as e:
+                        avisar(f"   ⚠️ Fatia {_rotulo(fatia)} falhou: {e}")
+            pendentes = [fatia for fatia in fatias if fatia not in resultados]
+            if not pendentes:
+                break
+    finally:
+        for conn in conexoes:
+            conn.close()
+        if conexoes:
+            print(f"   🔒 {len(conexoes)} conexão(ões) Databricks encerrada(s).")
+
+    if pendentes:
+        raise FalhaExtracaoFatias(
+            f"{len(pendentes)} fatia(s) falharam após {tentativas} tentativas: "
+            + ", ".join(_rotulo(f) for f in pendentes)
+        )
+
+    tabelas = [resultados[fatia] for fatia in fatias]
+    # Uma fatia com uma coluna toda nula traz o tipo null: promove para o tipo das demais
+    schema = pa.unify_schemas([t.schema for t in tabelas], promote_options="permissive")
+    tabela = pa.concat_tables([t.cast(schema) for t in tabelas])
+    if tabela.nbytes > limite_memoria_mb * 1024 * 1024:
+        raise LimiteMemoriaExcedido(
+            f"Resultado concatenado passou de {limite_memoria_mb:,} MB ({tabela.num_rows:,} linhas). "
+            f"Aumente --max-memoria-mb ou restrinja a query."
+        )
+    print(f"   ✅ {tabela.num_rows:,} linhas em {len(fatias)} fatias")
+    return tabela
@@ -0,0 +1,144 @@
+"""
+Filtros de auditoria da Fact: --desde, --ate, --cliente, --aprovador, --uf.
+
+Quem investiga um cliente ou um mês não precisa trazer a Fact inteira: os
+filtros viram bind parameters da QUERY_FACT (consultas.montar_query_fact_filtrada),
+aplicados no WHERE externo e no CTE param_logs, e o warehouse poda cedo.
+
+Os filtros também conversam com o cache: antes de ir ao warehouse, procura-se
+um snapshot que contenha todas as linhas pedidas — a Fact completa ou uma
+extração filtrada mais ampla (mesmo cliente, período maior...) — e ele é
+filtrado localmente com as mesmas regras do SQL:
+  desde/ate  → DataAprovacao1OS em [desde, ate] (dias inteiros)
+  cliente    → NomeCliente ou CodigoCliente
+  aprovador  → NomeUsuario ou CodigoUsuario
+  uf         → UFEC
+
+Uso:
+  python validar_formularios.py --cliente "Cliente 00001" --desde 2025-06-01 --ate 2025-06-30
+  python medidas.py --aprovador 4711 --aprovador "Fulano de Tal" --offline
+"""
+
+from datetime import date, datetime, timedelta
+
+LISTAS = ("cliente", "aprovador", "uf")
+
+# filtro → (coluna do nome, coluna do código) na Fact
+COLUNAS_FILTRO = {
+    "cliente": ("NomeCliente", "CodigoCliente"),
+    "aprovador": ("NomeUsuario", "CodigoUsuario"),
+    "uf": ("UFEC", None),
+}
+
+
+def _dia(texto, opcao):
+    try:
+        return date.fromisoformat(texto).isoformat()
+    except ValueError:
+        raise ValueError(f"{opcao} deve ser uma data yyyy-mm-dd (recebido: {texto!r})") from None
+
+
+def normalizar(desde=None, ate=None, cliente=None, aprovador=None, uf=None):
+    """
+    Dict só com os filtros informados: desde/ate em yyyy-mm-dd (ate inclusivo),
+    listas sem repetição e ordenadas. {} = Fact completa.
+    """
+    filtros = {}
+    if desde:
+        filtros["desde"] = _dia(desde, "--desde")
+    if ate:
+        filtros["ate"] = _dia(ate, "--ate")
+    if "desde" in filtros and "ate" in filtros and filtros["ate"] < filtros["desde"]:
+        raise ValueError(f"--ate ({filtros['ate']}) anterior a --desde ({filtros['desde']})")
+    for nome, valores in (("cliente", cliente), ("aprovador", aprovador), ("uf", uf)):
+        valores = {str(v).strip() for v in (valores or ()) if str(v).strip()}
+        if nome == "uf":
+            valores = {v.upper() for v in valores}
+        if valores:
+            filtros[nome] = sorted(valores)
+    return filtros
+
+
+def descrever(filtros):
+    """Texto curto dos filtros para as mensagens."""
+    partes = []
+    if "desde" in filtros or "ate" in filtros:
+        partes.append(f"{filtros.get('desde', '…')} → {filtros.get('ate', '…')}")
+    for nome in LISTAS:
+        if nome in filtros:
+            partes.append(f"{nome}: {', '.join(filtros[nome])}")
+    return " | ".join(partes)
+
+
+def cobre(amplo, restrito):
+    """True se toda linha que passa em `restrito` também passa em `amplo`."""
+    if "desde" in amplo and restrito.get("desde", "") < amplo["desde"]:
+        return False
+    if "ate" in amplo and ("ate" not in restrito or restrito["ate"] > amplo["ate"]):
+        return False
+    return all(nome in restrito and set(restrito[nome]) <= set(amplo[nome]) for nome in LISTAS if nome in amplo)
+
+
+def filtrar_tabela(tabela, filtros):
+    """Aplica os filtros a uma pyarrow.Table da Fact (mesma semântica do SQL)."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    condicoes = []
+    if "desde" in filtros or "ate" in filtros:
+        data = tabela["DataAprovacao1OS"]
+        if "desde" in filtros:
+            inicio = datetime.fromisoformat(filtros["desde"])
+            condicoes.append(pc.greater_equal(data, pa.scalar(inicio, data.type)))
+        if "ate" in filtros:
+            fim = datetime.fromisoformat(filtros["ate"]) + timedelta(days=1)
+            condicoes.append(pc.less(data, pa.scalar(fim, data.type)))
+    for nome, (coluna_nome, coluna_codigo) in COLUNAS_FILTRO.items():
+        if nome not in filtros:
+            continue
+        valores = pa.array(filtros[nome], pa.string())
+        condicao = pc.is_in(tabela[coluna_nome].cast(pa.string()), value_set=valores)
+        if coluna_codigo is not None:
+            codigo = pc.is_in(tabela[coluna_codigo].cast(pa.string()), value_set=valores)
+            condicao = pc.or_(condicao, codigo)
+        condicoes.append(condicao)
+
+    if not condicoes:
+        return tabela
+    mascara = condicoes[0]
+    for condicao in condicoes[1:]:
+        mascara = pc.and_(mascara, condicao)
+    return tabela.filter(pc.fill_null(mascara, False))
+
+
+def carregar_superconjunto(filtros, http_path, ttl_horas=None, diretorio=None):
+    """
+    Resultado filtrado a partir do menor snapshot em cache que cobre `filtros`
+    (a Fact completa ou uma extração filtrada mais ampla); None se não houver.
+    ttl_horas=None aceita snapshots vencidos.
+    """
+    from cache_snapshot import chave_snapshot, ler_metadados, ler_snapshot, procurar_snapshots, snapshot_valido
+    from consultas import QUERY_FACT
+
+    base = chave_snapshot(QUERY_FACT, http_path)
+    candidatos = []
+    meta_base = ler_metadados(base, diretorio)
+    if meta_base is not None:
+        candidatos.append((base, meta_base, {}))
+    for chave, meta in procurar_snapshots(lambda m: m.get("base") == base and "filtros" in m, diretorio):
+        candidatos.append((chave, meta, meta["filtros"]))
+
+    candidatos = [
+        (chave, meta, amplo) for chave, meta, amplo in candidatos
+        if (ttl_horas is None or snapshot_valido(meta, ttl_horas)) and amplo != filtros and cobre(amplo, filtros)
+    ]
+    if not candidatos:
+        return None
+
+    chave, meta, amplo = min(candidatos, key=lambda c: c[1].get("linhas", float("inf")))
+    tabela = filtrar_tabela(ler_snapshot(chave, diretorio), filtros)
+    print(
+        f"   📦 Reaproveitando snapshot {chave} ({descrever(amplo) or 'Fact completa'}, "
+        f"{meta['linhas']:,} linhas) → {tabela.num_rows:,} linhas filtradas localmente"
+    )
+    return tabela
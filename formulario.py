@@ -0,0 +1,238 @@
+"""
+Carga do formulário "Projeto Preço Parceiro.xlsx" (RespostasFormulario).
+
+A planilha é aberta uma única vez em modo read-only (openpyxl, streaming),
+as colunas de OS / aceite / motivo / Id são resolvidas pelo cabeçalho e só
+elas são lidas. A coluna NumeroOS traz o número da ordem como chave inteira,
+comparável com a Fact. O resultado normalizado fica em cache colunar (Parquet) no
+mesmo diretório dos snapshots da Fact, uma entrada por planilha (chave pelo
+caminho), com o mtime e o tamanho do arquivo nos metadados: enquanto a
+planilha não muda, a carga não reabre o Excel; quando muda, a entrada é
+substituída no lugar, e o cache não cresce a cada gravação da planilha.
+"""
+
+import hashlib
+import os
+
+from cache_snapshot import gravar_snapshot, ler_snapshot, ler_metadados, procurar_snapshots, remover_snapshot
+from esquema import CHAVE_OS, normalizar_os
+from perfil import etapa
+
+ABAS_CONHECIDAS = ["TabelaPrecoParceiro", "Respostas", "Form1", "Sheet1", "Planilha1"]
+CAMINHOS_PADRAO = [
+    os.path.expanduser("~/Downloads/Projeto Preço Parceiro.xlsx"),
+    os.path.expanduser("~/Documents/Projeto Preço Parceiro.xlsx"),
+    os.path.expanduser("~/OneDrive - EDENRED/Documents/Projeto Preço Parceiro.xlsx"),
+]
+
+COL_OS = "Número da ordem"
+COL_ACEITE = "EC aceitou a negociação?"
+COL_MOTIVO = "Qual o motivo da recusa?"
+COL_ID = "Id"
+
+# OS de teste excluídas em RespostasFormularioDistintasOS
+OS_DE_TESTE = {"1", "2", "3", "4", "5"}
+
+# Incrementar quando a normalização mudar, para invalidar os caches antigos
+VERSAO_CACHE = 3
+
+
+def _achar_coluna_os(cabecalho):
+    """Mesma heurística do script original para achar a coluna de número da ordem."""
+    for col in cabecalho:
+        nome = str(col).lower()
+        if "mero da ordem" in nome or "numero" in nome.replace("ú", "u"):
+            return col
+        if "ordem" in nome and "n" in nome:
+            return col
+    for col in cabecalho:
+        if "ordem" in str(col).lower():
+            return col
+    return None
+
+
+def _achar_coluna(cabecalho, *trechos):
+    for col in cabecalho:
+        if any(t in str(col).lower() for t in trechos):
+            return col
+    return None
+
+
+def _texto_celula(valor):
+    """Valor de célula como texto aparado; números inteiros sem o '.0' do Excel."""
+    if valor is None:
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    texto = str(valor).strip()
+    return texto or None
+
+
+def chave_formulario(excel_path):
+    """Chave do cache: caminho absoluto da planilha (a versão do arquivo fica nos metadados)."""
+    h = hashlib.sha256(f"{os.path.abspath(excel_path)}|v{VERSAO_CACHE}".encode("utf-8"))
+    return "formulario-" + h.hexdigest()[:20]
+
+
+def assinatura_planilha(excel_path):
+    """(mtime_ns, tamanho) da planilha; None se ela sumiu (OneDrive trocando a cópia)."""
+    try:
+        info = os.stat(excel_path)
+    except FileNotFoundError:
+        return None
+    return info.st_mtime_ns, info.st_size
+
+
+def _cache_atual(meta, assinatura):
+    return meta is not None and assinatura is not None and (meta.get("mtime_ns"), meta.get("tamanho")) == assinatura
+
+
+def ler_planilha(excel_path, avisos=True):
+    """
+    Lê da planilha só as colunas necessárias, em uma única passada read-only.
+
+    avisos=False cala as mensagens de aba/coluna (releituras do modo --watch).
+    """
+    import pandas as pd
+    from openpyxl import load_workbook
+
+    def avisar(msg):
+        if avisos:
+            print(msg)
+
+    wb = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        avisar(f"   Abas disponíveis: {wb.sheetnames}")
+        aba = next((a for a in ABAS_CONHECIDAS if a in wb.sheetnames), None)
+        if aba:
+            avisar(f"   Usando aba: '{aba}'")
+        else:
+            aba = wb.sheetnames[0]
+            avisar(f"   Usando primeira aba: '{aba}'")
+        ws = wb[aba]
+
+        linhas = ws.iter_rows(values_only=True)
+        cabecalho = [c for c in next(linhas, ())]
+        nomes = [str(c) if c is not None else "" for c in cabecalho]
+
+        col_os = _achar_coluna_os(nomes)
+        if col_os is None:
+            print("   ❌ Não consegui identificar a coluna de número da ordem.")
+            print(f"   Colunas: {nomes}")
+            return None
+        avisar(f"   Coluna de OS: '{col_os}'")
+
+        colunas = {COL_OS: nomes.index(col_os)}
+        col_aceite = _achar_coluna(nomes, "aceitou", "aceita")
+        if col_aceite:
+            colunas[COL_ACEITE] = nomes.index(col_aceite)
+        else:
+            avisar(f"   ⚠️ Coluna '{COL_ACEITE}' não encontrada.")
+            avisar(f"   Colunas: {nomes}")
+        col_motivo = _achar_coluna(nomes, "motivo")
+        if col_motivo:
+            colunas[COL_MOTIVO] = nomes.index(col_motivo)
+        if COL_ID in nomes:
+            colunas[COL_ID] = nomes.index(COL_ID)
+
+        dados = {nome: [] for nome in colunas}
+        for linha in linhas:
+            for nome, i in colunas.items():
+                dados[nome].append(linha[i] if i < len(linha) else None)
+    finally:
+        wb.close()
+
+    df = pd.DataFrame({
+        nome: [_texto_celula(v) for v in valores] for nome, valores in dados.items() if nome != COL_ID
+    })
+    if COL_ID in dados:
+        df[COL_ID] = pd.to_numeric(pd.Series(dados[COL_ID], dtype="object"), errors="coerce").astype("Int64")
+
+    df = df[df[COL_OS].notna()].reset_index(drop=True)
+    # Chave inteira de OS, a mesma da Fact (esquema.py)
+    df[CHAVE_OS] = normalizar_os(df[COL_OS])
+    return df
+
+
+def respostas_distintas_os(df):
+    """
+    Mesma regra de RespostasFormularioDistintasOS: descarta OS vazia, remove as
+    OS de teste 1–5 e mantém só a última resposta (maior Id) de cada OS.
+    """
+    df = df[df[COL_OS].notna() & ~df[COL_OS].isin(OS_DE_TESTE)]
+    if COL_ID in df.columns:
+        df = df.sort_values(COL_ID, ascending=False, kind="stable", na_position="last")
+    return df.drop_duplicates(subset=[COL_OS], keep="first").reset_index(drop=True)
+
+
+def caminho_planilha(excel_path=None):
+    """O caminho informado, se existir, ou o primeiro dos CAMINHOS_PADRAO encontrado; None se nenhum."""
+    if excel_path and os.path.exists(excel_path):
+        return excel_path
+    return next((p for p in CAMINHOS_PADRAO if os.path.exists(p)), None)
+
+
+def gravar_cache_planilha(excel_path, df, assinatura=None):
+    """
+    Grava o DataFrame lido da planilha no cache colunar, substituindo a entrada
+    da planilha (chave_formulario). assinatura: assinatura_planilha tirada
+    antes da leitura; se o arquivo mudou desde então, o conteúdo lido pode ser
+    de uma versão anterior e não é gravado (devolve False). None usa a do
+    arquivo agora.
+    """
+    import pyarrow as pa
+
+    if assinatura is None:
+        assinatura = assinatura_planilha(excel_path)
+    elif assinatura_planilha(excel_path) != assinatura:
+        return False
+    arquivo = os.path.abspath(excel_path)
+    mtime_ns, tamanho = assinatura
+    chave = chave_formulario(excel_path)
+    gravar_snapshot(chave, pa.Table.from_pandas(df, preserve_index=False),
+                    {"arquivo": arquivo, "mtime_ns": mtime_ns, "tamanho": tamanho, "versao": VERSAO_CACHE})
+    # Entradas da mesma planilha com outra chave (esquema antigo, uma por gravação)
+    for antiga, _ in procurar_snapshots(lambda m: m.get("arquivo") == arquivo):
+        if antiga != chave:
+            remover_snapshot(antiga)
+    return True
+
+
+def load_formulario(excel_path=None, distintas=False, usar_cache=True):
+    """
+    Carrega os dados do formulário (RespostasFormulario).
+
+    distintas=True aplica a deduplicação de RespostasFormularioDistintasOS.
+    """
+    if not (excel_path and os.path.exists(excel_path)):
+        print("\n⚠️  Arquivo Excel do formulário não encontrado.")
+        print("   Procurando localmente...")
+        encontrado = caminho_planilha()
+        if encontrado:
+            print(f"   Encontrado: {encontrado}")
+            return load_formulario(encontrado, distintas=distintas, usar_cache=usar_cache)
+
+        print("   ❌ Não encontrado. Use --excel para informar o caminho.")
+        print("   O script vai continuar apenas com os dados do Databricks.\n")
+        return None
+
+    print(f"\n📋 Carregando formulário de: {excel_path}")
+    chave = chave_formulario(excel_path)
+    assinatura = assinatura_planilha(excel_path)
+
+    if usar_cache and _cache_atual(ler_metadados(chave), assinatura):
+        df = ler_snapshot(chave).to_pandas()
+        print(f"   📦 Usando cache da planilha ({chave})")
+    else:
+        with etapa("planilha") as medidas:
+            df = ler_planilha(excel_path)
+            medidas["linhas"] = 0 if df is None else len(df)
+        if df is None:
+            return None
+        if usar_cache:
+            gravar_cache_planilha(excel_path, df, assinatura)
+
+    if distintas:
+        df = respostas_distintas_os(df)
+    print(f"   ✅ {len(df):,} respostas carregadas")
+    return df
@@ -0,0 +1,295 @@
+"""
+Modo --watch: métricas do formulário atualizadas a cada resposta nova.
+
+As respostas chegam continuamente na tabela TabelaPrecoParceiro da planilha e
+cada conferência recarregava tudo. Aqui a Fact é resumida uma única vez em
+itens por (cliente, OS), ordenados por OS, e o formulário vira estado
+incremental:
+  por Id  → (OS, recusa) da linha, para saber o que mudou entre leituras;
+  por OS  → {Id: recusa} das respostas da OS — respostas, recusas e a
+            resposta de maior Id (a regra de RespostasFormularioDistintasOS,
+            aqui pela chave NumeroOS: "1009686" e "1009686.0" são a mesma OS).
+
+Quando a planilha muda, as linhas são comparadas por Id (novas, alteradas,
+removidas) e só as OS tocadas são reavaliadas: para cada uma, os clientes da
+OS na Fact (uma fatia contígua via searchsorted) recebem a diferença entre o
+estado novo e o antigo — COUNT soma itens × Δrespostas, DISTINCTCOUNT soma
+Δ(OS tem resposta), e o mesmo para recusas. Os totais por cliente são os de
+contagens.contagens_por_cliente, mais "recusa na última resposta" (OS cuja
+resposta de maior Id é "Não", sem as OS de teste 1–5).
+
+O xlsx é um zip de XML: não dá para ler só o fim do arquivo. Cada mudança
+relê as colunas necessárias em uma passada read-only (formulario.ler_planilha)
+e compara por Id de forma vetorizada; a atualização das métricas custa
+proporcional às respostas novas/alteradas. Linhas sem Id não têm como ser
+rastreadas: ficam em um balde por OS recontado a cada leitura (entram em
+respostas/recusas como no relatório; a "última resposta" de uma OS só com
+linhas sem Id é a primeira delas, como em respostas_distintas_os), então os
+totais continuam iguais aos de contagens_por_cliente.
+
+O estado parte do DataFrame que validar_formularios já carregou; regravar o
+cache da planilha a cada mudança é opcional (--watch-cache).
+
+Uso:
+  python validar_formularios.py --excel "Projeto Preço Parceiro.xlsx" --offline --watch
+  python validar_formularios.py --pushdown --watch --intervalo 10
+"""
+
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from formulario import COL_ACEITE, COL_ID, OS_DE_TESTE, assinatura_planilha
+
+METRICAS = (
+    "count_formularios",
+    "distinctcount_formularios",
+    "count_recusas",
+    "distinctcount_recusas",
+    "recusas_ultima_resposta",
+)
+OS_TESTE = {int(os_) for os_ in OS_DE_TESTE}
+SEM_RESPOSTA = (0, 0, False)
+
+
+class MetricasFormulario:
+    """Totais por cliente de COUNT/DISTINCTCOUNT de respostas e recusas, atualizados por Id."""
+
+    def __init__(self, df_fact, col_itens=None, col_os="NumeroOS", col_cliente="NomeCliente"):
+        import numpy as np
+        import pandas as pd
+
+        grupos = df_fact.groupby([col_cliente, col_os], observed=True)
+        itens = (grupos[col_itens].sum() if col_itens else grupos.size()).rename("itens").reset_index()
+        itens = itens.sort_values(col_os, kind="stable")
+
+        codigos, self.clientes = pd.factorize(itens[col_cliente], sort=True)
+        self._os = itens[col_os].to_numpy(np.int64)
+        self._cliente = codigos
+        self._itens = itens["itens"].to_numpy(np.int64)
+
+        n = len(self.clientes)
+        self.os_distintas = np.bincount(codigos, minlength=n)
+        self.totais = {nome: np.zeros(n, dtype=np.int64) for nome in METRICAS}
+
+        self.soma = dict.fromkeys(METRICAS, 0)
+
+        self._linhas = pd.DataFrame({"os": pd.Series(dtype="Int64"), "recusa": pd.Series(dtype=bool)})
+        self._por_os = {}
+        self._sem_id = {}  # OS → recusas das linhas sem Id, na ordem da planilha
+        self.sem_id = 0
+
+    def _estado_os(self, os_):
+        """(respostas, recusas, última resposta é recusa) da OS."""
+        respostas = self._por_os.get(os_, {})
+        avulsas = self._sem_id.get(os_, ())
+        if not respostas and not avulsas:
+            return SEM_RESPOSTA
+        ultima = respostas[max(respostas)] if respostas else avulsas[0]
+        return len(respostas) + len(avulsas), sum(respostas.values()) + sum(avulsas), ultima and os_ not in OS_TESTE
+
+    def _ajustar(self, os_, antes, depois, anteriores):
+        """
+        Aplica aos clientes da OS a diferença entre dois estados. `anteriores`
+        recebe os totais de cada cliente antes do primeiro ajuste.
+        """
+        inicio, fim = self._os.searchsorted(os_, "left"), self._os.searchsorted(os_, "right")
+        if inicio == fim:
+            return
+        clientes, itens = self._cliente[inicio:fim], self._itens[inicio:fim]
+        for codigo in clientes.tolist():
+            if codigo not in anteriores:
+                anteriores[codigo] = self.linha(codigo)
+        (resp_a, rec_a, ult_a), (resp_d, rec_d, ult_d) = antes, depois
+        deltas = {
+            "count_formularios": itens * (resp_d - resp_a),
+            "distinctcount_formularios": (resp_d > 0) - (resp_a > 0),
+            "count_recusas": itens * (rec_d - rec_a),
+            "distinctcount_recusas": (rec_d > 0) - (rec_a > 0),
+            "recusas_ultima_resposta": int(ult_d) - int(ult_a),
+        }
+        for nome, delta in deltas.items():
+            # Pares (cliente, OS) são distintos: cada cliente aparece uma vez na fatia
+            self.totais[nome][clientes] += delta
+            self.soma[nome] += int(delta.sum()) if hasattr(delta, "sum") else delta * len(clientes)
+
+    def aplicar(self, df_form):
+        """
+        Incorpora uma leitura completa do formulário, mexendo só no que mudou por Id.
+
+        Retorna {"novas", "alteradas", "removidas", "sem_id", "os", "antes"} —
+        "antes" mapeia o código (índice de self.clientes) de cada cliente
+        afetado aos seus totais anteriores.
+        """
+        import pandas as pd
+
+        if COL_ID not in df_form.columns:
+            raise ValueError(f"o modo --watch precisa da coluna '{COL_ID}' na planilha")
+
+        ids = df_form[COL_ID]
+        recusa = df_form[COL_ACEITE].eq("Não").fillna(False) if COL_ACEITE in df_form.columns else False
+        atual = pd.DataFrame({"os": df_form["NumeroOS"].astype("Int64"), "recusa": recusa})
+        atual.index = ids
+        com_id = ids.notna().to_numpy()
+
+        # Balde das linhas sem Id, recontado inteiro: só as OS cujo balde mudou entram
+        sem_id = {}
+        for os_, e_recusa in atual[~com_id].dropna(subset=["os"]).itertuples(index=False):
+            sem_id.setdefault(int(os_), []).append(bool(e_recusa))
+        sem_id = {os_: tuple(v) for os_, v in sem_id.items()}
+        self.sem_id = int((~com_id).sum())
+
+        atual = atual[com_id]
+        atual = atual[~atual.index.duplicated(keep="last")]
+
+        anterior = self._linhas
+        comuns = anterior.index.intersection(atual.index)
+        antes, depois = anterior.loc[comuns], atual.loc[comuns]
+        mesma_os = antes["os"].eq(depois["os"]).fillna(antes["os"].isna() & depois["os"].isna())
+        iguais = (mesma_os & antes["recusa"].eq(depois["recusa"])).to_numpy(bool)
+        alteradas = comuns[~iguais]
+        novas = atual.index.difference(anterior.index)
+        removidas = anterior.index.difference(atual.index)
+
+        saindo = [(id_, anterior.at[id_, "os"]) for id_ in removidas.append(alteradas)]
+        entrando = [(id_, atual.at[id_, "os"], bool(atual.at[id_, "recusa"])) for id_ in novas.append(alteradas)]
+
+        # Estado de cada OS tocada antes de qualquer mudança
+        estados = {}
+        for os_ in [os_ for _, os_ in saindo] + [os_ for _, os_, _ in entrando]:
+            if os_ is not pd.NA and os_ not in estados:
+                estados[int(os_)] = self._estado_os(int(os_))
+        for os_ in self._sem_id.keys() | sem_id.keys():
+            if self._sem_id.get(os_) != sem_id.get(os_) and os_ not in estados:
+                estados[os_] = self._estado_os(os_)
+        self._sem_id = sem_id
+
+        for id_, os_ in saindo:
+            if os_ is not pd.NA:
+                respostas = self._por_os[int(os_)]
+                del respostas[id_]
+                if not respostas:
+                    del self._por_os[int(os_)]
+        for id_, os_, e_recusa in entrando:
+            if os_ is not pd.NA:
+                self._por_os.setdefault(int(os_), {})[id_] = e_recusa
+
+        anteriores = {}
+        for os_, antes_os in estados.items():
+            depois_os = self._estado_os(os_)
+            if depois_os != antes_os:
+                self._ajustar(os_, antes_os, depois_os, anteriores)
+
+        self._linhas = atual
+        return {
+            "novas": len(novas),
+            "alteradas": len(alteradas),
+            "removidas": len(removidas),
+            "sem_id": self.sem_id,
+            "os": len(estados),
+            "antes": dict(sorted(anteriores.items())),
+        }
+
+    def linha(self, codigo):
+        """Totais de um cliente (código) como dict."""
+        return {nome: int(valores[codigo]) for nome, valores in self.totais.items()}
+
+    def resultado(self):
+        """DataFrame no formato de contagens.contagens_por_cliente (+ recusas_ultima_resposta)."""
+        import pandas as pd
+
+        return pd.DataFrame({"NomeCliente": self.clientes, "os_distintas": self.os_distintas, **self.totais})
+
+
+def _ler(caminho):
+    """Relê a planilha sem as mensagens de aba/coluna; None se ela ainda está sendo gravada."""
+    import zipfile
+
+    from formulario import ler_planilha
+
+    try:
+        return ler_planilha(caminho, avisos=False)
+    except (zipfile.BadZipFile, OSError, KeyError, EOFError):
+        return None
+
+
+def _celulas(totais):
+    diff = totais["count_formularios"] - totais["distinctcount_formularios"]
+    diff_r = totais["count_recusas"] - totais["distinctcount_recusas"]
+    return (
+        f"{totais['count_formularios']:>8,} {totais['distinctcount_formularios']:>9,} {diff:>+6} "
+        f"{totais['count_recusas']:>8,} {totais['distinctcount_recusas']:>7,} {diff_r:>+7} "
+        f"{totais['recusas_ultima_resposta']:>7,}"
+    )
+
+
+def imprimir_mudancas(metricas, mudancas, segundos_leitura, segundos_calculo):
+    """Uma linha de resumo da atualização e, por cliente afetado, os totais novos (com o delta de COUNT/DISTINCT)."""
+    sem_id = f" | {mudancas['sem_id']} sem {COL_ID} (recontadas)" if mudancas["sem_id"] else ""
+    print(
+        f"\n🔔 {datetime.now().strftime('%H:%M:%S')}  "
+        f"+{mudancas['novas']} novas | {mudancas['alteradas']} alteradas | {mudancas['removidas']} removidas{sem_id}"
+        f" → {mudancas['os']} OS, {len(mudancas['antes'])} clientes"
+        f"  (leitura {segundos_leitura:.2f}s, atualização {1000 * segundos_calculo:.1f}ms)"
+    )
+    if not mudancas["antes"]:
+        return
+    print(f"  {'Cliente':<30} {'COUNT':>8} {'DISTINCT':>9} {'DIFF':>6} {'COUNT_R':>8} {'DIST_R':>7} {'DIFF_R':>7} {'ULT_R':>7}")
+    for codigo, antes in mudancas["antes"].items():
+        atual = metricas.linha(codigo)
+        delta = (
+            atual["count_formularios"] - antes["count_formularios"],
+            atual["distinctcount_formularios"] - antes["distinctcount_formularios"],
+        )
+        print(f"  {str(metricas.clientes[codigo])[:29]:<30} {_celulas(atual)}   (COUNT {delta[0]:+}, DISTINCT {delta[1]:+})")
+    print(f"  {'TOTAL':<30} {_celulas(metricas.soma)}")
+
+
+def vigiar(excel_path, df_fact, df_form=None, assinatura=None, col_itens=None, intervalo=5.0,
+           gravar_cache=False):
+    """
+    Acompanha a planilha até Ctrl-C, atualizando as métricas a cada gravação.
+
+    df_form/assinatura: a leitura que o chamador já fez da planilha e a
+    assinatura_planilha tirada antes dela; sem elas, a planilha é lida aqui.
+    A mudança é detectada por (mtime, tamanho) a cada `intervalo` segundos;
+    uma leitura que falha (arquivo no meio da gravação/sincronização) é
+    repetida no próximo ciclo. Com gravar_cache, cada leitura também regrava
+    o cache da planilha, e a próxima execução normal já começa dele.
+    """
+    from formulario import gravar_cache_planilha
+
+    metricas = MetricasFormulario(df_fact, col_itens=col_itens)
+    if df_form is None:
+        assinatura = assinatura_planilha(excel_path)
+        df_form = _ler(excel_path)
+        if df_form is None:
+            raise ValueError(f"não consegui ler {excel_path}")
+    metricas.aplicar(df_form)
+    if metricas.sem_id:
+        print(f"   ℹ️ {metricas.sem_id:,} linhas sem {COL_ID}: recontadas a cada leitura, sem rastreio de mudanças")
+
+    print(f"\n👀 Acompanhando {excel_path} a cada {intervalo:g}s (Ctrl-C encerra)")
+    while True:
+        time.sleep(intervalo)
+        atual = assinatura_planilha(excel_path)
+        if atual is None or atual == assinatura:
+            continue
+
+        inicio = time.perf_counter()
+        df = _ler(excel_path)
+        if df is None:
+            print("   ⏳ Planilha em gravação; tento de novo no próximo ciclo")
+            continue
+        lida = time.perf_counter()
+        assinatura = atual
+
+        mudancas = metricas.aplicar(df)
+        imprimir_mudancas(metricas, mudancas, lida - inicio, time.perf_counter() - lida)
+        # Chave/validação do cache pela assinatura de antes da leitura; se a
+        # planilha foi gravada de novo no meio, o próximo ciclo relê e grava
+        if gravar_cache and not gravar_cache_planilha(excel_path, df, atual):
+            print("   ⏳ Planilha mudou durante a leitura; cache fica para o próximo ciclo")
@@ -0,0 +1,70 @@
+"""
+Atualização incremental do snapshot da Fact por watermark.
+
+Em vez de re-extrair tudo desde 2025-04-01, busca apenas os itens tocados
+desde (watermark - lookback): novas aprovações, cancelamentos/reprovações
+tardios, OS com novo envio de preço parceiro e clientes cujo parâmetro 586
+(aprovadores) mudou. O snapshot é atualizado por ChaveItem: todas as linhas
+dos itens tocados saem e entram as linhas atuais desses itens.
+
+Mudanças em dimensões (nome de cliente/EC etc.) não são detectadas —
+rode um --refresh completo de tempos em tempos.
+"""
+
+from datetime import timedelta
+
+from consultas import montar_query_chaves_incremental, montar_query_fact_incremental
+
+LOOKBACK_DIAS_PADRAO = 7
+COLUNAS_WATERMARK = ["DataAprovacao1OS", "DataEnvioNegociacaoPrecoParceiro"]
+
+
+def calcular_watermark(tabela):
+    """Maior timestamp de aprovação / envio de preço parceiro presente no snapshot."""
+    import pyarrow.compute as pc
+
+    candidatos = []
+    for coluna in COLUNAS_WATERMARK:
+        if coluna in tabela.column_names:
+            valor = pc.max(tabela[coluna]).as_py()
+            if valor is not None:
+                candidatos.append(valor)
+    return max(candidatos) if candidatos else None
+
+
+def atualizar_incremental(tabela, executar, lookback_dias=LOOKBACK_DIAS_PADRAO):
+    """
+    Aplica no snapshot `tabela` as mudanças desde o watermark.
+
+    executar: função que recebe uma query e devolve pyarrow.Table.
+    Retorna (tabela_atualizada, metadados).
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    watermark = calcular_watermark(tabela)
+    if watermark is None:
+        raise ValueError("Snapshot sem colunas de watermark; rode um --refresh completo.")
+    desde = watermark - timedelta(days=lookback_dias)
+    print(f"   🔁 Incremental: watermark {watermark:%Y-%m-%d %H:%M}, "
+          f"buscando mudanças desde {desde:%Y-%m-%d %H:%M} (lookback {lookback_dias}d)")
+
+    tocadas = executar(montar_query_chaves_incremental(desde))
+    novas = executar(montar_query_fact_incremental(desde))
+
+    chaves_tocadas = tocadas["ChaveItem"].combine_chunks()
+    removidas = pc.is_in(tabela["ChaveItem"], value_set=chaves_tocadas)
+    mantidas = tabela.filter(pc.invert(removidas))
+    atualizada = pa.concat_tables([mantidas, novas.select(tabela.column_names).cast(tabela.schema)])
+
+    n_removidas = tabela.num_rows - mantidas.num_rows
+    print(f"   🔁 {len(chaves_tocadas):,} itens tocados | {n_removidas:,} linhas substituídas/removidas | "
+          f"{novas.num_rows:,} linhas novas/atualizadas")
+
+    meta = {
+        "modo": "incremental",
+        "watermark_anterior": watermark.isoformat(),
+        "desde": desde.isoformat(),
+        "watermark": (calcular_watermark(atualizada) or watermark).isoformat(),
+    }
+    return atualizada, meta
@@ -0,0 +1,196 @@
+"""
+Motor local de intervalos de aprovadores (parâmetro 586).
+
+Reconstrói em Python os CTEs sets/adds/removes/events/ordered_events/
+param_intervals da QUERY_FACT (e de RelacaoClienteAprovador.tmdl) a partir
+dos logs brutos de Dim_MaintenanceParameterLogValue, e responde "o aprovador
+estava ativo no cliente nesta data?" para milhões de itens com uma busca
+ordenada em lote (np.searchsorted), em vez do EXISTS correlacionado por item.
+
+Assim dá para extrair os itens sem o filtro de aprovador (barato no warehouse)
+e aplicar o filtro localmente — e conferir com o resultado do SQL.
+
+Uso:
+  python intervalos_aprovador.py              # aplica o filtro e confere com a QUERY_FACT
+  python intervalos_aprovador.py --offline
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+
+def _normalizar_codigo(serie):
+    """Códigos (cliente/aprovador) como texto sem espaços nem sufixo '.0'."""
+    texto = serie.astype("string").str.strip()
+    return texto.str.replace(r"\.0$", "", regex=True)
+
+
+def _em_ns(datas):
+    """Timestamps como int64 (ns, sem fuso); NaT vira o mínimo de int64."""
+    import numpy as np
+    import pandas as pd
+
+    serie = pd.to_datetime(pd.Series(datas))
+    if serie.dt.tz is not None:
+        serie = serie.dt.tz_convert(None)
+    return serie.to_numpy("datetime64[ns]").view(np.int64)
+
+
+def _conjuntos(valores):
+    """Equivalente a array_distinct(filter(split(regexp_replace(v, '\\s+', ''), '[;,]+'), x -> x <> ''))."""
+    partes = valores.fillna("").astype(str).str.replace(r"\s+", "", regex=True).str.split(r"[;,]+", regex=True)
+    return partes
+
+
+def construir_intervalos(df_logs):
+    """
+    Intervalos [DataInicio, DataFim) de cada (CodigoCliente, Aprovador).
+
+    df_logs: colunas CodigoCliente, ts, old_values, new_values (QUERY_LOGS_APROVADORES).
+    DataFim é o próximo evento (ADD ou REMOVE) do mesmo par, como o LEAD do SQL;
+    NaT quando o aprovador continua ativo.
+    """
+    import pandas as pd
+
+    logs = pd.DataFrame({
+        "CodigoCliente": _normalizar_codigo(df_logs["CodigoCliente"]),
+        "ts": pd.to_datetime(df_logs["ts"]),
+    })
+    logs["_log"] = range(len(logs))
+
+    def explodir(coluna, lado):
+        conj = _conjuntos(df_logs[coluna])
+        ex = pd.DataFrame({"_log": logs["_log"].to_numpy(), "Aprovador": conj.to_numpy()}).explode("Aprovador")
+        ex = ex[ex["Aprovador"].notna() & (ex["Aprovador"] != "")].drop_duplicates()
+        ex[lado] = True
+        return ex
+
+    antigos = explodir("old_values", "no_old")
+    novos = explodir("new_values", "no_new")
+    pares = antigos.merge(novos, on=["_log", "Aprovador"], how="outer")
+
+    # ADD: no new_set e fora do old_set; REMOVE: no old_set e fora do new_set
+    pares["event_type"] = None
+    pares.loc[pares["no_new"].eq(True) & pares["no_old"].isna(), "event_type"] = "ADD"
+    pares.loc[pares["no_old"].eq(True) & pares["no_new"].isna(), "event_type"] = "REMOVE"
+    eventos = pares[pares["event_type"].notna()].merge(logs, on="_log")
+
+    eventos = eventos[eventos["CodigoCliente"].notna()]
+
+    # ORDER BY ts do Spark coloca nulos primeiro
+    eventos = eventos.sort_values(["CodigoCliente", "Aprovador", "ts"], kind="stable", na_position="first")
+    eventos["DataFim"] = eventos.groupby(["CodigoCliente", "Aprovador"])["ts"].shift(-1)
+
+    # ADD sem data nunca satisfaz "FirstApprovalTimestamp >= DataInicio"
+    intervalos = eventos[(eventos["event_type"] == "ADD") & eventos["ts"].notna()]
+    intervalos = intervalos.rename(columns={"ts": "DataInicio"})
+    return intervalos[["CodigoCliente", "Aprovador", "DataInicio", "DataFim"]].reset_index(drop=True)
+
+
+class IntervalosAprovador:
+    """Intervalos ordenados por (cliente, aprovador, início) para consulta em lote."""
+
+    def __init__(self, intervalos):
+        import numpy as np
+        import pandas as pd
+
+        intervalos = intervalos.sort_values(["CodigoCliente", "Aprovador", "DataInicio"], kind="stable")
+        self.pares = pd.MultiIndex.from_arrays(
+            [intervalos["CodigoCliente"].to_numpy(), intervalos["Aprovador"].to_numpy()]
+        ).unique()
+
+        grupo = self.pares.get_indexer(
+            pd.MultiIndex.from_arrays([intervalos["CodigoCliente"].to_numpy(), intervalos["Aprovador"].to_numpy()])
+        ).astype(np.int64)
+        inicio = _em_ns(intervalos["DataInicio"])
+        fim = _em_ns(intervalos["DataFim"])
+        fim = np.where(fim == np.iinfo(np.int64).min, np.iinfo(np.int64).max, fim)  # NaT → aberto
+
+        # Chave composta (grupo, posto do início): com os inícios distintos
+        # ordenados, o posto cabe em int64 junto com o grupo e uma única busca
+        # ordenada encontra, para cada item, o último intervalo iniciado antes dele.
+        self.inicios = np.unique(inicio)
+        self.base = len(self.inicios) + 1
+        chave = grupo * self.base + np.searchsorted(self.inicios, inicio, side="right")
+        ordem = np.argsort(chave, kind="stable")
+        self.chave = chave[ordem]
+        self.grupo = grupo[ordem]
+        self.fim = fim[ordem]
+
+    def ativo(self, clientes, aprovadores, datas):
+        """Array booleano: aprovador ativo no cliente na data (DataInicio <= data < DataFim)."""
+        import numpy as np
+        import pandas as pd
+
+        grupo = self.pares.get_indexer(pd.MultiIndex.from_arrays([
+            _normalizar_codigo(pd.Series(clientes)).to_numpy(),
+            _normalizar_codigo(pd.Series(aprovadores)).to_numpy(),
+        ])).astype(np.int64)
+        t = _em_ns(datas)
+        t_valido = t != np.iinfo(np.int64).min
+
+        chave = grupo * self.base + np.searchsorted(self.inicios, t, side="right")
+        pos = np.searchsorted(self.chave, chave, side="right") - 1
+        pos_ok = np.clip(pos, 0, None)
+
+        return (
+            (grupo >= 0)
+            & t_valido
+            & (pos >= 0)
+            & (self.grupo[pos_ok] == grupo)
+            & (t < self.fim[pos_ok])
+        )
+
+
+def aplicar_filtro_aprovador(df_itens, motor):
+    """Máscara do filtro da Fact: OS com preço parceiro OU aprovador ativo na data."""
+    ativo = motor.ativo(df_itens["CodigoCliente"], df_itens["CodigoUsuario"], df_itens["DataAprovacao1OS"])
+    return df_itens["OSComPrecoParceiro"].fillna(False).to_numpy(dtype=bool) | ativo
+
+
+def main():
+    from consultas import QUERY_LOGS_APROVADORES, QUERY_ITENS_SEM_FILTRO_APROVADOR
+    from validar_formularios import carregar_tabela, load_fact_data, adicionar_argumentos_fact, opcoes_fact, opcoes_tabela
+
+    parser = argparse.ArgumentParser(description="Filtro de aprovadores ativos aplicado localmente")
+    parser.add_argument("--sem-validar", action="store_true", help="Não compara com o resultado da QUERY_FACT")
+    adicionar_argumentos_fact(parser, filtros=False)
+    args = parser.parse_args()
+    opcoes = opcoes_fact(args)
+
+    print("\n📜 Carregando logs do parâmetro 586...")
+    df_logs = carregar_tabela(QUERY_LOGS_APROVADORES, **opcoes_tabela(args)).to_pandas()
+    intervalos = construir_intervalos(df_logs)
+    motor = IntervalosAprovador(intervalos)
+    print(f"   ✅ {len(df_logs):,} logs → {len(intervalos):,} intervalos em {len(motor.pares):,} pares cliente×aprovador")
+
+    print("\n📊 Carregando itens sem o filtro de aprovador...")
+    df_itens = carregar_tabela(QUERY_ITENS_SEM_FILTRO_APROVADOR, **opcoes_tabela(args)).to_pandas()
+    mascara = aplicar_filtro_aprovador(df_itens, motor)
+    chaves_local = set(df_itens.loc[mascara, "ChaveItem"])
+    print(f"   ✅ {len(df_itens):,} itens → {len(chaves_local):,} após o filtro local")
+
+    if args.sem_validar:
+        return
+
+    df_fact = load_fact_data(**opcoes)
+    chaves_sql = set(df_fact["ChaveItem"])
+    so_local = chaves_local - chaves_sql
+    so_sql = chaves_sql - chaves_local
+
+    print("\n  📊 Conferência com a QUERY_FACT:")
+    print(f"     Itens no SQL:    {len(chaves_sql):,}")
+    print(f"     Itens no local:  {len(chaves_local):,}")
+    print(f"     Só no local:     {len(so_local):,}")
+    print(f"     Só no SQL:       {len(so_sql):,}")
+    if not so_local and not so_sql:
+        print("\n  ✅ Filtro local idêntico ao EXISTS do SQL.")
+    else:
+        print(f"\n  ⚠️ Divergências — exemplos: só local {sorted(so_local)[:10]} | só SQL {sorted(so_sql)[:10]}")
+
+
+if __name__ == "__main__":
+    main()
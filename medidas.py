@@ -0,0 +1,245 @@
+"""
+Avaliação offline das medidas de _Medidas.tmdl sobre o snapshot da Fact.
+
+Reproduz as medidas de VA (_Aprovações) e de aderência (_Auditoria) como
+filtros colunares vetorizados: cada medida aditiva vira uma coluna
+ValorTotalPeca × máscara e todas são somadas em um único groupby pelas chaves
+pedidas. Os percentuais seguem DIVIDE() (denominador 0/BLANK → vazio).
+
+Semântica de BLANK do DAX respeitada nas máscaras:
+  - `coluna = BLANK()` é verdadeiro para nulo E para 0;
+  - `coluna <> BLANK()` exige valor não nulo e diferente de 0;
+  - comparações (> 0, = "OK") com nulo são falsas.
+
+Uso:
+  python medidas.py --por cliente mes
+  python medidas.py --por uf --painel export_painel.csv --offline
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+# Atalhos de linha de comando → colunas da Fact
+CHAVES = {
+    "cliente": "NomeCliente",
+    "ec": "NomeEC",
+    "uf": "UFEC",
+    "aprovador": "NomeUsuario",
+    "mes": "Mes",
+}
+
+# Medidas aditivas: nome DAX → máscara (sobre as colunas auxiliares de mascaras())
+MEDIDAS_ADITIVAS = {
+    "VA Peças": "todas",
+    "VA Peças Referencial Sem Negociado": "ref_sem_neg",
+    "VA Peças Potencial": "potencial",
+    "VA Peças Travado Preço Parceiro": "travado",
+    "VA Peças Potencial Aderente": "potencial_ok",
+    "VA Peças Travado Preço Parceiro Aderente": "travado_ok",
+    "VA Peças Travado Preço Parceiro Não Aderente": "travado_nok",
+    "VA Travado Aderente": "auditoria_ok",
+    "VA Travado Não Aderente": "auditoria_nok",
+    "VA Travado Sem Referencial": "auditoria_na",
+}
+
+# Medidas derivadas: nome DAX → (numerador, [parcelas do denominador])
+MEDIDAS_RAZAO = {
+    "% Aproveitamento": ("VA Peças Travado Preço Parceiro", ["VA Peças Potencial"]),
+    "% Aproveitamento Aderente": ("VA Peças Travado Preço Parceiro Aderente", ["VA Peças Potencial Aderente"]),
+    "% Travado não aderente": ("VA Peças Travado Preço Parceiro Não Aderente", ["VA Peças Travado Preço Parceiro"]),
+    "% VA Travado Aderente": ("VA Travado Aderente", ["Total VA travado"]),
+    "% VA Travado Não Aderente": ("VA Travado Não Aderente", ["Total VA travado"]),
+    "% VA Travado Sem Referencial": ("VA Travado Sem Referencial", ["Total VA travado"]),
+    "% VA Travado Incorreto": ("VA Travado Incorreto", ["Total VA travado"]),
+}
+
+
+def _nao_blank(serie):
+    """`coluna <> BLANK()` do DAX: não nulo e diferente de 0."""
+    return serie.notna() & (serie != 0)
+
+
+def mascaras(df):
+    """Máscaras booleanas das medidas, calculadas uma única vez sobre o frame inteiro."""
+    import pandas as pd
+
+    if "ValorUnitarioNegociadoPrecoParceiro" in df.columns:
+        vpp = df["ValorUnitarioNegociadoPrecoParceiro"]
+    else:
+        import pyarrow as pa
+        from transformacoes import valor_unitario_preco_parceiro
+
+        vpp = pd.Series(
+            valor_unitario_preco_parceiro(pa.array(df["InfoPrecoParceiro"], pa.string())).to_numpy(zero_copy_only=False),
+            index=df.index,
+        )
+
+    aderencia = df["AderenciaPrecoReferencial"]
+    ref_sem_neg = (df["ValorUnitarioReferencial"] > 0) & ~_nao_blank(df["ValorUnitarioNegociado"])
+    potencial = ref_sem_neg & (df["TipoEC"] != "Concessionaria")
+    travado = potencial & _nao_blank(vpp) & df["DataEnvioNegociacaoPrecoParceiro"].notna()
+    com_vpp = vpp > 0
+
+    return pd.DataFrame({
+        "todas": pd.Series(True, index=df.index),
+        "ref_sem_neg": ref_sem_neg,
+        "potencial": potencial,
+        "travado": travado,
+        "potencial_ok": potencial & (aderencia == "OK"),
+        "travado_ok": travado & (aderencia == "OK"),
+        "travado_nok": travado & (aderencia == "NOK"),
+        "auditoria_ok": com_vpp & (aderencia == "OK"),
+        "auditoria_nok": com_vpp & (aderencia == "NOK"),
+        "auditoria_na": com_vpp & (aderencia == "NA"),
+    }, index=df.index).fillna(False)
+
+
+def _colunas_chave(df, chaves):
+    """Resolve atalhos e cria a coluna Mes (yyyy-mm de DataAprovacao1OS) se pedida."""
+    import pandas as pd
+
+    colunas = {}
+    for chave in chaves:
+        coluna = CHAVES.get(chave, chave)
+        if coluna == "Mes":
+            colunas["Mes"] = pd.to_datetime(df["DataAprovacao1OS"]).dt.strftime("%Y-%m")
+        else:
+            colunas[coluna] = df[coluna]
+    return colunas
+
+
+def base_aditiva(df, masc=None):
+    """Uma coluna por medida aditiva (ValorTotalPeca × máscara) e a contagem de Itens, linha a linha."""
+    import numpy as np
+    import pandas as pd
+
+    masc = mascaras(df) if masc is None else masc
+    valor = df["ValorTotalPeca"].astype("float64").fillna(0.0).to_numpy()
+
+    base = pd.DataFrame(
+        {nome: np.where(masc[m].to_numpy(), valor, 0.0) for nome, m in MEDIDAS_ADITIVAS.items()},
+        index=df.index,
+    )
+    base["Itens"] = 1
+    return base
+
+
+def medidas_derivadas(resultado):
+    """Acrescenta os totais compostos e os percentuais (DIVIDE) a somas de medidas aditivas."""
+    resultado["Total VA travado"] = (
+        resultado["VA Travado Não Aderente"]
+        + resultado["VA Travado Sem Referencial"]
+        + resultado["VA Travado Aderente"]
+    )
+    resultado["VA Travado Incorreto"] = resultado["VA Travado Não Aderente"] + resultado["VA Travado Sem Referencial"]
+
+    for nome, (numerador, denominador) in MEDIDAS_RAZAO.items():
+        den = resultado[denominador].sum(axis=1)
+        resultado[nome] = (resultado[numerador] / den.where(den != 0)).astype("float64")
+
+    return resultado
+
+
+def avaliar_medidas(df, chaves=()):
+    """
+    Calcula todas as medidas para as chaves pedidas em uma passada.
+
+    chaves vazias → uma linha com o total geral (o "Total" do visual).
+    """
+    base = base_aditiva(df)
+
+    colunas = _colunas_chave(df, chaves)
+    if colunas:
+        for nome, serie in colunas.items():
+            base[nome] = serie.to_numpy()
+        resultado = base.groupby(list(colunas), dropna=False, observed=True).sum().reset_index()
+    else:
+        resultado = base.sum().to_frame().T
+
+    return medidas_derivadas(resultado)
+
+
+def comparar_com_painel(resultado, caminho_painel, chaves, tolerancia=0.01):
+    """
+    Compara o resultado com um export do visual do Power BI (CSV ou Excel).
+
+    O export deve ter as colunas de chave (nomes da Fact, ex.: NomeCliente, Mes)
+    e as medidas com o mesmo nome de _Medidas. Retorna as linhas com diferença
+    acima da tolerância (absoluta para valores, em pontos para percentuais).
+    """
+    import pandas as pd
+
+    if caminho_painel.lower().endswith((".xlsx", ".xls")):
+        painel = pd.read_excel(caminho_painel)
+    else:
+        painel = pd.read_csv(caminho_painel, sep=None, engine="python")
+
+    colunas_chave = [CHAVES.get(c, c) for c in chaves]
+    medidas = [c for c in painel.columns if c in resultado.columns and c not in colunas_chave]
+
+    junto = resultado[colunas_chave + medidas].merge(
+        painel[colunas_chave + medidas], on=colunas_chave, how="outer",
+        suffixes=("_python", "_painel"), indicator=True,
+    )
+
+    divergencias = []
+    for medida in medidas:
+        py = junto[f"{medida}_python"].astype("float64").fillna(0)
+        pbi = junto[f"{medida}_painel"].astype("float64").fillna(0)
+        tol = tolerancia / 100 if medida.startswith("%") else tolerancia
+        difere = (py - pbi).abs() > tol
+        if difere.any():
+            linhas = junto.loc[difere, colunas_chave + ["_merge"]].copy()
+            linhas["Medida"] = medida
+            linhas["Python"] = py[difere]
+            linhas["Painel"] = pbi[difere]
+            linhas["Diferenca"] = (py - pbi)[difere]
+            divergencias.append(linhas)
+
+    if not divergencias:
+        return pd.DataFrame(columns=colunas_chave + ["_merge", "Medida", "Python", "Painel", "Diferenca"])
+    return pd.concat(divergencias, ignore_index=True)
+
+
+def main():
+    from validar_formularios import load_fact_data, adicionar_argumentos_fact, opcoes_fact
+
+    parser = argparse.ArgumentParser(description="Medidas _Medidas avaliadas offline sobre a Fact")
+    parser.add_argument(
+        "--por",
+        nargs="*",
+        default=[],
+        help=f"Chaves de agrupamento: {', '.join(CHAVES)} ou nome de coluna da Fact (vazio = total)",
+    )
+    parser.add_argument("--painel", type=str, default=None, help="Export do visual (CSV/Excel) para reconciliar")
+    parser.add_argument("--tolerancia", type=float, default=0.01, help="Diferença aceita na reconciliação (padrão: 0.01)")
+    parser.add_argument("--saida", type=str, default=None, help="Grava o resultado em CSV")
+    adicionar_argumentos_fact(parser)
+    args = parser.parse_args()
+
+    df_fact = load_fact_data(**opcoes_fact(args))
+    resultado = avaliar_medidas(df_fact, args.por)
+    print(f"\n  📊 {len(resultado):,} grupos × {len(MEDIDAS_ADITIVAS) + len(MEDIDAS_RAZAO) + 2} medidas")
+
+    if args.saida:
+        resultado.to_csv(args.saida, index=False, sep=";", decimal=",")
+        print(f"   💾 Resultado salvo em {args.saida}")
+    else:
+        import pandas as pd
+        with pd.option_context("display.max_columns", None, "display.width", 200):
+            print(resultado.head(50).to_string(index=False))
+
+    if args.painel:
+        divergencias = comparar_com_painel(resultado, args.painel, args.por, args.tolerancia)
+        if divergencias.empty:
+            print(f"\n  ✅ Todas as medidas batem com o painel (tolerância {args.tolerancia})")
+        else:
+            print(f"\n  ⚠️ {len(divergencias):,} divergências com o painel:")
+            print(divergencias.head(50).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Instrumentação por etapa (--profile): tempo de parede/CPU, memória, linhas e bytes.
+
+As etapas do pipeline (conexão OAuth, execução da query, transferência dos
+lotes Arrow, leitura/gravação do snapshot, montagem do DataFrame, leitura da
+planilha, groupby/merge dos relatórios) são envolvidas por perfil.etapa().
+Com o perfil desligado (padrão) a etapa não mede nada.
+
+Com --profile, cada etapa registra:
+  parede_s / cpu_s        tempo de parede e de CPU do processo
+  linhas / bytes          volume processado, quando a etapa informa
+  pico_tracemalloc_mb     quanto o pico de alocações Python (tracemalloc)
+                          durante a etapa subiu acima da memória rastreada na
+                          entrada. Cada etapa zera o pico do tracemalloc ao
+                          começar, depois de repassá-lo às etapas abertas;
+                          um pico atingido em paralelo (threads) conta para
+                          todas as etapas abertas naquele momento.
+  arrow_mb                memória alocada pelo Arrow ao fim da etapa
+  rss_mb / pico_rss_mb    memória residente ao fim da etapa e pico do processo
+
+Ao final, grava um relatório JSON (por padrão em <cache>/perfis/) e imprime
+uma linha de resumo — dá para acompanhar a tendência entre execuções.
+
+Uso:
+  python auditoria.py all --profile
+  python validar_formularios.py --profile perfil.json
+"""
+
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+MB = 1024 * 1024
+
+
+def _memoria_processo():
+    """(rss atual, pico de rss) do processo em bytes; None quando não dá para medir."""
+    rss = pico = None
+    try:
+        import psutil
+
+        info = psutil.Process().memory_info()
+        rss = info.rss
+        pico = getattr(info, "peak_wset", None)  # Windows
+    except ImportError:
+        pass
+    if pico is None:
+        try:
+            import resource
+
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            pico = maxrss if sys.platform == "darwin" else maxrss * 1024
+        except ImportError:
+            pass
+    if rss is None and sys.platform.startswith("linux"):
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    return rss, pico
+
+
+def _memoria_arrow():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    return pa.total_allocated_bytes()
+
+
+def _mb(n):
+    return round(n / MB, 1) if n is not None else None
+
+
+class Perfil:
+    """Coletor das etapas; um por processo (perfil.PERFIL)."""
+
+    def __init__(self):
+        self.ativo = False
+        self.tracemalloc = False
+        self._iniciou_tracemalloc = False
+        self.etapas = []
+        self.inicio = None
+        self.data_inicio = None
+        self._trava = threading.Lock()
+        self._local = threading.local()
+        self._abertas = []
+
+    def ativar(self, usar_tracemalloc=True):
+        self.ativo = True
+        self.etapas = []
+        self._abertas = []
+        self.inicio = (time.perf_counter(), time.process_time())
+        self.data_inicio = datetime.now().isoformat(timespec="seconds")
+        self.tracemalloc = usar_tracemalloc
+        if usar_tracemalloc:
+            import tracemalloc
+
+            # Rastreamento já ligado por outro (python -X tracemalloc) fica como está
+            self._iniciou_tracemalloc = not tracemalloc.is_tracing()
+            if self._iniciou_tracemalloc:
+                tracemalloc.start()
+
+    def desativar(self):
+        self.ativo = False
+        if self._iniciou_tracemalloc:
+            import tracemalloc
+
+            tracemalloc.stop()
+            self._iniciou_tracemalloc = False
+
+    def _repassar_pico(self, tracemalloc):
+        """
+        Leva o pico desde o último reset_peak() ao "topo" de cada etapa aberta
+        (todas estavam abertas desde então) e zera o pico. Chamar com a trava.
+        """
+        pico = tracemalloc.get_traced_memory()[1]
+        for aberta in self._abertas:
+            if pico > aberta["topo"]:
+                aberta["topo"] = pico
+        tracemalloc.reset_peak()
+
+    def _pilha(self):
+        if not hasattr(self._local, "pilha"):
+            self._local.pilha = []
+        return self._local.pilha
+
+    @contextmanager
+    def etapa(self, nome, **info):
+        """
+        Mede o bloco. O dicionário devolvido aceita "linhas" e "bytes" (e
+        qualquer outro dado simples), gravados junto com as medidas.
+        """
+        medidas = dict(info)
+        if not self.ativo:
+            yield medidas
+            return
+
+        import tracemalloc
+
+        pilha = self._pilha()
+        registro = {"nome": nome, "nivel": len(pilha), "thread": threading.current_thread().name}
+        pilha.append(registro)
+        if self.tracemalloc:
+            with self._trava:
+                self._repassar_pico(tracemalloc)
+                entrada = tracemalloc.get_traced_memory()[0]
+                aberta = {"topo": entrada}
+                self._abertas.append(aberta)
+        parede, cpu = time.perf_counter(), time.process_time()
+        erro = None
+        try:
+            yield medidas
+        except BaseException as e:
+            erro = type(e).__name__
+            raise
+        finally:
+            registro["parede_s"] = round(time.perf_counter() - parede, 4)
+            registro["cpu_s"] = round(time.process_time() - cpu, 4)
+            registro.update(medidas)
+            if erro:
+                registro["erro"] = erro
+            if self.tracemalloc:
+                with self._trava:
+                    self._repassar_pico(tracemalloc)
+                    self._abertas.remove(aberta)
+                registro["pico_tracemalloc_mb"] = _mb(aberta["topo"] - entrada)
+            rss, pico_rss = _memoria_processo()
+            registro["arrow_mb"] = _mb(_memoria_arrow())
+            registro["rss_mb"] = _mb(rss)
+            registro["pico_rss_mb"] = _mb(pico_rss)
+            pilha.pop()
+            if pilha:
+                pai = pilha[-1]
+                pai["subetapas"] = pai.get("subetapas", 0) + 1
+            with self._trava:
+                self.etapas.append(registro)
+
+    def relatorio(self, comando=None):
+        parede, cpu = self.inicio or (time.perf_counter(), time.process_time())
+        rss, pico_rss = _memoria_processo()
+        return {
+            "comando": comando,
+            "argv": sys.argv,
+            "inicio": self.data_inicio,
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "total": {
+                "parede_s": round(time.perf_counter() - parede, 4),
+                "cpu_s": round(time.process_time() - cpu, 4),
+                "rss_mb": _mb(rss),
+                "pico_rss_mb": _mb(pico_rss),
+            },
+            "etapas": self.etapas,
+        }
+
+
+PERFIL = Perfil()
+etapa = PERFIL.etapa
+
+
+def resumo(relatorio, maximo=6):
+    """
+    Uma linha: tempo total, etapas finais mais lentas (somadas por nome) e pico
+    de RSS. Etapas em threads (extração paralela) somam o tempo de cada thread.
+    """
+    por_nome = {}
+    for registro in relatorio["etapas"]:
+        if not registro.get("subetapas"):
+            por_nome[registro["nome"]] = por_nome.get(registro["nome"], 0) + registro["parede_s"]
+    lentas = sorted(por_nome.items(), key=lambda kv: kv[1], reverse=True)[:maximo]
+    partes = [f"total {relatorio['total']['parede_s']:.1f}s"]
+    partes += [f"{nome} {segundos:.1f}s" for nome, segundos in lentas]
+    if relatorio["total"]["pico_rss_mb"] is not None:
+        partes.append(f"pico RSS {relatorio['total']['pico_rss_mb']:,.0f} MB")
+    return " | ".join(partes)
+
+
+def adicionar_argumento(parser):
+    """Opção --profile [CAMINHO] compartilhada pelos scripts."""
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="CAMINHO",
+        help="Mede tempo/memória por etapa e grava um relatório JSON (padrão: <cache>/perfis/)",
+    )
+
+
+def _caminho_padrao(comando):
+    from cache_snapshot import DIRETORIO_CACHE
+
+    diretorio = os.path.join(DIRETORIO_CACHE, "perfis")
+    os.makedirs(diretorio, exist_ok=True)
+    return os.path.join(diretorio, f"{comando}-{datetime.now():%Y%m%d-%H%M%S}.json")
+
+
+@contextmanager
+def sessao(destino, comando):
+    """
+    Liga o perfil no bloco quando destino não é None (valor de --profile) e,
+    na saída — inclusive com erro —, grava o JSON e imprime o resumo.
+    """
+    if destino is None:
+        yield
+        return
+
+    PERFIL.ativar()
+    try:
+        yield
+    finally:
+        relatorio = PERFIL.relatorio(comando)
+        PERFIL.desativar()
+        caminho = destino or _caminho_padrao(comando)
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, ensure_ascii=False, indent=2)
+        print(f"\n⏱️  Perfil: {resumo(relatorio)}")
+        print(f"   📄 {caminho}")
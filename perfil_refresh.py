@@ -0,0 +1,204 @@
+"""
+Perfil do refresh do modelo: quanto cada partição custa no warehouse.
+
+Lê os .tmdl do modelo semântico (tmdl.py), extrai cada query Azure("...")
+— inclusive passos secundários, como o LookupAprovador de
+FactAprovacoesAposPrecoParceiro — e executa todas ao mesmo tempo, como o
+refresh do Power BI faz, medindo para cada uma:
+  execucao_s       até o warehouse aceitar a query e devolver o primeiro resultado
+  transferencia_s  leitura dos lotes Arrow (descartados à medida que chegam)
+  linhas / MB      volume que o refresh importa
+
+Partições que não vêm do warehouse (Excel/SharePoint, tabelas calculadas)
+são listadas e puladas.
+
+Uso:
+  python perfil_refresh.py                       # warehouse configurado, 4 queries por vez
+  python perfil_refresh.py --sql-local           # DuckDB sobre as fixtures (sql_local.py)
+  python perfil_refresh.py --paralelo 1 --top 3 --saida refresh.json
+  python perfil_refresh.py --tabelas FactAprovacaoPrecoParceiro DimCalendario
+  python perfil_refresh.py --listar
+"""
+
+import os
+import sys
+import json
+import queue
+import threading
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+PARALELO_PADRAO = 4
+TOP_PADRAO = 5
+MB = 1024 * 1024
+
+
+def _rotulo(consulta):
+    if consulta["passo"] == "Fonte":
+        return consulta["tabela"]
+    return f"{consulta['tabela']}.{consulta['passo']}"
+
+
+def medir_consulta(conn, sql, batch_size):
+    """Executa a query e lê o resultado sem guardá-lo; devolve tempos e volume."""
+    medidas = {"linhas": 0, "bytes": 0}
+    cursor = conn.cursor()
+    try:
+        inicio = time.perf_counter()
+        cursor.execute(sql)
+        medidas["execucao_s"] = round(time.perf_counter() - inicio, 3)
+
+        inicio = time.perf_counter()
+        while True:
+            lote = cursor.fetchmany_arrow(batch_size)
+            if lote.num_rows == 0:
+                break
+            medidas["linhas"] += lote.num_rows
+            medidas["bytes"] += lote.nbytes
+        medidas["transferencia_s"] = round(time.perf_counter() - inicio, 3)
+    finally:
+        cursor.close()
+    medidas["total_s"] = round(medidas["execucao_s"] + medidas["transferencia_s"], 3)
+    return medidas
+
+
+def perfilar(consultas, abrir_conexao, paralelo=PARALELO_PADRAO, batch_size=None):
+    """
+    Executa as consultas em até `paralelo` conexões ao mesmo tempo.
+
+    Devolve (resultados na ordem das consultas, tempo de parede total).
+    Uma consulta que falha é registrada com "erro" e não interrompe as demais.
+    """
+    from extracao import BATCH_SIZE_PADRAO
+
+    batch_size = batch_size or BATCH_SIZE_PADRAO
+    livres = queue.SimpleQueue()
+    conexoes = []
+    trava = threading.Lock()
+
+    def executar(consulta):
+        try:
+            conn = livres.get_nowait()
+        except queue.Empty:
+            conn = abrir_conexao()
+            with trava:
+                conexoes.append(conn)
+        try:
+            return medir_consulta(conn, consulta["sql"], batch_size)
+        finally:
+            livres.put(conn)
+
+    resultados = [None] * len(consultas)
+    inicio = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=paralelo, thread_name_prefix="refresh") as executor:
+            futuros = {executor.submit(executar, c): i for i, c in enumerate(consultas)}
+            for futuro in as_completed(futuros):
+                i = futuros[futuro]
+                registro = {k: consultas[i][k] for k in ("tabela", "particao", "passo")}
+                try:
+                    registro.update(futuro.result())
+                    msg = f"   ✅ {_rotulo(registro)}: {registro['linhas']:,} linhas em {registro['total_s']:.1f}s"
+                except Exception as e:
+                    registro["erro"] = f"{type(e).__name__}: {e}"
+                    msg = f"   ❌ {_rotulo(registro)}: {registro['erro'].splitlines()[0]}"
+                resultados[i] = registro
+                with trava:
+                    print(msg, flush=True)
+    finally:
+        for conn in conexoes:
+            conn.close()
+    return resultados, round(time.perf_counter() - inicio, 3)
+
+
+def imprimir_relatorio(resultados, parede_s, top=TOP_PADRAO):
+    ok = [r for r in resultados if "erro" not in r]
+    ordenados = sorted(ok, key=lambda r: r["total_s"], reverse=True)
+    soma = sum(r["total_s"] for r in ok)
+
+    print("\n" + "=" * 80)
+    print("  PERFIL DO REFRESH — por partição")
+    print("=" * 80)
+    print(f"\n  {'Partição':<50s} {'Execução':>9s} {'Transf.':>9s} {'Total':>9s} {'Linhas':>12s} {'MB':>9s} {'%':>6s}")
+    print(f"  {'-' * 50} {'-' * 9} {'-' * 9} {'-' * 9} {'-' * 12} {'-' * 9} {'-' * 6}")
+    for r in ordenados:
+        print(
+            f"  {_rotulo(r):<50s} {r['execucao_s']:>8.2f}s {r['transferencia_s']:>8.2f}s {r['total_s']:>8.2f}s "
+            f"{r['linhas']:>12,} {r['bytes'] / MB:>9,.1f} {r['total_s'] / soma if soma else 0:>6.0%}"
+        )
+    for r in resultados:
+        if "erro" in r:
+            print(f"  {_rotulo(r):<50s} ❌ {r['erro'].splitlines()[0][:80]}")
+
+    print(f"\n  ⏱️  Parede: {parede_s:.1f}s | soma das partições: {soma:.1f}s")
+    if ordenados:
+        print(f"\n  🐢 {min(top, len(ordenados))} partições mais lentas:")
+        for i, r in enumerate(ordenados[:top], 1):
+            gargalo = "execução" if r["execucao_s"] >= r["transferencia_s"] else "transferência"
+            print(f"     {i}. {_rotulo(r)} — {r['total_s']:.1f}s ({r['total_s'] / soma:.0%}), maior parte na {gargalo}")
+
+
+def main():
+    from tmdl import particoes
+    from validar_formularios import abrir_conexao
+
+    parser = argparse.ArgumentParser(description="Tempo, linhas e bytes de cada query das partições do modelo")
+    parser.add_argument("--paralelo", type=int, default=PARALELO_PADRAO, help="Queries simultâneas (padrão: 4)")
+    parser.add_argument("--top", type=int, default=TOP_PADRAO, help="Partições mais lentas no resumo (padrão: 5)")
+    parser.add_argument("--tabelas", nargs="+", default=None, help="Só estas tabelas do modelo")
+    parser.add_argument("--batch-size", type=int, default=None, help="Linhas por lote Arrow (padrão: 100000)")
+    parser.add_argument(
+        "--sql-local", nargs="?", const="", default=None, metavar="DIR",
+        help="Executa no DuckDB sobre fixtures Parquet das tabelas gold (ver sql_local.py)",
+    )
+    parser.add_argument("--listar", action="store_true", help="Só lista as partições e queries encontradas")
+    parser.add_argument("--saida", type=str, default=None, help="Grava os resultados em JSON")
+    args = parser.parse_args()
+
+    todas = particoes()
+    if args.tabelas:
+        todas = [p for p in todas if p["tabela"] in args.tabelas]
+    consultas = [
+        {"tabela": p["tabela"], "particao": p["particao"], "passo": c["passo"], "sql": c["sql"]}
+        for p in todas for c in p["consultas"]
+    ]
+    sem_sql = [p["tabela"] for p in todas if not p["consultas"]]
+
+    print(f"📐 {len(consultas)} queries em {len(todas) - len(sem_sql)} partições do warehouse")
+    if sem_sql:
+        print(f"   ℹ️ Fora do warehouse (puladas): {', '.join(sem_sql)}")
+    if args.listar:
+        for c in consultas:
+            print(f"   • {_rotulo(c)} ({len(c['sql']):,} caracteres)")
+        return
+    if not consultas:
+        return
+
+    print(f"\n🚀 Executando com até {args.paralelo} em paralelo...")
+    inicio = datetime.now().isoformat(timespec="seconds")
+    resultados, parede_s = perfilar(
+        consultas, lambda: abrir_conexao(args.sql_local), paralelo=args.paralelo, batch_size=args.batch_size,
+    )
+    imprimir_relatorio(resultados, parede_s, args.top)
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({
+                "inicio": inicio,
+                "origem": "local" if args.sql_local is not None else "databricks",
+                "paralelo": args.paralelo,
+                "parede_s": parede_s,
+                "particoes": resultados,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Resultados em {args.saida}")
+
+    if any("erro" in r for r in resultados):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Modo --pushdown dos relatórios de validação: agregação feita no warehouse.
+
+run_validation e consulta_auditoria só precisam das contagens por cliente e
+do mapa OS → cliente. Em vez de trazer cada item da Fact, a
+QUERY_FACT_AGREGADA (mesmos CTEs e filtros da QUERY_FACT) devolve em uma
+varredura, via GROUPING SETS:
+  os_cliente → NumeroOS, NomeCliente, Itens (itens do par)
+  cliente    → NomeCliente, Itens (COUNT(*)), OSDistintas (COUNT(DISTINCT OS))
+  uf         → UFEC, OSDistintas
+
+O join com o formulário é feito localmente contra o nível os_cliente, com Itens
+como multiplicidade (ver contagens_por_cliente).
+
+Uso:
+  python pushdown.py             # confere o pushdown com a extração completa
+  python pushdown.py --offline
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+COLUNAS_NIVEL = {
+    "os_cliente": ["NumeroOS", "NomeCliente", "Itens"],
+    "cliente": ["NomeCliente", "Itens", "OSDistintas"],
+    "uf": ["UFEC", "OSDistintas"],
+}
+MEDIDAS = ("Itens", "OSDistintas")
+
+
+def _chaves(nivel):
+    return [c for c in COLUNAS_NIVEL[nivel] if c not in MEDIDAS]
+
+
+def separar_niveis(tabela):
+    """
+    Divide o resultado da QUERY_FACT_AGREGADA em um DataFrame por nível.
+
+    O filtro é feito ainda no Arrow, para que NumeroOS (nulo nos outros níveis)
+    volte ao pandas com o tipo inteiro original. Grupos de OS/cliente/UF nulos
+    são descartados, como no groupby do pandas — exceto o cliente nulo dos
+    pares os_cliente, que ainda conta nos totais de itens.
+    """
+    import pyarrow.compute as pc
+    from esquema import para_pandas
+
+    niveis = {}
+    for nivel, colunas in COLUNAS_NIVEL.items():
+        parte = para_pandas(tabela.filter(pc.equal(tabela["Nivel"], nivel)).select(colunas))
+        chaves = _chaves(nivel)
+        parte = parte[parte[chaves[0]].notna()]
+        niveis[nivel] = parte.sort_values(chaves).reset_index(drop=True)
+    return niveis
+
+
+def agregar_localmente(df_fact):
+    """Os mesmos níveis de separar_niveis, calculados a partir da Fact completa."""
+    os_cliente = (
+        df_fact.groupby(["NumeroOS", "NomeCliente"], dropna=False, observed=True).size()
+        .rename("Itens").reset_index()
+    )
+    os_cliente = os_cliente[os_cliente["NumeroOS"].notna()]
+    cliente = df_fact.groupby("NomeCliente", observed=True).agg(
+        Itens=("NumeroOS", "size"),
+        OSDistintas=("NumeroOS", "nunique"),
+    ).reset_index()
+    uf = df_fact.groupby("UFEC", observed=True)["NumeroOS"].nunique().rename("OSDistintas").reset_index()
+    return {
+        "os_cliente": os_cliente.sort_values(["NumeroOS", "NomeCliente"]).reset_index(drop=True),
+        "cliente": cliente.sort_values("NomeCliente").reset_index(drop=True),
+        "uf": uf.sort_values("UFEC").reset_index(drop=True),
+    }
+
+
+def conferir(niveis, df_fact):
+    """
+    Compara os níveis agregados no warehouse com a extração completa.
+
+    Retorna {nivel: linhas divergentes}; DataFrames vazios quando tudo bate.
+    """
+    local = agregar_localmente(df_fact)
+    divergencias = {}
+    for nivel, colunas in COLUNAS_NIVEL.items():
+        chaves = _chaves(nivel)
+        junto = niveis[nivel].merge(
+            local[nivel], on=chaves, how="outer", suffixes=("_pushdown", "_completo"), indicator=True,
+        )
+        difere = junto["_merge"] != "both"
+        for medida in (c for c in colunas if c in MEDIDAS):
+            difere |= junto[f"{medida}_pushdown"] != junto[f"{medida}_completo"]
+        divergencias[nivel] = junto[difere]
+    return divergencias
+
+
+def main():
+    from validar_formularios import load_fact_data, load_fact_agregada, adicionar_argumentos_fact, opcoes_fact
+
+    parser = argparse.ArgumentParser(description="Confere o modo --pushdown com a extração completa da Fact")
+    adicionar_argumentos_fact(parser)
+    args = parser.parse_args()
+    opcoes = opcoes_fact(args)
+
+    niveis = load_fact_agregada(**opcoes)
+    df_fact = load_fact_data(**opcoes)
+
+    linhas_pushdown = sum(len(df) for df in niveis.values())
+    print(f"\n  📦 Linhas transferidas: pushdown {linhas_pushdown:,} × completo {len(df_fact):,}")
+
+    divergencias = conferir(niveis, df_fact)
+    for nivel, linhas in divergencias.items():
+        if linhas.empty:
+            print(f"  ✅ {nivel}: {len(niveis[nivel]):,} linhas idênticas")
+        else:
+            print(f"  ⚠️ {nivel}: {len(linhas):,} divergências")
+            print(linhas.head(20).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Emulação em lote do RLS: os KPIs de auditoria que cada usuário vê no painel.
+
+As roles de roles/*.tmdl filtram uma dimensão das carteiras pelo e-mail
+(ex.: Supervisores: DimSupervisores[E-mail] == USERNAME()) e o filtro desce
+pelos relacionamentos até FactAprovacaoPrecoParceiro.NomeUsuario. Aqui:
+  1. os filtros são lidos das roles e os relacionamentos de relationships.tmdl
+     (filtro de segurança só desce do lado um para o lado muitos — o modelo
+     não liga "aplicar filtro de segurança nas duas direções");
+  2. para cada e-mail de cada dimensão filtrada, o conjunto de aprovadores
+     alcançáveis é resolvido nas carteiras (carteiras.py);
+  3. a Fact é agregada uma única vez por aprovador e a visão de cada usuário
+     sai da soma dos seus aprovadores (OS distintas pela união dos conjuntos).
+
+Um usuário é considerado membro de todas as roles em que o e-mail aparece;
+com mais de uma role o Power BI mostra a união, e a matriz também.
+
+A reconciliação compara cada usuário com os usuários do nível de baixo
+(supervisor × aprovadores da carteira, coordenador × supervisores, Admin ×
+coordenadores) e aponta quem não fecha: aprovadores que nenhum filho vê
+(sem e-mail, supervisor/coordenador sem cadastro), que o filho vê fora da
+carteira do pai, ou que dois filhos veem ao mesmo tempo.
+
+Uso:
+  python rls.py --carteiras dim_carteiras.xlsx --offline
+  python rls.py --carteiras dim_carteiras.xlsx --saida matriz_rls.csv --divergencias rls_divergencias.csv
+"""
+
+import os
+import re
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+FACT = "FactAprovacaoPrecoParceiro"
+ADMIN = "(Admin)"
+MEDIDAS_RECONCILIADAS = ("Itens", "VA Peças", "VA Peças Potencial", "VA Peças Travado Preço Parceiro")
+
+_FILTRO_USUARIO = re.compile(
+    r"^\s*(?:('(?:[^']|'')+'|\w+)\[([^\]]+)\]\s*==?\s*(?:USERNAME|USERPRINCIPALNAME)\(\)"
+    r"|(?:USERNAME|USERPRINCIPALNAME)\(\)\s*==?\s*('(?:[^']|'')+'|\w+)\[([^\]]+)\])\s*$",
+    re.IGNORECASE,
+)
+
+
+def coluna_usuario(tabela, expressao):
+    """Coluna comparada com USERNAME() em um filtro de role; ValueError se o filtro tiver outra forma."""
+    marca = _FILTRO_USUARIO.match(expressao)
+    if not marca:
+        raise ValueError(f"Filtro de {tabela} não suportado: {expressao}")
+    nome_tabela = (marca.group(1) or marca.group(3)).strip("'")
+    if nome_tabela != tabela:
+        raise ValueError(f"Filtro de {tabela} usa outra tabela: {expressao}")
+    return marca.group(2) or marca.group(4)
+
+
+def _propagar(tabela, mascara, tabelas, relacoes, destino):
+    """Desce o filtro de `tabela` pelos relacionamentos (lado um → muitos) até `destino`."""
+    from carteiras import chave_relacao
+
+    if tabela == destino:
+        return mascara
+    for r in relacoes:
+        if not r["ativo"] or r["para_tabela"] != tabela or r["de_tabela"] not in tabelas:
+            continue
+        chaves = set(chave_relacao(tabelas[tabela].loc[mascara, r["para_coluna"]]).dropna())
+        filha = tabelas[r["de_tabela"]]
+        resultado = _propagar(
+            r["de_tabela"], chave_relacao(filha[r["de_coluna"]]).isin(chaves).to_numpy(), tabelas, relacoes, destino,
+        )
+        if resultado is not None:
+            return resultado
+    return None
+
+
+def visoes(dims, lista_roles=None, relacoes=None):
+    """
+    Uma visão por (role, e-mail) a partir das roles do modelo.
+
+    Devolve (visoes, ligacao): cada visão é {"role", "tabela", "usuario"
+    (e-mail em minúsculas), "linhas" (posições filtradas na dimensão),
+    "membros" (chaves dessas linhas), "aprovadores" (chaves de NomeUsuario
+    alcançáveis)}; ligacao é o relacionamento Fact → dimensão dos aprovadores.
+    Roles sem filtro (Admin) não geram visão.
+    """
+    import numpy as np
+    from tmdl import roles, relacionamentos
+    from carteiras import DIMENSOES, chave_relacao
+
+    lista_roles = roles() if lista_roles is None else lista_roles
+    relacoes = relacionamentos() if relacoes is None else relacoes
+    tabelas = {f"Dim{aba}": df for aba, df in dims.items()}
+    ligacao = next(
+        (r for r in relacoes if r["ativo"] and r["de_tabela"] == FACT and r["para_tabela"] in tabelas), None,
+    )
+    if ligacao is None:
+        raise ValueError(f"Nenhum relacionamento ativo de {FACT} para as carteiras ({', '.join(tabelas)})")
+    destino = tabelas[ligacao["para_tabela"]]
+    chaves_destino = chave_relacao(destino[ligacao["para_coluna"]]).to_numpy()
+
+    resultado = []
+    for role in lista_roles:
+        for tabela, expressao in role["filtros"].items():
+            if tabela not in tabelas:
+                print(f"   ⚠️ Role {role['role']}: filtro em {tabela}, que não é uma dimensão das carteiras — ignorado")
+                continue
+            coluna = coluna_usuario(tabela, expressao)
+            df = tabelas[tabela]
+            chave_membro = DIMENSOES[tabela[len("Dim"):]][0]
+            emails = chave_relacao(df[coluna])
+            for email in sorted(set(emails.dropna())):
+                mascara = (emails == email).fillna(False).to_numpy()
+                alcancados = _propagar(tabela, mascara, tabelas, relacoes, ligacao["para_tabela"])
+                resultado.append({
+                    "role": role["role"],
+                    "tabela": tabela,
+                    "usuario": email,
+                    "linhas": np.flatnonzero(mascara),
+                    "membros": list(df.loc[mascara, chave_membro]),
+                    "aprovadores": set(chaves_destino[alcancados]) if alcancados is not None else set(),
+                })
+    return resultado, ligacao
+
+
+def kpis(df, conjuntos):
+    """
+    Medidas de cada conjunto de aprovadores em uma passada sobre a Fact.
+
+    conjuntos: lista de conjuntos de chaves de NomeUsuario (casefold), ou None
+    para "todos os itens" (Admin). Devolve DataFrame com uma linha por conjunto.
+    """
+    import numpy as np
+    import pandas as pd
+    from carteiras import chave_relacao
+    from cubo_hierarquia import CONJUNTOS_OS, pares_distintos
+    from medidas import MEDIDAS_ADITIVAS, mascaras, base_aditiva, medidas_derivadas
+    from perfil import etapa
+
+    with etapa("rls", linhas=len(df)) as medidas:
+        masc = mascaras(df)
+        base = base_aditiva(df, masc)
+        codigo, nomes = pd.factorize(df["NomeUsuario"], use_na_sentinel=False)
+        chaves = chave_relacao(pd.Series(nomes, dtype="object")).to_numpy()
+        n_nomes = len(nomes)
+        colunas = list(base.columns)
+        somas = {c: np.bincount(codigo, weights=base[c].to_numpy(), minlength=n_nomes) for c in colunas}
+
+        codigos_da_chave = {}
+        for i, chave in enumerate(chaves):
+            codigos_da_chave.setdefault(chave, []).append(i)
+        visao, nome = [], []
+        for v, conjunto in enumerate(conjuntos):
+            codigos = range(n_nomes) if conjunto is None else [
+                i for chave in conjunto for i in codigos_da_chave.get(chave, ())
+            ]
+            visao.extend([v] * len(codigos))
+            nome.extend(codigos)
+        visao = np.asarray(visao, dtype="int64")
+        nome = np.asarray(nome, dtype="int64")
+        medidas["pares"] = len(visao)
+
+        resultado = pd.DataFrame({
+            c: np.bincount(visao, weights=somas[c][nome], minlength=len(conjuntos)) for c in colunas
+        })
+        resultado["Itens"] = resultado["Itens"].astype("int64")
+        resultado["Aprovadores"] = np.bincount(visao, minlength=len(conjuntos))
+
+        tem_os = df["NumeroOS"].notna().to_numpy()
+        os_valores = df["NumeroOS"].to_numpy(dtype="int64", na_value=0)
+        for conjunto_os, m in CONJUNTOS_OS.items():
+            filtro = tem_os & masc[m].to_numpy()
+            cod_os, os_ = pares_distintos(codigo[filtro].astype("int64"), os_valores[filtro])
+            inicio = np.searchsorted(cod_os, np.arange(n_nomes))
+            tamanho = np.bincount(cod_os, minlength=n_nomes)
+            # (visão, aprovador) × (aprovador, OS) → (visão, OS)
+            repeticoes = tamanho[nome]
+            visao_os = np.repeat(visao, repeticoes)
+            deslocamento = np.arange(repeticoes.sum()) - np.repeat(np.cumsum(repeticoes) - repeticoes, repeticoes)
+            indices = np.repeat(inicio[nome], repeticoes) + deslocamento
+            v, _ = pares_distintos(visao_os, os_[indices])
+            resultado[f"{conjunto_os} distintas"] = np.bincount(v, minlength=len(conjuntos))
+
+    resultado = medidas_derivadas(resultado)
+    ordem = ["Aprovadores", "Itens"] + [f"{c} distintas" for c in CONJUNTOS_OS] + list(MEDIDAS_ADITIVAS)
+    return resultado[ordem + [c for c in resultado.columns if c not in ordem]]
+
+
+def matriz_usuarios(df, lista_visoes):
+    """
+    Uma linha por usuário (união das roles em que aparece) + a linha do Admin.
+
+    Devolve (matriz, kpis_por_visao) — o segundo alinhado com lista_visoes,
+    usado na reconciliação.
+    """
+    usuarios = {}
+    for v in lista_visoes:
+        u = usuarios.setdefault(v["usuario"], {"roles": [], "membros": [], "aprovadores": set()})
+        u["roles"].append(v["role"])
+        u["membros"].extend(str(m) for m in v["membros"])
+        u["aprovadores"] |= v["aprovadores"]
+
+    nomes = sorted(usuarios)
+    resultado = kpis(df, [v["aprovadores"] for v in lista_visoes] + [usuarios[u]["aprovadores"] for u in nomes] + [None])
+    n = len(lista_visoes)
+    por_visao = resultado.iloc[:n].reset_index(drop=True)
+    matriz = resultado.iloc[n:].reset_index(drop=True)
+    matriz.insert(0, "Usuario", nomes + [ADMIN])
+    matriz.insert(1, "Roles", [", ".join(sorted(set(usuarios[u]["roles"]))) for u in nomes] + ["Admin"])
+    matriz.insert(2, "Membros", ["; ".join(usuarios[u]["membros"]) for u in nomes] + [""])
+    return matriz, por_visao
+
+
+def reconciliar(lista_visoes, por_visao, matriz, dims, relacoes=None, tolerancia=0.01):
+    """
+    Compara cada visão com a soma das visões do nível de baixo.
+
+    O nível de baixo de uma role sobre a tabela P são as roles sobre a tabela
+    T com relacionamento T → P; as roles sem nível de cima ficam sob o Admin.
+    Devolve DataFrame com uma linha por usuário pai e a coluna Fecha.
+    """
+    import pandas as pd
+    from tmdl import relacionamentos
+    from carteiras import chave_relacao
+
+    relacoes = relacionamentos() if relacoes is None else relacoes
+    tabelas = {f"Dim{aba}": df for aba, df in dims.items()}
+    filtradas = {v["tabela"] for v in lista_visoes}
+    pai_da_tabela = {
+        r["de_tabela"]: r for r in relacoes
+        if r["ativo"] and r["de_tabela"] in filtradas and r["para_tabela"] in filtradas
+    }
+    tabelas_pai = {r["para_tabela"] for r in pai_da_tabela.values()}
+
+    def chaves(visao, coluna):
+        valores = tabelas[visao["tabela"]][coluna].iloc[visao["linhas"]]
+        return set(chave_relacao(valores).dropna())
+
+    # pai → filhos (índices em lista_visoes); -1 = Admin
+    filhos = {-1: []}
+    pais_da_chave = {}
+    for j, v in enumerate(lista_visoes):
+        if v["tabela"] in tabelas_pai:
+            filhos[j] = []
+            for r in pai_da_tabela.values():
+                if r["para_tabela"] == v["tabela"]:
+                    for chave in chaves(v, r["para_coluna"]):
+                        pais_da_chave.setdefault((v["tabela"], chave), []).append(j)
+    for i, v in enumerate(lista_visoes):
+        r = pai_da_tabela.get(v["tabela"])
+        if r is None:
+            filhos[-1].append(i)
+            continue
+        pais = {j for chave in chaves(v, r["de_coluna"]) for j in pais_da_chave.get((r["para_tabela"], chave), ())}
+        for j in sorted(pais):
+            filhos[j].append(i)
+
+    todos = set().union(*(v["aprovadores"] for v in lista_visoes))
+    linhas = []
+    for j, indices in sorted(filhos.items()):
+        if j == -1:
+            usuario, role, aprovadores_pai = ADMIN, "Admin", None
+            kpi_pai = matriz[matriz["Usuario"] == ADMIN].iloc[0]
+        else:
+            usuario, role, aprovadores_pai = lista_visoes[j]["usuario"], lista_visoes[j]["role"], lista_visoes[j]["aprovadores"]
+            kpi_pai = por_visao.iloc[j]
+        kpi_filhos = por_visao.iloc[indices]
+        uniao = set().union(*(lista_visoes[i]["aprovadores"] for i in indices))
+        soma_tamanhos = sum(len(lista_visoes[i]["aprovadores"]) for i in indices)
+
+        linha = {
+            "Usuario": usuario,
+            "Role": role,
+            "Filhos": len(indices),
+            "Role filhos": ", ".join(sorted({lista_visoes[i]["role"] for i in indices})),
+            # o Admin vê também aprovadores fora das carteiras: a diferença de itens mostra esses
+            "Aprovadores sem filho": len((todos if aprovadores_pai is None else aprovadores_pai) - uniao),
+            "Aprovadores fora do pai": 0 if aprovadores_pai is None else len(uniao - aprovadores_pai),
+            "Aprovadores em 2+ filhos": soma_tamanhos - len(uniao),
+        }
+        fecha = True
+        for medida in MEDIDAS_RECONCILIADAS:
+            soma = float(kpi_filhos[medida].sum())
+            linha[medida] = float(kpi_pai[medida])
+            linha[f"{medida} filhos"] = soma
+            linha[f"Diferenca {medida}"] = linha[medida] - soma
+            fecha &= abs(linha[f"Diferenca {medida}"]) <= tolerancia
+        linha["Fecha"] = fecha
+        linhas.append(linha)
+    return pd.DataFrame(linhas)
+
+
+def main():
+    import pandas as pd
+    from carteiras import load_carteiras
+    from tmdl import roles, relacionamentos
+    from validar_formularios import load_fact_data, adicionar_argumentos_fact, opcoes_fact
+
+    parser = argparse.ArgumentParser(description="KPIs de auditoria vistos por cada usuário das roles de RLS")
+    parser.add_argument("--carteiras", type=str, default=None, help='Caminho da "dim_carteiras.xlsx"')
+    parser.add_argument("--saida", type=str, default=None, help="Grava a matriz usuário × KPI em CSV")
+    parser.add_argument("--divergencias", type=str, default=None, help="Grava a reconciliação pai × filhos em CSV")
+    parser.add_argument("--tolerancia", type=float, default=0.01, help="Diferença aceita na reconciliação (padrão: 0.01)")
+    adicionar_argumentos_fact(parser)
+    args = parser.parse_args()
+
+    lista_roles = roles()
+    relacoes = relacionamentos()
+    print(f"🔐 Roles: {', '.join(r['role'] + (' (sem filtro)' if not r['filtros'] else '') for r in lista_roles)}")
+    dims = load_carteiras(args.carteiras)
+    if dims is None:
+        sys.exit(1)
+    lista_visoes, ligacao = visoes(dims, lista_roles, relacoes)
+    print(f"   {len(lista_visoes):,} visões (role × e-mail) via {ligacao['de_tabela']}.{ligacao['de_coluna']}")
+
+    df_fact = load_fact_data(**opcoes_fact(args))
+    matriz, por_visao = matriz_usuarios(df_fact, lista_visoes)
+    reconciliacao = reconciliar(lista_visoes, por_visao, matriz, dims, relacoes, args.tolerancia)
+
+    print(f"\n  👥 {len(matriz) - 1:,} usuários + Admin")
+    if args.saida:
+        matriz.to_csv(args.saida, index=False, sep=";", decimal=",")
+        print(f"   💾 Matriz salva em {args.saida}")
+    else:
+        colunas = ["Usuario", "Roles", "Aprovadores", "Itens", "OS distintas", "VA Peças", "% Aproveitamento"]
+        with pd.option_context("display.width", 200, "display.float_format", "{:,.2f}".format):
+            print(matriz[colunas].head(30).to_string(index=False))
+
+    nao_fecham = reconciliacao[~reconciliacao["Fecha"]] if not reconciliacao.empty else reconciliacao
+    if args.divergencias:
+        reconciliacao.to_csv(args.divergencias, index=False, sep=";", decimal=",")
+        print(f"   💾 Reconciliação salva em {args.divergencias}")
+    if nao_fecham.empty:
+        print(f"\n  ✅ Todos os {len(reconciliacao):,} usuários com nível abaixo fecham com a soma dos filhos.")
+        return
+    print(f"\n  ⚠️ {len(nao_fecham):,} de {len(reconciliacao):,} usuários não fecham com a soma do nível de baixo:")
+    colunas = [
+        "Usuario", "Role", "Filhos", "Itens", "Itens filhos", "Diferenca VA Peças",
+        "Aprovadores sem filho", "Aprovadores fora do pai", "Aprovadores em 2+ filhos",
+    ]
+    with pd.option_context("display.width", 200, "display.float_format", "{:,.2f}".format):
+        print(nao_fecham[colunas].head(30).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
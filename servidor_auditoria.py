@@ -0,0 +1,522 @@
+"""
+Servidor local de auditoria: a Fact e o formulário carregados uma vez por máquina.
+
+Quando vários auditores rodam os scripts ao mesmo tempo, cada processo carrega
+a própria cópia (GBs) da Fact e do formulário. Aqui um processo residente:
+  - carrega a Fact (snapshot/warehouse, mesmas opções dos scripts) e o
+    formulário e grava os dois em Arrow IPC sem compressão no cache;
+  - lê esses arquivos por memory map: o conteúdo fica no page cache do
+    sistema, e outros processos que mapeiam o mesmo arquivo (comando
+    `anexar`) enxergam as mesmas páginas, sem cópia;
+  - os relatórios (validar/consulta/diagnóstico) rodam em pandas: o
+    DataFrame da Fact é montado a partir do mapeamento, mas colunas texto,
+    dicionário e inteiras com nulos são copiadas para o heap do servidor.
+    Essa parte da Fact fica, portanto, duas vezes na memória do servidor
+    (mmap + pandas); o `status` informa o tamanho dessa cópia
+    (mb_copia_pandas). Os group-bys e o `anexar` usam só o mapeamento;
+  - responde por socket TCP em 127.0.0.1 aos relatórios de validação,
+    consulta e diagnóstico (o texto do relatório, guardado após a primeira
+    execução) e a group-bys ad hoc sobre a tabela mapeada, devolvendo só o
+    resultado pequeno (Arrow IPC).
+
+Protocolo: cada mensagem é um quadro <tamanho uint64 big-endian><bytes>. O
+pedido é um JSON {"comando": ..., ...}; a resposta é um JSON {"ok": ...} e,
+quando "tipo" é "tabela", um segundo quadro com o resultado em Arrow IPC.
+O endereço do servidor fica em <cache>/servidor/endereco.json. Os arquivos
+IPC se chamam fact-<pid>-<geração>.arrow (e form-...): um servidor novo nunca
+sobrescreve arquivos que clientes de um anterior ainda tenham mapeados, e os
+da geração atual são apagados quando o servidor para.
+
+Uso:
+  python servidor_auditoria.py iniciar --excel "C:/caminho/para/Projeto Preço Parceiro.xlsx" --offline
+  python servidor_auditoria.py validar                 # mesmo texto de validar_formularios.py
+  python servidor_auditoria.py consulta
+  python servidor_auditoria.py diagnostico
+  python servidor_auditoria.py agrupar --por NomeCliente --agregar NumeroOS:count_distinct --uf SP
+  python servidor_auditoria.py status
+  python servidor_auditoria.py recarregar              # relê o snapshot (ex.: depois de um --refresh)
+  python servidor_auditoria.py parar
+
+  from servidor_auditoria import anexar, agrupar
+  fact = anexar()                                      # pyarrow.Table mapeada, sem cópia
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import struct
+import argparse
+import threading
+import contextlib
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+HOST = "127.0.0.1"
+PORTA_PADRAO = 47811
+AGREGACOES = ("sum", "mean", "min", "max", "count", "count_distinct")
+AGREGACOES_PADRAO = [("ChaveItem", "count"), ("NumeroOS", "count_distinct")]
+RELATORIOS = ("validar", "consulta", "diagnostico")
+
+_CABECALHO = struct.Struct("!Q")
+
+
+def diretorio_servidor():
+    from cache_snapshot import DIRETORIO_CACHE
+    return os.path.join(DIRETORIO_CACHE, "servidor")
+
+
+def _log(msg):
+    # relatórios capturam sys.stdout; o log do servidor vai direto ao terminal
+    print(msg, file=sys.__stdout__, flush=True)
+
+
+# ============================================================
+# Protocolo
+# ============================================================
+def _enviar(sock, dados):
+    sock.sendall(_CABECALHO.pack(len(dados)) + dados)
+
+
+def _receber_exato(sock, n):
+    partes = []
+    while n:
+        parte = sock.recv(min(n, 1 << 20))
+        if not parte:
+            raise ConnectionError("Conexão encerrada no meio da mensagem")
+        partes.append(parte)
+        n -= len(parte)
+    return b"".join(partes)
+
+
+def _receber(sock):
+    (tamanho,) = _CABECALHO.unpack(_receber_exato(sock, _CABECALHO.size))
+    return _receber_exato(sock, tamanho)
+
+
+def _ipc(tabela):
+    import pyarrow as pa
+
+    saida = pa.BufferOutputStream()
+    with pa.ipc.new_stream(saida, tabela.schema) as escritor:
+        escritor.write_table(tabela)
+    return saida.getvalue().to_pybytes()
+
+
+# ============================================================
+# Estado residente
+# ============================================================
+def _gravar_ipc(tabela, caminho):
+    import pyarrow as pa
+
+    tmp = caminho + ".tmp"
+    with pa.OSFile(tmp, "wb") as destino, pa.ipc.new_file(destino, tabela.schema) as escritor:
+        escritor.write_table(tabela, max_chunksize=1_000_000)
+    os.replace(tmp, caminho)
+
+
+def mapear(caminho):
+    """Lê um arquivo Arrow IPC por memory map (zero cópia)."""
+    import pyarrow as pa
+
+    return pa.ipc.open_file(pa.memory_map(caminho, "r")).read_all()
+
+
+def carregar_estado(opcoes, excel, geracao):
+    """
+    Carrega Fact + formulário, grava em Arrow IPC e devolve o estado mapeado:
+    {"fact", "form" (pyarrow.Table mapeadas), "df_fact", "df_form", "arquivos", ...}.
+    """
+    import pyarrow as pa
+    from consultas import COLUNAS_AUDITORIA
+    from cache_snapshot import projetar
+    from esquema import para_pandas
+    from validar_formularios import load_fact_data, load_formulario
+
+    df_fact = load_fact_data(**opcoes)
+    df_form = load_formulario(excel)
+
+    diretorio = diretorio_servidor()
+    os.makedirs(diretorio, exist_ok=True)
+    sufixo = f"{os.getpid()}-{geracao}"
+    arquivos = {"fact": os.path.join(diretorio, f"fact-{sufixo}.arrow")}
+    _gravar_ipc(pa.Table.from_pandas(df_fact, preserve_index=False), arquivos["fact"])
+    del df_fact
+    if df_form is not None:
+        try:
+            arquivos["form"] = os.path.join(diretorio, f"form-{sufixo}.arrow")
+            _gravar_ipc(pa.Table.from_pandas(df_form, preserve_index=False), arquivos["form"])
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            _log(f"   ⚠️ Formulário não convertido para Arrow ({e}); fica só no servidor.")
+            arquivos.pop("form")
+
+    # o DataFrame dos relatórios é montado a partir do mapeamento, só com as
+    # colunas que eles usam (agrupar lê a tabela inteira): as numéricas sem
+    # nulos apontam para as páginas do arquivo; as demais são copiadas
+    # (medido uma vez em mb_copia_pandas)
+    fact = mapear(arquivos["fact"])
+    df_fact = para_pandas(projetar(fact, COLUNAS_AUDITORIA))
+    estado = {
+        "geracao": geracao,
+        "arquivos": arquivos,
+        "fact": fact,
+        "df_fact": df_fact,
+        "mb_copia_pandas": round(_bytes_copiados(df_fact, fact) / 1024 ** 2, 1),
+        "df_form": df_form,
+        "carregado_em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "relatorios": {},
+    }
+    estado["form"] = mapear(arquivos["form"]) if "form" in arquivos else None
+    return estado
+
+
+def _buffers_coluna(serie):
+    """(endereço, tamanho) dos buffers de uma coluna pandas (numpy, mascarada, categórica ou Arrow)."""
+    import numpy as np
+
+    valores = serie.array
+    if hasattr(valores, "_pa_array"):
+        return [
+            (buf.address, buf.size)
+            for chunk in valores._pa_array.chunks for buf in chunk.buffers() if buf is not None
+        ]
+    if hasattr(valores, "codes"):
+        return _buffers_coluna(serie.cat.codes) + _buffers_coluna(serie.cat.categories.to_series())
+    arrays = [getattr(valores, nome, None) for nome in ("_ndarray", "_data", "_mask")]
+    arrays = [a for a in arrays if isinstance(a, np.ndarray)] or [np.asarray(valores)]
+    return [(a.__array_interface__["data"][0], a.nbytes) for a in arrays]
+
+
+def _bytes_copiados(df, tabela):
+    """Bytes das colunas do DataFrame fora do mapeamento de `tabela` (cópias no heap do processo)."""
+    enderecos = [
+        (buf.address, buf.address + buf.size)
+        for coluna in tabela.columns for chunk in coluna.chunks for buf in chunk.buffers() if buf is not None
+    ]
+    inicio, fim = min(e[0] for e in enderecos), max(e[1] for e in enderecos)
+    return sum(
+        tamanho
+        for coluna in df.columns
+        for endereco, tamanho in _buffers_coluna(df[coluna])
+        if not inicio <= endereco < fim
+    )
+
+
+def _remover_arquivos(arquivos):
+    for caminho in arquivos.values():
+        try:
+            os.remove(caminho)
+        except OSError:
+            # no Windows um arquivo mapeado por um cliente não pode ser removido
+            pass
+
+
+def _executar_relatorio(estado, nome):
+    from validar_formularios import run_validation
+    from consulta_auditoria import run_consulta
+    from diagnostico_totais import run_diagnostico
+
+    df_fact, df_form = estado["df_fact"], estado["df_form"]
+    if df_form is None:
+        return "❌ Servidor sem formulário (inicie com --excel)."
+    funcao = {"validar": run_validation, "consulta": run_consulta, "diagnostico": run_diagnostico}[nome]
+    saida = io.StringIO()
+    with contextlib.redirect_stdout(saida):
+        funcao(df_fact, df_form)
+    return saida.getvalue()
+
+
+def _decodificar(tabela, colunas):
+    """Colunas dicionário → tipo dos valores (as agregações e a ordenação do Arrow não aceitam dicionário)."""
+    import pyarrow as pa
+
+    for coluna in colunas:
+        tipo = tabela.schema.field(coluna).type
+        if pa.types.is_dictionary(tipo):
+            indice = tabela.column_names.index(coluna)
+            tabela = tabela.set_column(indice, coluna, tabela[coluna].cast(tipo.value_type))
+    return tabela
+
+
+def agrupar_tabela(tabela, por=(), agregacoes=None, filtros=None):
+    """Group-by sobre a Fact (pyarrow.Table); filtros no formato de filtros_fact.normalizar."""
+    from filtros_fact import COLUNAS_FILTRO, filtrar_tabela
+
+    por = list(por)
+    filtros = filtros or {}
+    agregacoes = [tuple(a) for a in (agregacoes or AGREGACOES_PADRAO)]
+    for coluna, funcao in agregacoes:
+        if funcao not in AGREGACOES:
+            raise ValueError(f"Agregação '{funcao}' inválida (use {', '.join(AGREGACOES)})")
+    alvos = list(dict.fromkeys(c for c, _ in agregacoes))
+    desconhecidas = [c for c in por + alvos if c not in tabela.column_names]
+    if desconhecidas:
+        raise ValueError(f"Colunas inexistentes na Fact: {desconhecidas}")
+
+    # só as colunas usadas são tocadas (e copiadas, se houver filtro)
+    usadas = por + alvos + ["DataAprovacao1OS"] * bool({"desde", "ate"} & set(filtros))
+    for nome, colunas_filtro in COLUNAS_FILTRO.items():
+        if nome in filtros:
+            usadas += [c for c in colunas_filtro if c]
+    tabela = filtrar_tabela(tabela.select(list(dict.fromkeys(usadas))), filtros)
+    resultado = _decodificar(tabela, alvos).group_by(por).aggregate(agregacoes)
+    if por:
+        resultado = _decodificar(resultado, por)
+        resultado = resultado.select(por + [c for c in resultado.column_names if c not in por])
+        resultado = resultado.sort_by([(c, "ascending") for c in por])
+    return resultado
+
+
+class Servidor:
+    """Estado residente + tratamento dos comandos (um objeto por processo servidor)."""
+
+    def __init__(self, opcoes, excel):
+        self.opcoes = opcoes
+        self.excel = excel
+        self.inicio = time.time()
+        self.trava_estado = threading.Lock()
+        self.trava_relatorio = threading.Lock()
+        self.trava_recarga = threading.Lock()
+        self.estado = carregar_estado(opcoes, excel, geracao=1)
+
+    def recarregar(self):
+        # Uma recarga por vez: duas ao mesmo tempo gravariam a mesma geração e
+        # a segunda apagaria os arquivos que a primeira acabou de publicar
+        with self.trava_recarga:
+            novo = carregar_estado(self.opcoes, self.excel, geracao=self.estado["geracao"] + 1)
+            with self.trava_estado:
+                antigo, self.estado = self.estado, novo
+            em_uso = set(novo["arquivos"].values())
+            _remover_arquivos({k: c for k, c in antigo["arquivos"].items() if c not in em_uso})
+        return novo
+
+    def encerrar(self):
+        """Apaga os arquivos IPC da geração atual (chamado quando o servidor para)."""
+        _remover_arquivos(self.estado["arquivos"])
+
+    def aquecer(self):
+        """Executa os relatórios uma vez para que as respostas saiam do cache."""
+        for nome in RELATORIOS:
+            self.relatorio(nome)
+
+    def relatorio(self, nome):
+        estado = self.estado
+        with self.trava_relatorio:
+            if nome not in estado["relatorios"]:
+                estado["relatorios"][nome] = _executar_relatorio(estado, nome)
+        return estado["relatorios"][nome]
+
+    def status(self):
+        estado = self.estado
+        return {
+            "pid": os.getpid(),
+            "geracao": estado["geracao"],
+            "carregado_em": estado["carregado_em"],
+            "ativo_ha_s": round(time.time() - self.inicio, 1),
+            "linhas_fact": estado["fact"].num_rows,
+            "linhas_form": None if estado["df_form"] is None else len(estado["df_form"]),
+            "colunas_fact": estado["fact"].column_names,
+            "arquivos": estado["arquivos"],
+            "mb_arquivos": round(sum(os.path.getsize(c) for c in estado["arquivos"].values()) / 1024 ** 2, 1),
+            "mb_dataframe": round(estado["df_fact"].memory_usage(deep=False).sum() / 1024 ** 2, 1),
+            "mb_copia_pandas": estado["mb_copia_pandas"],
+            "relatorios_prontos": sorted(estado["relatorios"]),
+        }
+
+    def atender(self, pedido):
+        """Devolve (cabeçalho JSON, tabela ou None)."""
+        comando = pedido.get("comando")
+        if comando in RELATORIOS:
+            return {"tipo": "texto", "texto": self.relatorio(comando)}, None
+        if comando == "agrupar":
+            tabela = agrupar_tabela(
+                self.estado["fact"], pedido.get("por", ()), pedido.get("agregacoes"), pedido.get("filtros"),
+            )
+            return {"tipo": "tabela", "linhas": tabela.num_rows}, tabela
+        if comando == "anexar":
+            return {"tipo": "anexar", "arquivos": self.estado["arquivos"], "geracao": self.estado["geracao"]}, None
+        if comando == "status":
+            return {"tipo": "status", **self.status()}, None
+        if comando == "recarregar":
+            estado = self.recarregar()
+            return {"tipo": "status", "geracao": estado["geracao"], "linhas_fact": estado["fact"].num_rows}, None
+        raise ValueError(f"Comando desconhecido: {comando!r}")
+
+
+def servir(servidor, porta=PORTA_PADRAO):
+    import socketserver
+
+    class Tratador(socketserver.BaseRequestHandler):
+        def handle(self):
+            inicio = time.perf_counter()
+            try:
+                pedido = json.loads(_receber(self.request))
+            except (ConnectionError, ValueError):
+                return
+            comando = pedido.get("comando")
+            if comando == "parar":
+                _enviar(self.request, json.dumps({"ok": True, "tipo": "parar"}).encode("utf-8"))
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+            try:
+                cabecalho, tabela = servidor.atender(pedido)
+                cabecalho = {"ok": True, **cabecalho}
+            except Exception as e:
+                cabecalho, tabela = {"ok": False, "erro": f"{type(e).__name__}: {e}"}, None
+            cabecalho["ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+            _enviar(self.request, json.dumps(cabecalho, ensure_ascii=False, default=str).encode("utf-8"))
+            if tabela is not None:
+                _enviar(self.request, _ipc(tabela))
+            _log(f"   ↪ {comando} ({cabecalho['ms']} ms){'' if cabecalho['ok'] else ' ❌ ' + cabecalho['erro']}")
+
+    class ServidorTCP(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    caminho_endereco = os.path.join(diretorio_servidor(), "endereco.json")
+    with ServidorTCP((HOST, porta), Tratador) as tcp:
+        with open(caminho_endereco, "w", encoding="utf-8") as f:
+            json.dump({"host": HOST, "porta": tcp.server_address[1], "pid": os.getpid()}, f)
+        _log(f"\n🟢 Servidor de auditoria em {HOST}:{tcp.server_address[1]} (Ctrl-C ou 'parar' encerra)")
+        try:
+            tcp.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            with contextlib.suppress(OSError):
+                os.remove(caminho_endereco)
+            servidor.encerrar()
+    _log("🔴 Servidor encerrado.")
+
+
+# ============================================================
+# Cliente
+# ============================================================
+def endereco_servidor(porta=None):
+    """(host, porta) do servidor: a porta informada ou a do endereco.json."""
+    if porta:
+        return HOST, porta
+    caminho = os.path.join(diretorio_servidor(), "endereco.json")
+    if not os.path.exists(caminho):
+        raise ConnectionError("Servidor de auditoria não está rodando (python servidor_auditoria.py iniciar).")
+    with open(caminho, encoding="utf-8") as f:
+        endereco = json.load(f)
+    return endereco["host"], endereco["porta"]
+
+
+def pedir(comando, porta=None, timeout=None, **dados):
+    """Envia um comando e devolve (cabeçalho, tabela ou None); levanta RuntimeError se o servidor falhar."""
+    import socket
+    import pyarrow as pa
+
+    with socket.create_connection(endereco_servidor(porta), timeout=timeout) as sock:
+        _enviar(sock, json.dumps({"comando": comando, **dados}, ensure_ascii=False).encode("utf-8"))
+        cabecalho = json.loads(_receber(sock))
+        if not cabecalho["ok"]:
+            raise RuntimeError(cabecalho["erro"])
+        tabela = None
+        if cabecalho.get("tipo") == "tabela":
+            tabela = pa.ipc.open_stream(_receber(sock)).read_all()
+    return cabecalho, tabela
+
+
+def agrupar(por=(), agregacoes=None, filtros=None, porta=None):
+    """Group-by executado no servidor; devolve a pyarrow.Table do resultado."""
+    return pedir("agrupar", porta, por=list(por), agregacoes=agregacoes, filtros=filtros or {})[1]
+
+
+def anexar(porta=None, form=False):
+    """Fact (ou formulário) do servidor como pyarrow.Table mapeada do mesmo arquivo (sem cópia)."""
+    cabecalho, _ = pedir("anexar", porta)
+    arquivo = cabecalho["arquivos"].get("form" if form else "fact")
+    if arquivo is None:
+        raise RuntimeError("Servidor sem formulário (inicie com --excel).")
+    return mapear(arquivo)
+
+
+def _agregacao(texto):
+    coluna, _, funcao = texto.rpartition(":")
+    if not coluna or funcao not in AGREGACOES:
+        raise argparse.ArgumentTypeError(f"use COLUNA:FUNCAO com FUNCAO em {', '.join(AGREGACOES)}")
+    return coluna, funcao
+
+
+def main():
+    import perfil
+    from validar_formularios import (
+        adicionar_argumentos_fact, adicionar_argumentos_filtros, filtros_dos_argumentos, opcoes_fact,
+    )
+
+    parser = argparse.ArgumentParser(description="Servidor local de auditoria (Fact + formulário residentes)")
+    parser.add_argument("--porta", type=int, default=None, help=f"Porta TCP em {HOST} (padrão: {PORTA_PADRAO})")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    iniciar = sub.add_parser("iniciar", help="Carrega os dados e atende até 'parar' ou Ctrl-C")
+    iniciar.add_argument("--excel", type=str, default=None, help='Caminho para "Projeto Preço Parceiro.xlsx"')
+    iniciar.add_argument("--sem-aquecer", action="store_true", help="Não pré-calcula os relatórios ao iniciar")
+    adicionar_argumentos_fact(iniciar)
+    perfil.adicionar_argumento(iniciar)
+
+    for nome in RELATORIOS:
+        sub.add_parser(nome, help=f"Relatório '{nome}' calculado no servidor")
+    grupo = sub.add_parser("agrupar", help="Group-by ad hoc sobre a Fact do servidor")
+    grupo.add_argument("--por", action="append", default=[], help="Coluna de agrupamento (repetível)")
+    grupo.add_argument("--agregar", action="append", type=_agregacao, default=None, metavar="COLUNA:FUNCAO",
+                       help="Agregação (repetível; padrão: ChaveItem:count e NumeroOS:count_distinct)")
+    grupo.add_argument("--top", type=int, default=50, help="Linhas exibidas (padrão: 50)")
+    grupo.add_argument("--saida", type=str, default=None, help="Grava o resultado em CSV")
+    adicionar_argumentos_filtros(grupo)
+    sub.add_parser("anexar", help="Mapeia a Fact do servidor neste processo e mostra o esquema")
+    sub.add_parser("status", help="Estado do servidor")
+    sub.add_parser("recarregar", help="Relê a Fact e o formulário (nova geração dos arquivos)")
+    sub.add_parser("parar", help="Encerra o servidor")
+    args = parser.parse_args()
+
+    if args.comando == "iniciar":
+        with perfil.sessao(args.profile, "servidor_auditoria"):
+            servidor = Servidor(opcoes_fact(args), args.excel)
+            if not args.sem_aquecer:
+                with perfil.etapa("aquecimento"):
+                    servidor.aquecer()
+        servir(servidor, args.porta or PORTA_PADRAO)
+        return
+
+    try:
+        if args.comando in RELATORIOS:
+            cabecalho, _ = pedir(args.comando, args.porta)
+            print(cabecalho["texto"], end="")
+            print(f"\n   ⚡ {cabecalho['ms']} ms no servidor")
+        elif args.comando == "agrupar":
+            import pandas as pd
+
+            inicio = time.perf_counter()
+            resultado = agrupar(args.por, args.agregar, filtros_dos_argumentos(args), args.porta)
+            df = resultado.to_pandas()
+            with pd.option_context("display.width", 200, "display.max_columns", 20):
+                print(df.head(args.top).to_string(index=False))
+            print(f"\n   ⚡ {len(df):,} linhas em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+            if args.saida:
+                df.to_csv(args.saida, index=False, sep=";", decimal=",")
+                print(f"   💾 {args.saida}")
+        elif args.comando == "anexar":
+            fact = anexar(args.porta)
+            print(f"📎 {fact.num_rows:,} linhas mapeadas sem cópia\n{fact.schema.to_string(show_schema_metadata=False)}")
+        elif args.comando in ("status", "recarregar"):
+            cabecalho, _ = pedir(args.comando, args.porta)
+            for chave, valor in cabecalho.items():
+                if chave not in ("ok", "tipo"):
+                    print(f"   {chave}: {valor}")
+        elif args.comando == "parar":
+            pedir("parar", args.porta)
+            print("🔴 Servidor encerrado.")
+    except ConnectionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    except RuntimeError as e:
+        print(f"❌ Erro no servidor: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+"""
+Sketches de OS distintas por dia, para DISTINCTCOUNT de qualquer período.
+
+Contagens distintas de OS não somam entre clientes nem entre dias (é todo o
+assunto de COUNT × DISTINCTCOUNT em validar_formularios.py e
+diagnostico_totais.py). Em vez de reler a Fact a cada recorte, o snapshot é
+resumido uma vez em células (dia, cliente) e (dia, aprovador), cada uma com:
+  - modo exato: a lista ordenada das OS da célula (índices densos de OS).
+    Unir células = marcar um bitmap com uma posição por OS do snapshot;
+    o bitmap cruzado com as OS do formulário e com as OS recusadas dá as três
+    contagens do painel, sem erro;
+  - modo aproximado (opcional, --hll P): HyperLogLog com m = 2^P registros,
+    guardado esparso (só os registros preenchidos, no máximo m por célula).
+    Unir células = máximo registro a registro. Erro padrão relativo
+    1,04/√m: P=12 → 1,6% (≈95% das estimativas dentro de ±3,3%);
+    P=14 → 0,8%. Abaixo de 2,5·m o estimador troca para linear counting,
+    bem mais preciso para conjuntos pequenos.
+
+"OS com formulário" e "OS recusada" seguem contagens.py: OS com alguma
+resposta e OS com alguma resposta "Não". O formulário entra na construção;
+se a planilha mudar, construa de novo.
+
+Uso:
+  python sketches.py construir --excel "Projeto Preço Parceiro.xlsx" --offline --hll 12
+  python sketches.py consultar --desde 2025-06-01 --ate 2025-06-30 --membro "Cliente X" --membro "Cliente Y"
+  python sketches.py consultar --dimensao aprovador --por-membro --modo hll
+  python sketches.py consultar --desde 2025-06-01 --verificar --offline   # confere com a Fact
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+PREFIXO_CHAVE = "sketches-"
+DIMENSOES_SKETCH = {
+    "cliente": "NomeCliente",
+    "aprovador": "NomeUsuario",
+}
+CONTAGENS = ("OS distintas", "OS com formulário", "OS recusadas")
+COLUNAS_HLL = {"OS distintas": "HLL OS", "OS com formulário": "HLL Formulario", "OS recusadas": "HLL Recusa"}
+
+
+def _hash64(valores):
+    """splitmix64: espalha os números de OS (sequenciais) por 64 bits."""
+    import numpy as np
+
+    with np.errstate(over="ignore"):
+        z = valores.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _bits(valores):
+    """Número de bits significativos de cada uint64."""
+    import numpy as np
+
+    n = np.zeros(len(valores), dtype=np.uint8)
+    for deslocamento in (32, 16, 8, 4, 2, 1):
+        alto = valores >= (np.uint64(1) << np.uint64(deslocamento))
+        n += alto.astype(np.uint8) * deslocamento
+        valores = np.where(alto, valores >> np.uint64(deslocamento), valores)
+    return n + (valores > 0).astype(np.uint8)
+
+
+def registros_hll(valores_os, precisao):
+    """(registro, posto) do HyperLogLog para cada número de OS."""
+    import numpy as np
+
+    h = _hash64(valores_os)
+    resto_bits = 64 - precisao
+    registro = (h >> np.uint64(resto_bits)).astype(np.uint32)
+    resto = h & np.uint64((1 << resto_bits) - 1)
+    posto = (resto_bits + 1 - _bits(resto).astype(np.int64)).astype(np.uint32)
+    return registro, posto
+
+
+def estimar_hll(registros, precisao):
+    """Estimativa de cardinalidade de cada linha de uma matriz de registros (grupos × m)."""
+    import numpy as np
+
+    m = 1 << precisao
+    alpha = 0.7213 / (1 + 1.079 / m)
+    registros = np.atleast_2d(registros)
+    bruta = alpha * m * m / np.sum(np.exp2(-registros.astype("float64")), axis=1)
+    zeros = np.sum(registros == 0, axis=1)
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((bruta <= 2.5 * m) & (zeros > 0), linear, bruta)
+
+
+def _listas(celula, valores, n_celulas, tipo):
+    """Valores agrupados por célula (celula ordenada) → ListArray com uma lista por célula."""
+    import numpy as np
+    import pyarrow as pa
+
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(celula, minlength=n_celulas))])
+    return pa.ListArray.from_arrays(pa.array(offsets, pa.int32()), pa.array(valores, tipo))
+
+
+def _hll_esparso(celula, valores_os, n_celulas, precisao):
+    """Maior posto por (célula, registro), codificado (registro << 8 | posto) em uint32."""
+    import numpy as np
+    import pyarrow as pa
+
+    registro, posto = registros_hll(valores_os, precisao)
+    chave = celula.astype(np.int64) * (1 << precisao) + registro
+    ordem = np.lexsort((posto, chave))
+    chave, posto = chave[ordem], posto[ordem]
+    ultimo = np.ones(len(chave), dtype=bool)
+    ultimo[:-1] = chave[1:] != chave[:-1]
+    chave, posto = chave[ultimo], posto[ultimo]
+    celula = chave >> precisao
+    codigo = ((chave & ((1 << precisao) - 1)).astype(np.uint32) << np.uint32(8)) | posto
+    return _listas(celula, codigo, n_celulas, pa.uint32())
+
+
+def construir_sketches(df, df_form=None, precisao_hll=None):
+    """
+    Monta os sketches a partir da Fact (DataFrame) e do formulário.
+
+    Devolve {"os": tabela das OS (NumeroOS, ComFormulario, Recusa),
+             "cliente": células, "aprovador": células}; cada tabela de
+    células tem Dia, Membro, OS (lista de índices da tabela de OS) e, com
+    precisao_hll, as colunas HLL de COLUNAS_HLL.
+    """
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    from contagens import COL_ACEITE
+    from cubo_hierarquia import pares_distintos
+    from perfil import etapa
+
+    with etapa("sketches", linhas=len(df)) as medidas:
+        tem_os = df["NumeroOS"].notna().to_numpy()
+        indice_os, valores_os = pd.factorize(df["NumeroOS"].to_numpy(dtype="int64", na_value=0)[tem_os])
+        valores_os = np.asarray(valores_os, dtype="int64")
+
+        com_form = np.zeros(len(valores_os), dtype=bool)
+        recusa = np.zeros(len(valores_os), dtype=bool)
+        if df_form is not None:
+            form_os = df_form["NumeroOS"].dropna().astype("int64")
+            com_form = np.isin(valores_os, form_os.unique())
+            if COL_ACEITE in df_form.columns:
+                recusadas = df_form.loc[(df_form[COL_ACEITE] == "Não").to_numpy(), "NumeroOS"].dropna().astype("int64")
+                recusa = np.isin(valores_os, recusadas.unique())
+        tabelas = {"os": pa.table({
+            "NumeroOS": pa.array(valores_os),
+            "ComFormulario": pa.array(com_form),
+            "Recusa": pa.array(recusa),
+        })}
+
+        datas = pd.to_datetime(df["DataAprovacao1OS"]).to_numpy().astype("datetime64[D]")[tem_os]
+        dia, dias = pd.factorize(datas, sort=True, use_na_sentinel=False)
+        dias = pa.array(np.asarray(dias, dtype="datetime64[D]"), pa.date32())
+        n_dias = len(dias)
+
+        for dimensao, coluna in DIMENSOES_SKETCH.items():
+            membro, membros = pd.factorize(df[coluna].to_numpy(dtype="object")[tem_os], use_na_sentinel=False)
+            celula_bruta = membro.astype(np.int64) * n_dias + dia
+            presentes, celula = np.unique(celula_bruta, return_inverse=True)
+            celula, os_ = pares_distintos(celula.astype(np.int64), indice_os.astype(np.int64))
+
+            arrays = {
+                "Dia": dias.take(pa.array(presentes % n_dias)),
+                "Membro": pa.array(
+                    [None if pd.isna(m) else str(m) for m in np.asarray(membros, dtype="object")[presentes // n_dias]],
+                    pa.string(),
+                ),
+                "OS": _listas(celula, os_.astype(np.int32), len(presentes), pa.int32()),
+            }
+            if precisao_hll:
+                for contagem, coluna_hll in COLUNAS_HLL.items():
+                    filtro = {"OS com formulário": com_form, "OS recusadas": recusa}.get(contagem)
+                    manter = slice(None) if filtro is None else filtro[os_]
+                    arrays[coluna_hll] = _hll_esparso(celula[manter], valores_os[os_[manter]], len(presentes), precisao_hll)
+            tabelas[dimensao] = pa.table(arrays)
+            medidas[f"celulas_{dimensao}"] = len(presentes)
+    return tabelas
+
+
+def gravar_sketches(tabelas, meta, diretorio=None):
+    from cache_snapshot import gravar_snapshot
+
+    for nome, tabela in tabelas.items():
+        gravar_snapshot(PREFIXO_CHAVE + nome, tabela, meta, diretorio)
+
+
+def carregar_sketches(dimensao, diretorio=None):
+    """(células da dimensão, tabela de OS, metadados); erro se ainda não foram construídos."""
+    from cache_snapshot import ler_snapshot, ler_metadados, DIRETORIO_CACHE
+
+    celulas = ler_snapshot(PREFIXO_CHAVE + dimensao, diretorio)
+    tabela_os = ler_snapshot(PREFIXO_CHAVE + "os", diretorio)
+    if celulas is None or tabela_os is None:
+        raise FileNotFoundError(
+            f"Sketches não encontrados em {diretorio or DIRETORIO_CACHE}. Rode 'python sketches.py construir'."
+        )
+    return celulas, tabela_os, ler_metadados(PREFIXO_CHAVE + dimensao, diretorio)
+
+
+def _filtro(celulas, desde=None, ate=None, membros=None):
+    import datetime
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    filtro = pa.array([True] * celulas.num_rows)
+    if desde:
+        filtro = pc.and_(filtro, pc.fill_null(pc.greater_equal(celulas["Dia"], datetime.date.fromisoformat(desde)), False))
+    if ate:
+        filtro = pc.and_(filtro, pc.fill_null(pc.less_equal(celulas["Dia"], datetime.date.fromisoformat(ate)), False))
+    if membros:
+        alvo = pa.array([m.lower() for m in membros], pa.string())
+        filtro = pc.and_(filtro, pc.fill_null(pc.is_in(pc.utf8_lower(celulas["Membro"]), value_set=alvo), False))
+    return filtro
+
+
+def consultar_sketches(celulas, tabela_os, desde=None, ate=None, membros=None, por_membro=False,
+                       modo="exato", precisao_hll=None):
+    """
+    OS distintas, com formulário e recusadas no recorte (datas inclusivas, yyyy-mm-dd).
+
+    por_membro=True → uma linha por membro; senão uma linha com o total do
+    recorte. modo "exato" une as listas de OS; "hll" une os registros.
+    """
+    import numpy as np
+    import pandas as pd
+    import pyarrow.compute as pc
+    from cubo_hierarquia import pares_distintos
+
+    recorte = celulas.filter(_filtro(celulas, desde, ate, membros))
+    if por_membro:
+        grupo, nomes = pd.factorize(recorte["Membro"].to_numpy(zero_copy_only=False), use_na_sentinel=False)
+        nomes = list(nomes)
+    else:
+        grupo, nomes = np.zeros(recorte.num_rows, dtype=np.int64), ["Total"]
+    n = len(nomes)
+    resultado = pd.DataFrame({"Membro": nomes})
+
+    if modo == "exato":
+        lista = recorte["OS"].combine_chunks()
+        indices = pc.list_flatten(lista).to_numpy().astype(np.int64)
+        g = grupo[pc.list_parent_indices(lista).to_numpy()]
+        if por_membro:
+            g, indices = pares_distintos(g.astype(np.int64), indices)
+        else:
+            indices = np.flatnonzero(np.bincount(indices, minlength=tabela_os.num_rows))
+            g = np.zeros(len(indices), dtype=np.int64)
+        com_form = tabela_os["ComFormulario"].to_numpy()
+        recusa = tabela_os["Recusa"].to_numpy()
+        resultado["OS distintas"] = np.bincount(g, minlength=n)
+        resultado["OS com formulário"] = np.bincount(g, weights=com_form[indices], minlength=n).astype(np.int64)
+        resultado["OS recusadas"] = np.bincount(g, weights=recusa[indices], minlength=n).astype(np.int64)
+        return resultado
+
+    if not precisao_hll or COLUNAS_HLL["OS distintas"] not in recorte.column_names:
+        raise ValueError("Sketches construídos sem HyperLogLog (use construir --hll P)")
+    m = 1 << precisao_hll
+    for contagem, coluna_hll in COLUNAS_HLL.items():
+        lista = recorte[coluna_hll].combine_chunks()
+        codigo = pc.list_flatten(lista).to_numpy()
+        g = grupo[pc.list_parent_indices(lista).to_numpy()].astype(np.int64)
+        registros = np.zeros(n * m, dtype=np.uint8)
+        np.maximum.at(registros, g * m + (codigo >> 8), (codigo & 0xFF).astype(np.uint8))
+        resultado[contagem] = np.rint(estimar_hll(registros.reshape(n, m), precisao_hll)).astype(np.int64)
+    return resultado
+
+
+def erro_padrao_hll(precisao):
+    """Erro padrão relativo do HyperLogLog com 2^precisao registros."""
+    return 1.04 / (1 << precisao) ** 0.5
+
+
+def contar_direto(df, df_form, coluna, desde=None, ate=None, membros=None, por_membro=False):
+    """Mesmas contagens relendo os itens da Fact — a referência para --verificar."""
+    import pandas as pd
+    from contagens import COL_ACEITE
+
+    datas = pd.to_datetime(df["DataAprovacao1OS"]).dt.normalize()
+    filtro = df["NumeroOS"].notna()
+    if desde:
+        filtro &= datas >= pd.Timestamp(desde)
+    if ate:
+        filtro &= datas <= pd.Timestamp(ate)
+    if membros:
+        filtro &= df[coluna].astype("string").str.lower().isin([m.lower() for m in membros]).fillna(False)
+    pares = pd.DataFrame({
+        "Membro": df.loc[filtro, coluna].astype("object").to_numpy() if por_membro else "Total",
+        "NumeroOS": df.loc[filtro, "NumeroOS"].astype("int64").to_numpy(),
+    }).drop_duplicates()
+
+    form = set() if df_form is None else set(df_form["NumeroOS"].dropna().astype("int64"))
+    recusadas = set()
+    if df_form is not None and COL_ACEITE in df_form.columns:
+        recusadas = set(df_form.loc[df_form[COL_ACEITE] == "Não", "NumeroOS"].dropna().astype("int64"))
+    pares["com_form"] = pares["NumeroOS"].isin(form)
+    pares["recusa"] = pares["NumeroOS"].isin(recusadas)
+    return pares.groupby("Membro", dropna=False, sort=False).agg(**{
+        "OS distintas": ("NumeroOS", "size"),
+        "OS com formulário": ("com_form", "sum"),
+        "OS recusadas": ("recusa", "sum"),
+    }).reset_index()
+
+
+def _construir(args):
+    from formulario import load_formulario
+    from validar_formularios import load_fact_data, opcoes_fact
+
+    df_fact = load_fact_data(**opcoes_fact(args))
+    df_form = load_formulario(args.excel)
+
+    print("\n🧮 Construindo sketches por dia...")
+    inicio = time.perf_counter()
+    tabelas = construir_sketches(df_fact, df_form, args.hll)
+    decorrido = time.perf_counter() - inicio
+    gravar_sketches(tabelas, {
+        "precisao_hll": args.hll,
+        "formulario": os.path.abspath(args.excel) if args.excel else None,
+        "itens": len(df_fact),
+    })
+    print(f"   ✅ {tabelas['os'].num_rows:,} OS distintas em {decorrido:.1f}s")
+    for dimensao in DIMENSOES_SKETCH:
+        tabela = tabelas[dimensao]
+        print(f"      {dimensao:<10s} {tabela.num_rows:>10,} células (dia × membro), {tabela.nbytes / 1024 ** 2:,.1f} MB")
+    if args.hll:
+        print(f"      HyperLogLog P={args.hll}: erro padrão {erro_padrao_hll(args.hll):.2%}")
+
+
+def _consultar(args):
+    import pandas as pd
+
+    celulas, tabela_os, meta = carregar_sketches(args.dimensao)
+    precisao = (meta or {}).get("precisao_hll")
+    inicio = time.perf_counter()
+    resultado = consultar_sketches(
+        celulas, tabela_os, args.desde, args.ate, args.membro, args.por_membro, args.modo, precisao,
+    )
+    decorrido_ms = (time.perf_counter() - inicio) * 1000
+
+    periodo = f"{args.desde or 'início'} a {args.ate or 'fim'}"
+    print(f"\n  🧮 {args.dimensao}, {periodo}, modo {args.modo}: {len(resultado):,} linhas em {decorrido_ms:.1f} ms")
+    if args.modo == "hll":
+        print(f"     erro padrão relativo {erro_padrao_hll(precisao):.2%} (≈95% dentro de ±{2 * erro_padrao_hll(precisao):.2%})")
+    if args.por_membro:
+        total = consultar_sketches(celulas, tabela_os, args.desde, args.ate, args.membro, False, args.modo, precisao)
+        print(f"     soma por {args.dimensao}: {resultado['OS distintas'].sum():,} | "
+              f"DISTINCTCOUNT do recorte: {total['OS distintas'].iloc[0]:,}")
+    print(resultado.sort_values("OS distintas", ascending=False).head(30).to_string(index=False))
+
+    if args.verificar:
+        from formulario import load_formulario
+        from validar_formularios import load_fact_data, opcoes_fact
+
+        df_fact = load_fact_data(**opcoes_fact(args))
+        df_form = load_formulario((meta or {}).get("formulario"))
+        direto = contar_direto(
+            df_fact, df_form, DIMENSOES_SKETCH[args.dimensao], args.desde, args.ate, args.membro, args.por_membro,
+        )
+        junto = resultado.merge(direto, on="Membro", how="outer", suffixes=("", " (Fact)")).fillna(0)
+        for contagem in CONTAGENS:
+            referencia = junto[f"{contagem} (Fact)"]
+            diferenca = junto[contagem] - referencia
+            if args.modo == "exato":
+                status = "✅" if (diferenca == 0).all() else "❌"
+                print(f"  {status} {contagem}: {int((diferenca != 0).sum())} linhas diferentes da Fact")
+            else:
+                relativo = (diferenca.abs() / referencia.where(referencia > 0)).dropna()
+                maior = relativo.max() if not relativo.empty else 0.0
+                print(f"  📏 {contagem}: erro relativo médio {relativo.mean() if not relativo.empty else 0:.2%}, "
+                      f"máximo {maior:.2%}")
+        with pd.option_context("display.width", 200):
+            print(junto.head(10).to_string(index=False))
+
+
+def main():
+    from validar_formularios import adicionar_argumentos_fact
+
+    parser = argparse.ArgumentParser(description="DISTINCTCOUNT de OS por período a partir de sketches diários")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    construir = sub.add_parser("construir", help="Monta os sketches a partir da Fact e do formulário")
+    construir.add_argument("--excel", type=str, default=None, help='Caminho do "Projeto Preço Parceiro.xlsx"')
+    construir.add_argument("--hll", type=int, default=None, choices=range(4, 17), metavar="P",
+                           help="Também grava HyperLogLog com 2^P registros (ex.: 12)")
+    adicionar_argumentos_fact(construir)
+
+    consulta = sub.add_parser("consultar", help="Contagens de um período e conjunto de membros")
+    consulta.add_argument("--dimensao", choices=list(DIMENSOES_SKETCH), default="cliente")
+    consulta.add_argument("--desde", type=str, default=None, help="Primeiro dia (yyyy-mm-dd)")
+    consulta.add_argument("--ate", type=str, default=None, help="Último dia (yyyy-mm-dd)")
+    consulta.add_argument("--membro", action="append", help="Cliente/aprovador (repetível; padrão: todos)")
+    consulta.add_argument("--por-membro", action="store_true", help="Uma linha por cliente/aprovador")
+    consulta.add_argument("--modo", choices=["exato", "hll"], default="exato")
+    consulta.add_argument("--verificar", action="store_true", help="Confere com as contagens relendo a Fact")
+    adicionar_argumentos_fact(consulta, filtros=False)
+    args = parser.parse_args()
+
+    if args.comando == "construir":
+        _construir(args)
+    else:
+        _consultar(args)
+
+
+if __name__ == "__main__":
+    main()
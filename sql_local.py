@@ -0,0 +1,538 @@
+"""
+Motor SQL local (DuckDB) sobre fixtures Parquet das tabelas gold.
+
+Executa as mesmas queries do warehouse — QUERY_FACT e variantes de
+consultas.py, e as queries das partições RelacaoClienteAprovador e
+FactAprovacoesAposPrecoParceiro do modelo TMDL — sem Databricks, sobre um
+diretório com um <tabela>.parquet por tabela gold (fact_maintenanceitems,
+fact_maintenanceservices, dim_webusers, Dim_MaintenanceParameterLogValue...).
+
+As construções do Spark SQL que o DuckDB não aceita são traduzidas:
+  LATERAL VIEW explode(arr) t AS c  →  CROSS JOIN UNNEST(arr) AS t(c)
+  filter(arr, x -> ...)             →  list_filter(arr, lambda x: ...)
+  array_distinct / split            →  list_distinct / regexp_split_to_array
+  regexp_replace (todas as ocorrências), date_format (padrão Java), escapes '\\\\'
+  bind parameters :nome             →  $nome
+
+A conexão imita a do databricks-sql-connector (cursor().execute(),
+execute_async()/cancel() e fetchmany_arrow()), então extracao.fetch_arrow, o cache e a extração em
+fatias funcionam sem mudança: basta --sql-local DIR nos scripts.
+
+Uso:
+  python sql_local.py fixtures --linhas 1000000         # fixtures sintéticas (dados_sinteticos.py)
+  python sql_local.py executar fact --repeticoes 3      # cronometra a QUERY_FACT
+  python sql_local.py executar --sql variante.sql       # cronometra uma variante
+  python sql_local.py traduzir relacao                  # mostra o SQL traduzido
+  python validar_formularios.py --sql-local ~/.cache/painel-preco-parceiro/fixtures
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+PREFIXO_HTTP_PATH = "local:"
+
+# padrão Java (date_format do Spark) → strftime
+_FORMATOS_DATA = [("yyyy", "%Y"), ("MM", "%m"), ("dd", "%d"), ("HH", "%H"), ("mm", "%M"), ("ss", "%S")]
+
+
+def diretorio_padrao():
+    from cache_snapshot import DIRETORIO_CACHE
+
+    return os.path.join(DIRETORIO_CACHE, "fixtures")
+
+
+def http_path_local(diretorio):
+    """Identifica o motor local na chave do snapshot, para não misturar com o warehouse."""
+    return PREFIXO_HTTP_PATH + os.path.abspath(diretorio or diretorio_padrao())
+
+
+# ============================================================
+# Tradução Spark SQL → DuckDB
+# ============================================================
+def _fim_chamada(sql, abre):
+    """Posição do ')' que fecha o '(' em `abre`, ignorando parênteses em literais."""
+    nivel = 0
+    i = abre
+    while i < len(sql):
+        c = sql[i]
+        if c == "'":
+            i = sql.index("'", i + 1)
+        elif c == "(":
+            nivel += 1
+        elif c == ")":
+            nivel -= 1
+            if nivel == 0:
+                return i
+        i += 1
+    raise ValueError(f"Parêntese sem fechamento na posição {abre}")
+
+
+def _argumentos(texto):
+    """Separa os argumentos de uma chamada pelas vírgulas do nível de fora."""
+    partes, nivel, inicio, i = [], 0, 0, 0
+    while i < len(texto):
+        c = texto[i]
+        if c == "'":
+            i = texto.index("'", i + 1)
+        elif c == "(":
+            nivel += 1
+        elif c == ")":
+            nivel -= 1
+        elif c == "," and nivel == 0:
+            partes.append(texto[inicio:i].strip())
+            inicio = i + 1
+        i += 1
+    partes.append(texto[inicio:].strip())
+    return partes
+
+
+def _reescrever_chamadas(sql, nome, reescrever):
+    """Troca cada nome(args) por reescrever(args); chamadas aninhadas também são tratadas."""
+    padrao = re.compile(rf"\b{nome}\s*\(", re.IGNORECASE)
+    saida = []
+    pos = 0
+    while True:
+        m = padrao.search(sql, pos)
+        if not m:
+            saida.append(sql[pos:])
+            return "".join(saida)
+        abre = m.end() - 1
+        fecha = _fim_chamada(sql, abre)
+        args = [_reescrever_chamadas(a, nome, reescrever) for a in _argumentos(sql[abre + 1:fecha])]
+        saida.append(sql[pos:m.start()])
+        saida.append(reescrever(args))
+        pos = fecha + 1
+
+
+def _lambda(args):
+    corpo = re.sub(r"^(\w+)\s*->\s*", r"lambda \1: ", args[1])
+    return f"list_filter({args[0]}, {corpo})"
+
+
+def _regexp_replace(args):
+    if len(args) == 3:
+        args = args + ["'g'"]
+    return f"regexp_replace({', '.join(args)})"
+
+
+def _date_format(args):
+    formato = args[1]
+    for java, strf in _FORMATOS_DATA:
+        formato = formato.replace(java, strf)
+    return f"strftime({args[0]}, {formato})"
+
+
+def traduzir(sql):
+    """Reescreve uma query do Spark SQL (Databricks) no dialeto do DuckDB."""
+    # literais: o Spark interpreta '\\' como escape; o DuckDB não
+    sql = re.sub(r"'(?:[^'\\]|\\.)*'", lambda m: re.sub(r"\\(.)", r"\1", m.group(0)), sql)
+    sql = re.sub(r"\bhive_metastore\.gold\.", "gold.", sql, flags=re.IGNORECASE)
+    sql = re.sub(
+        r"LATERAL\s+VIEW\s+explode\s*\((\w+)\)\s+(\w+)\s+AS\s+(\w+)",
+        r"CROSS JOIN UNNEST(\1) AS \2(\3)",
+        sql,
+        flags=re.IGNORECASE,
+    )
+    sql = _reescrever_chamadas(sql, "filter", _lambda)
+    sql = _reescrever_chamadas(sql, "array_distinct", lambda a: f"list_distinct({a[0]})")
+    sql = _reescrever_chamadas(sql, "split", lambda a: f"regexp_split_to_array({', '.join(a)})")
+    # regexp_replace do Spark troca todas as ocorrências; no DuckDB, só com a opção 'g'
+    sql = _reescrever_chamadas(sql, "regexp_replace", _regexp_replace)
+    sql = _reescrever_chamadas(sql, "date_format", _date_format)
+    # bind parameters nomeados: :nome no Spark, $nome no DuckDB (fora dos literais)
+    sql = re.sub(r"('(?:[^']|'')*')|(?<![:\w]):([A-Za-z_]\w*)", lambda m: m.group(1) or "$" + m.group(2), sql)
+    return sql
+
+
+def consultas_disponiveis():
+    """Nome → SQL das queries que o motor local sabe executar."""
+    from consultas import (
+        QUERY_FACT, QUERY_FACT_AGREGADA, QUERY_ITENS_SEM_FILTRO_APROVADOR, QUERY_LOGS_APROVADORES,
+    )
+    from tmdl import consulta_tmdl
+
+    return {
+        "fact": QUERY_FACT,
+        "agregada": QUERY_FACT_AGREGADA,
+        "itens_sem_aprovador": QUERY_ITENS_SEM_FILTRO_APROVADOR,
+        "logs_aprovadores": QUERY_LOGS_APROVADORES,
+        "relacao": lambda: consulta_tmdl("RelacaoClienteAprovador"),
+        "apos": lambda: consulta_tmdl("FactAprovacoesAposPrecoParceiro"),
+        "calendario": lambda: consulta_tmdl("DimCalendario"),
+    }
+
+
+# ============================================================
+# Conexão no formato do databricks-sql-connector
+# ============================================================
+class CursorLocal:
+    def __init__(self, conn):
+        # pyarrow é carregado aqui e não no primeiro fetchmany_arrow: o import
+        # cairia no tempo de transferência da primeira partição
+        import pyarrow  # noqa: F401
+
+        self._conn = conn
+        self._leitor = None
+        self._execucao = None
+
+    def execute(self, query, parameters=None):
+        self._leitor = None
+        self._conn.execute(traduzir(query), parameters or None)
+
+    def execute_async(self, query, parameters=None):
+        """Como no conector: submete e volta; o DuckDB executa em outra thread."""
+        estado = {"erro": None}
+
+        def rodar():
+            try:
+                self.execute(query, parameters)
+            except Exception as e:
+                estado["erro"] = e
+
+        estado["thread"] = threading.Thread(target=rodar, name="duckdb", daemon=True)
+        estado["thread"].start()
+        self._execucao = estado
+
+    def is_query_pending(self):
+        return self._execucao is not None and self._execucao["thread"].is_alive()
+
+    def get_async_execution_result(self):
+        estado, self._execucao = self._execucao, None
+        estado["thread"].join()
+        if estado["erro"] is not None:
+            raise estado["erro"]
+
+    def cancel(self):
+        self._conn.interrupt()
+        if self._execucao is not None:
+            self._execucao["thread"].join()
+            self._execucao = None
+
+    def fetchmany_arrow(self, tamanho):
+        import pyarrow as pa
+
+        if self._leitor is None:
+            self._leitor = self._conn.to_arrow_reader(tamanho)
+        try:
+            return pa.Table.from_batches([self._leitor.read_next_batch()])
+        except StopIteration:
+            # schema.empty_table() importa o pandas (~0,3 s no primeiro fim de leitura)
+            return pa.Table.from_batches([], schema=self._leitor.schema)
+
+    def fetchall_arrow(self):
+        return self._conn.fetch_arrow_table()
+
+    def close(self):
+        self._leitor = None
+        self._conn.close()
+
+
+class ConexaoLocal:
+    """Banco DuckDB em memória com uma view gold.<tabela> por arquivo Parquet."""
+
+    def __init__(self, diretorio):
+        import duckdb
+
+        if not os.path.isdir(diretorio):
+            raise FileNotFoundError(
+                f"Sem fixtures em {diretorio}. Gere com: python sql_local.py fixtures --diretorio {diretorio}"
+            )
+        self.diretorio = diretorio
+        self._db = duckdb.connect()
+        self._db.execute("CREATE SCHEMA gold")
+        for arquivo in sorted(os.listdir(diretorio)):
+            nome, ext = os.path.splitext(arquivo)
+            if ext == ".parquet":
+                caminho = os.path.join(diretorio, arquivo).replace("'", "''")
+                self._db.execute(f"CREATE VIEW gold.{nome} AS SELECT * FROM read_parquet('{caminho}')")
+
+    def cursor(self):
+        return CursorLocal(self._db.cursor())
+
+    def explicar(self, query):
+        """Plano de execução com tempos por operador (EXPLAIN ANALYZE)."""
+        return self._db.execute("EXPLAIN ANALYZE " + traduzir(query)).fetchall()[0][1]
+
+    def close(self):
+        self._db.close()
+
+
+def conectar_local(diretorio=None):
+    """Abre o motor local (mesma interface de get_databricks_connection)."""
+    diretorio = diretorio or diretorio_padrao()
+    print(f"🦆 Motor SQL local sobre {diretorio}")
+    return ConexaoLocal(diretorio)
+
+
+# ============================================================
+# Fixtures sintéticas das tabelas gold
+# ============================================================
+def _juntar(codigos, rng):
+    separador = "; " if rng.random() < 0.5 else ","
+    return separador.join(codigos)
+
+
+def _logs_aprovadores(df_os, rng, inicio):
+    """
+    Logs do parâmetro 586 por cliente: a maior parte dos aprovadores entra
+    antes do período; alguns saem no meio (e metade volta depois); alguns
+    nunca entram — os itens deles só ficam na Fact se a OS tem preço parceiro.
+    """
+    import numpy as np
+    import pandas as pd
+
+    fim = df_os["DataAprovacao1OS"].max()
+    linhas = []
+    for cliente, grupo in df_os.groupby("CodigoCliente", sort=True):
+        aprovadores = sorted(grupo["CodigoUsuario"].unique())
+        sorteio = rng.random(len(aprovadores))
+        atuais = {a for a, s in zip(aprovadores, sorteio) if s >= 0.1}
+        linhas.append((cliente, inicio - pd.Timedelta(days=30), set(), atuais))
+
+        mudancas = []
+        for aprovador in [a for a, s in zip(aprovadores, sorteio) if 0.1 <= s < 0.25]:
+            saida = inicio + (fim - inicio) * rng.random()
+            mudancas.append((saida, "-", aprovador))
+            if rng.random() < 0.5:
+                mudancas.append((saida + (fim - saida) * rng.random(), "+", aprovador))
+        for ts, sinal, aprovador in sorted(mudancas):
+            depois = atuais - {aprovador} if sinal == "-" else atuais | {aprovador}
+            linhas.append((cliente, ts, atuais, depois))
+            atuais = depois
+
+    ts = pd.to_datetime([l[1] for l in linhas])
+    return pd.DataFrame({
+        "ClientId": np.array([l[0] for l in linhas], dtype=np.int64),
+        "ParameterId": np.where(rng.random(len(linhas)) < 0.95, 586, 585),
+        "ParameterLogOrgValueModificationTimestamp": ts,
+        "OldValueDescription": [_juntar(sorted(l[2]), rng) if l[2] else None for l in linhas],
+        "NewValueDescription": [_juntar(sorted(l[3]), rng) for l in linhas],
+    })
+
+
+def _calendario(inicio, fim):
+    import pandas as pd
+
+    meses = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", "Julho",
+             "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"]
+    dias = pd.date_range(inicio, fim, freq="D")
+    return pd.DataFrame({
+        "ReferenceDate": dias,
+        "ReferenceYear": dias.year,
+        "ReferenceMonth": dias.month,
+        "YearWeek": dias.isocalendar().week.to_numpy(),
+        "YearDay": dias.dayofyear,
+        "MonthNamePt": [meses[m - 1] for m in dias.month],
+        "IsTodayOrBefore": dias <= pd.Timestamp.today(),
+    })
+
+
+def gerar_fixtures(diretorio=None, linhas=100_000, semente=42):
+    """
+    Grava em `diretorio` as tabelas gold que as queries leem, derivadas da Fact
+    sintética de dados_sinteticos.py, com itens que os filtros devem excluir
+    (cancelados, reprovados, guincho e aprovador inativo).
+    """
+    import numpy as np
+    import pandas as pd
+    from dados_sinteticos import gerar_fact, DATA_INICIAL
+
+    diretorio = diretorio or diretorio_padrao()
+    os.makedirs(diretorio, exist_ok=True)
+    rng = np.random.default_rng(semente)
+
+    df = gerar_fact(linhas, semente=semente).to_pandas()
+    df_os = df.groupby("NumeroOS", sort=True).first().reset_index()
+    n_os = len(df_os)
+
+    clientes = df_os[["CodigoCliente", "NomeCliente"]].drop_duplicates("CodigoCliente")
+    merchants = df_os[["NomeEC", "TipoEC", "UFEC"]].drop_duplicates("NomeEC").reset_index(drop=True)
+    merchants["Sk_MaintenanceMerchant"] = np.arange(1, len(merchants) + 1)
+    sk_merchant = dict(zip(merchants["NomeEC"], merchants["Sk_MaintenanceMerchant"]))
+    usuarios = df_os[["CodigoUsuario", "NomeUsuario"]].drop_duplicates("CodigoUsuario")
+
+    tabelas = {
+        "dim_fuelcustomers": pd.DataFrame({
+            "Sk_FuelCustomer": clientes["CodigoCliente"].to_numpy(),
+            "CustomerSourceCode": clientes["CodigoCliente"].to_numpy(),
+            "CustomerShortName": clientes["NomeCliente"].to_numpy(),
+        }),
+        "dim_maintenancevehicles": pd.DataFrame({
+            "Sk_MaintenanceVehicle": clientes["CodigoCliente"].to_numpy(),
+            "CustomerId": clientes["CodigoCliente"].to_numpy(),
+            "MaintenanceVehicleModelId": rng.integers(1, 200, len(clientes)),
+            "AdditionalInformation2Description": None,
+        }),
+        "dim_maintenancemerchants": pd.DataFrame({
+            "Sk_MaintenanceMerchant": merchants["Sk_MaintenanceMerchant"],
+            "MerchantShortenedName": merchants["NomeEC"],
+            "NameMerchantsTypes": merchants["TipoEC"],
+            "StateName": merchants["UFEC"],
+            "SourceNumber": merchants["Sk_MaintenanceMerchant"] + 900_000,
+            "CityName": "Cidade " + merchants["UFEC"].astype(str),
+        }),
+        "dim_webusers": pd.DataFrame({
+            "WebUserSourceCode": usuarios["CodigoUsuario"].to_numpy(),
+            "WebUserName": usuarios["NomeUsuario"].to_numpy(),
+        }),
+        "dim_maintenancetypes": pd.DataFrame({
+            "Sk_MaintenanceType": [1, 2, 3],
+            "MaintenanceType": ["Corretiva", "Preventiva", "Sinistro"],
+        }),
+        "dim_maintenanceitemmanufacturers": pd.DataFrame({
+            "Sk_ServiceItemManufacturer": np.arange(1, 21),
+            "PartManufacturerName": [f"Fabricante {i:02d}" for i in range(1, 21)],
+        }),
+        "dim_maintenanceparts": pd.DataFrame({
+            "Sk_MaintenancePart": np.arange(1, 501),
+            "PartName": [f"Peça {i:03d}" for i in range(1, 501)],
+        }),
+        "dim_maintenancecomplements": pd.DataFrame({
+            "Sk_MaintenanceComplement": np.arange(1, 51),
+            "ComplementDescription": [f"Complemento {i:02d}" for i in range(1, 51)],
+        }),
+        "dim_dates": _calendario(pd.Timestamp("2025-01-01"), pd.Timestamp.today().normalize() + pd.Timedelta(days=365)),
+        "dim_maintenancelabors": pd.DataFrame({
+            "Sk_MaintenanceLabor": np.arange(1, 11),
+            "LaborName": ["GUINCHO PLATAFORMA"] + [f"Mão de obra {i:02d}" for i in range(2, 11)],
+        }),
+    }
+
+    valor_os = df.groupby("NumeroOS", sort=True)["ValorTotalPeca"].sum().to_numpy()
+    aprovacao = df_os["DataAprovacao1OS"] + pd.to_timedelta(rng.integers(0, 3600, n_os), unit="s")
+    tabelas["fact_maintenanceservices"] = pd.DataFrame({
+        "OrderServiceCode": df_os["NumeroOS"],
+        "FirstApprovalTimestamp": df_os["DataAprovacao1OS"],
+        "ApprovalTimestamp": aprovacao,
+        "Sk_MaintenanceType": rng.choice([1, 2, 3], size=n_os, p=[0.7, 0.25, 0.05]),
+        "Sk_MaintenanceMerchant": df_os["NomeEC"].map(sk_merchant).to_numpy(),
+        "Sk_MaintenanceVehicle": df_os["CodigoCliente"],
+        "Sk_FuelCustomer": df_os["CodigoCliente"],
+        "FirstApproverCode": df_os["CodigoUsuario"],
+        "PartValue": np.round(valor_os, 2),
+        "LaborValue": np.round(rng.lognormal(4.0, 0.8, n_os), 2),
+        "IsAutomaticApproval": rng.random(n_os) < 0.2,
+    })
+
+    # o cliente do item vem da OS; itens a mais que os filtros da Fact devem descartar
+    n = len(df)
+    excluir = rng.random(n)
+    cancelado = excluir < 0.02
+    reprovado = (excluir >= 0.02) & (excluir < 0.03)
+    guincho = (excluir >= 0.03) & (excluir < 0.04)
+    fora_filtro = pd.Series(df["DataAprovacao1OS"].to_numpy() + np.timedelta64(1, "D"))
+    negociado = df["ValorUnitarioNegociado"].to_numpy()
+    do_cliente = rng.random(n) < 0.5
+    com_pp = df["InfoPrecoParceiro"].notna().to_numpy()
+    id_neg = np.where(com_pp, np.arange(1, n + 1) + 50_000_000, np.nan)
+    tabelas["fact_maintenanceitems"] = pd.DataFrame({
+        "Sk_MaintenanceItem": df["ChaveItem"],
+        "MaintenanceId": df["NumeroOS"],
+        "MaintenanceItemSourceCode": df["ChaveItem"] + 10_000_000,
+        "PartQuantity": df["QuantidadePeca"],
+        "PartUnitaryPrice": df["ValorUnitarioPeca"],
+        "PartPriceNegociatedCustomer": np.where(do_cliente, negociado, np.nan),
+        "PartPriceNegociated": np.where(do_cliente, np.nan, negociado),
+        "PartPriceReferenceCustomer": np.nan,
+        "PartReferencePrice": df["ValorUnitarioReferencial"],
+        "PartPriceApproved": df["ValorTotalPeca"],
+        "PartPriceNegociatedId": pd.array(np.where(do_cliente, np.nan, id_neg), dtype="Int64"),
+        "PartPriceNegociatedCustomerId": pd.array(np.where(do_cliente, id_neg, np.nan), dtype="Int64"),
+        "ApprovalTimestamp": df["DataAprovacao1OS"],
+        "CancellationTimestamp": fora_filtro.where(cancelado),
+        "ItemDisapprovalTimestamp": fora_filtro.where(reprovado),
+        "Sk_ServiceItemManufacturer": rng.integers(1, 21, n),
+        "Sk_MaintenanceLabor": np.where(guincho, 1, rng.integers(2, 11, n)),
+        "Sk_MaintenancePart": rng.integers(1, 501, n),
+        "Sk_MaintenanceComplement": rng.integers(1, 51, n),
+    })
+
+    pp = df[com_pp]
+    tabelas["dim_maintenancelogpriceregulatorpartner"] = pd.DataFrame({
+        "Sk_PriceRegulatorPartner": np.arange(1, len(pp) + 1),
+        "OrderServiceItemId": pp["ChaveItem"].to_numpy() + 10_000_000,
+        "OrderServiceId": pp["NumeroOS"].to_numpy(),
+        "PricePartReferencePriceNegId": id_neg[com_pp].astype(np.int64),
+        "SendDate": pp["DataEnvioNegociacaoPrecoParceiro"].to_numpy(),
+        "PricePartInfo": pp["InfoPrecoParceiro"].to_numpy(),
+    })
+    tabelas["Dim_MaintenanceParameterLogValue"] = _logs_aprovadores(
+        df_os, rng, pd.Timestamp(DATA_INICIAL)
+    )
+
+    for nome, tabela in tabelas.items():
+        tabela.to_parquet(os.path.join(diretorio, f"{nome}.parquet"), index=False)
+    print(f"💾 {len(tabelas)} tabelas gold ({n:,} itens, {n_os:,} OS) em {diretorio}")
+    return diretorio
+
+
+# ============================================================
+# CLI
+# ============================================================
+def _sql_pedido(args):
+    if args.sql:
+        with open(args.sql, encoding="utf-8") as f:
+            return f.read()
+    consulta = consultas_disponiveis()[args.consulta]
+    return consulta() if callable(consulta) else consulta
+
+
+def executar(args):
+    from statistics import median
+    from extracao import fetch_arrow
+
+    query = _sql_pedido(args)
+    conn = conectar_local(args.diretorio)
+    try:
+        if args.explicar:
+            print(conn.explicar(query))
+        tempos = []
+        for i in range(args.repeticoes):
+            inicio = time.perf_counter()
+            tabela = fetch_arrow(conn, query, progresso=False)
+            tempos.append(time.perf_counter() - inicio)
+            print(f"   ⏱️  Execução {i + 1}: {tempos[-1]:.2f}s")
+    finally:
+        conn.close()
+
+    print(f"\n  ✅ {tabela.num_rows:,} linhas, {tabela.num_columns} colunas ({tabela.nbytes / 1024 ** 2:,.1f} MB)")
+    print(f"     Tempo: mín {min(tempos):.2f}s | mediana {median(tempos):.2f}s")
+    print(tabela.slice(0, 5).to_pandas().to_string())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Motor SQL local (DuckDB) sobre fixtures Parquet das tabelas gold")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    fixtures = sub.add_parser("fixtures", help="Gera fixtures sintéticas das tabelas gold")
+    fixtures.add_argument("--diretorio", default=None, help="Destino (padrão: <cache>/fixtures)")
+    fixtures.add_argument("--linhas", type=int, default=100_000, help="Itens de manutenção (padrão: 100000)")
+    fixtures.add_argument("--semente", type=int, default=42)
+
+    nomes = sorted(consultas_disponiveis())
+    for nome, ajuda in (("executar", "Executa e cronometra uma query"), ("traduzir", "Mostra o SQL traduzido")):
+        p = sub.add_parser(nome, help=ajuda)
+        p.add_argument("consulta", nargs="?", default="fact", choices=nomes, help="Query conhecida (padrão: fact)")
+        p.add_argument("--sql", default=None, help="Arquivo .sql (dialeto Spark) no lugar de uma query conhecida")
+        p.add_argument("--diretorio", default=None, help="Fixtures (padrão: <cache>/fixtures)")
+    executar_p = sub.choices["executar"]
+    executar_p.add_argument("--repeticoes", type=int, default=1)
+    executar_p.add_argument("--explicar", action="store_true", help="Mostra o plano com tempos (EXPLAIN ANALYZE)")
+    args = parser.parse_args()
+
+    if args.comando == "fixtures":
+        gerar_fixtures(args.diretorio, args.linhas, args.semente)
+    elif args.comando == "traduzir":
+        print(traduzir(_sql_pedido(args)))
+    else:
+        executar(args)
+
+
+if __name__ == "__main__":
+    main()
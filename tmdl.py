@@ -0,0 +1,160 @@
+"""
+Leitura das queries SQL embutidas no modelo semântico (TMDL).
+
+As partições de importação trazem o SQL do warehouse como strings M dentro
+de Azure("..."): aspas duplicadas ("") e quebras como #(lf). Aqui cada passo
+Azure(...) de cada partição é extraído e desescapado, pronto para executar
+(ver perfil_refresh.py e sql_local.py).
+
+Também lê relationships.tmdl e roles/*.tmdl (filtros de RLS, ver rls.py).
+
+Uso:
+  from tmdl import consultas_azure, consulta_tmdl
+  for consulta in consultas_azure():
+      print(consulta["tabela"], consulta["passo"], len(consulta["sql"]))
+  sql = consulta_tmdl("RelacaoClienteAprovador")
+  for role in roles():
+      print(role["role"], role["filtros"])
+"""
+
+import os
+import re
+import textwrap
+
+PASTA_MODELO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Painel Preço Parceiro.SemanticModel")
+
+_ESCAPES_M = (("#(lf)", "\n"), ("#(cr)", "\r"), ("#(tab)", "\t"), ("#(#)", "#"))
+_PARTICAO = re.compile(r"^\tpartition\s+('(?:[^']|'')+'|\S+)\s*=\s*(\w+)", re.MULTILINE)
+_PASSO_AZURE = re.compile(r'^\s*(#"(?:[^"]|"")+"|[\w.]+)\s*=\s*Azure\("((?:[^"]|"")*)"\)', re.MULTILINE)
+_BLOCO = re.compile(r"^(relationship|role)\s+(.+?)\s*$", re.MULTILINE)
+_PROPRIEDADE = re.compile(r"^\t(\w+):\s*(.+?)\s*$", re.MULTILINE)
+_PERMISSAO = re.compile(r"^\ttablePermission\s+('(?:[^']|'')+'|[^\s=]+)\s*(?:=\s*(.+?))?\s*$", re.MULTILINE)
+_COLUNA = re.compile(r"^('(?:[^']|'')+'|[^.]+)\.(.+)$")
+
+
+def desescapar_m(texto):
+    """Conteúdo de um literal de texto M → texto puro."""
+    texto = texto.replace('""', '"')
+    for escape, char in _ESCAPES_M:
+        texto = texto.replace(escape, char)
+    # strings multilinha herdam a indentação do bloco source = ```...```
+    return textwrap.dedent(texto).strip("\n")
+
+
+def _nome(bruto):
+    if bruto.startswith("#\""):
+        return bruto[2:-1].replace('""', '"')
+    if bruto.startswith("'"):
+        return bruto[1:-1].replace("''", "'")
+    return bruto
+
+
+def particoes(pasta_modelo=PASTA_MODELO):
+    """
+    Partições de todas as tabelas do modelo, em ordem de arquivo:
+    {"tabela", "particao", "tipo" (m, calculated...), "arquivo", "consultas": [{"passo", "sql"}]}.
+    """
+    pasta = os.path.join(pasta_modelo, "definition", "tables")
+    resultado = []
+    for arquivo in sorted(os.listdir(pasta)):
+        if not arquivo.endswith(".tmdl"):
+            continue
+        caminho = os.path.join(pasta, arquivo)
+        with open(caminho, encoding="utf-8") as f:
+            texto = f.read()
+        tabela = os.path.splitext(arquivo)[0]
+        marcas = list(_PARTICAO.finditer(texto))
+        for i, marca in enumerate(marcas):
+            fim = marcas[i + 1].start() if i + 1 < len(marcas) else len(texto)
+            resultado.append({
+                "tabela": tabela,
+                "particao": _nome(marca.group(1)),
+                "tipo": marca.group(2),
+                "arquivo": caminho,
+                "consultas": [
+                    {"passo": _nome(p.group(1)), "sql": desescapar_m(p.group(2))}
+                    for p in _PASSO_AZURE.finditer(texto, marca.end(), fim)
+                ],
+            })
+    return resultado
+
+
+def consultas_azure(pasta_modelo=PASTA_MODELO):
+    """Uma entrada por passo Azure(...): {"tabela", "particao", "passo", "sql"}."""
+    return [
+        {"tabela": p["tabela"], "particao": p["particao"], "passo": c["passo"], "sql": c["sql"]}
+        for p in particoes(pasta_modelo)
+        for c in p["consultas"]
+    ]
+
+
+def consulta_tmdl(tabela, passo="Fonte", pasta_modelo=PASTA_MODELO):
+    """SQL do passo `passo` = Azure("...") da partição de uma tabela do modelo."""
+    for consulta in consultas_azure(pasta_modelo):
+        if consulta["tabela"] == tabela and consulta["passo"] == passo:
+            return consulta["sql"]
+    raise ValueError(f"{tabela}.tmdl não tem um passo {passo} = Azure(\"...\")")
+
+
+def _blocos(texto, tipo):
+    """(nome, corpo) de cada bloco `tipo nome` de um arquivo TMDL."""
+    marcas = [m for m in _BLOCO.finditer(texto) if m.group(1) == tipo]
+    for i, marca in enumerate(marcas):
+        fim = marcas[i + 1].start() if i + 1 < len(marcas) else len(texto)
+        yield _nome(marca.group(2)), texto[marca.end():fim]
+
+
+def _coluna(referencia):
+    """'Tabela.Coluna' (com ou sem aspas simples) → (tabela, coluna)."""
+    tabela, coluna = _COLUNA.match(referencia).groups()
+    return _nome(tabela), _nome(coluna)
+
+
+def relacionamentos(pasta_modelo=PASTA_MODELO):
+    """
+    Relacionamentos de relationships.tmdl:
+    {"id", "de_tabela", "de_coluna" (lado muitos), "para_tabela", "para_coluna" (lado um),
+     "ativo", "direcao" (crossFilteringBehavior: oneDirection/bothDirections)}.
+    """
+    with open(os.path.join(pasta_modelo, "definition", "relationships.tmdl"), encoding="utf-8") as f:
+        texto = f.read()
+    resultado = []
+    for nome, corpo in _blocos(texto, "relationship"):
+        propriedades = dict(_PROPRIEDADE.findall(corpo))
+        de_tabela, de_coluna = _coluna(propriedades["fromColumn"])
+        para_tabela, para_coluna = _coluna(propriedades["toColumn"])
+        resultado.append({
+            "id": nome,
+            "de_tabela": de_tabela,
+            "de_coluna": de_coluna,
+            "para_tabela": para_tabela,
+            "para_coluna": para_coluna,
+            "ativo": propriedades.get("isActive", "true") != "false",
+            "direcao": propriedades.get("crossFilteringBehavior", "oneDirection"),
+        })
+    return resultado
+
+
+def roles(pasta_modelo=PASTA_MODELO):
+    """
+    Roles de RLS de roles/*.tmdl: {"role", "arquivo", "filtros": {tabela: expressão DAX}}.
+
+    tablePermission sem expressão não filtra e fica de fora de "filtros".
+    """
+    pasta = os.path.join(pasta_modelo, "definition", "roles")
+    resultado = []
+    if not os.path.isdir(pasta):
+        return resultado
+    for arquivo in sorted(os.listdir(pasta)):
+        if not arquivo.endswith(".tmdl"):
+            continue
+        caminho = os.path.join(pasta, arquivo)
+        with open(caminho, encoding="utf-8") as f:
+            texto = f.read()
+        for nome, corpo in _blocos(texto, "role"):
+            resultado.append({
+                "role": nome,
+                "arquivo": caminho,
+                "filtros": {_nome(p.group(1)): p.group(2) for p in _PERMISSAO.finditer(corpo) if p.group(2)},
+            })
+    return resultado
@@ -0,0 +1,202 @@
+"""
+Passos M da partição FactAprovacaoPrecoParceiro portados para Arrow (vetorizados).
+
+Depois do SQL, o Power Query deriva as colunas de preço parceiro linha a linha:
+  Text.BetweenDelimiters(InfoPrecoParceiro, '"valornegociar" : ', ",")
+      → "." vira "," → Currency.Type        = ValorUnitarioNegociadoPrecoParceiro
+  Text.BetweenDelimiters(InfoPrecoParceiro, '"tempovigenciameses" : ', ",")
+      → Int64.Type                          = ValidadeNegociacaoMeses
+  QuantidadePeca × ValorUnitarioNegociadoPrecoParceiro → Currency.Type
+                                            = ValorTotalNegociadoPrecoParceiro
+  ValorUnitarioNegociadoPrecoParceiro − ValorUnitarioHierarquiaReferencial
+                                            = DiferencaValorUnitarioReferencialXNeggociado
+
+Aqui os mesmos passos rodam sobre a coluna inteira (pyarrow.compute), com a
+semântica do M, não a de um parser JSON:
+  - chave ausente ou InfoPrecoParceiro nulo → nulo;
+  - sem "," depois da chave (última chave do objeto), o texto vai até o fim
+    e a conversão falha (ex.: "7.25}") → nulo, como o erro de célula do M;
+  - valor entre aspas ("12.5") também não converte → nulo;
+  - Currency.Type arredonda em 4 casas (metade para o par).
+Um json.loads daria valores nesses casos — o painel não. Para achar esses
+payloads, `python transformacoes.py` compara as duas leituras.
+
+As conversões de DataAprovacao1OS (date) e CodigoCliente (text) do M não são
+repetidas: os scripts usam as colunas com os tipos do warehouse.
+
+Uso:
+  from transformacoes import derivar_preco_parceiro
+  tabela = derivar_preco_parceiro(tabela)   # pyarrow.Table da QUERY_FACT
+
+  python transformacoes.py --offline        # confere a regra do M com json.loads no snapshot
+"""
+
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+CHAVE_VALOR = "valornegociar"
+CHAVE_VIGENCIA = "tempovigenciameses"
+CASAS_CURRENCY = 4
+
+# número que o Currency.Type aceita depois de trocar "." por "," (cultura pt-BR)
+_NUMERO = r"^\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?\s*$"
+_INTEIRO = r"^\s*[+-]?\d+\s*$"
+
+
+def _entre_delimitadores(info, chave):
+    """Text.BetweenDelimiters: texto da primeira ocorrência de '"chave" : ' até a vírgula seguinte."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if not pa.types.is_string(info.type) and not pa.types.is_large_string(info.type):
+        info = pc.cast(info, pa.string())
+    trecho = pc.extract_regex(info, rf'"{chave}" : (?P<v>[^,]*)')
+    return pc.struct_field(trecho, [0])
+
+
+def _converter(texto, padrao, tipo):
+    """Conversão de tipo do M: texto que não é número vira nulo (erro de célula)."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    valido = pc.fill_null(pc.match_substring_regex(texto, padrao), False)
+    limpo = pc.if_else(valido, pc.utf8_trim_whitespace(texto), pa.scalar(None, pa.string()))
+    return pc.cast(limpo, tipo)
+
+
+def valor_unitario_preco_parceiro(info):
+    """ValorUnitarioNegociadoPrecoParceiro (float64, 4 casas) a partir de InfoPrecoParceiro."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    valor = _converter(_entre_delimitadores(info, CHAVE_VALOR), _NUMERO, pa.float64())
+    return pc.round(valor, CASAS_CURRENCY, round_mode="half_to_even")
+
+
+def validade_meses(info):
+    """ValidadeNegociacaoMeses (int64) a partir de InfoPrecoParceiro."""
+    import pyarrow as pa
+
+    return _converter(_entre_delimitadores(info, CHAVE_VIGENCIA), _INTEIRO, pa.int64())
+
+
+def derivar_preco_parceiro(tabela):
+    """
+    Acrescenta à pyarrow.Table as quatro colunas derivadas da partição do modelo.
+
+    Tabelas sem InfoPrecoParceiro (ex.: --pushdown) voltam sem mudança.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from perfil import etapa
+
+    if "InfoPrecoParceiro" not in tabela.column_names:
+        return tabela
+
+    with etapa("transformacoes", linhas=tabela.num_rows):
+        info = tabela["InfoPrecoParceiro"]
+        unitario = valor_unitario_preco_parceiro(info)
+        colunas = {
+            "ValorUnitarioNegociadoPrecoParceiro": unitario,
+            "ValidadeNegociacaoMeses": validade_meses(info),
+        }
+        if "QuantidadePeca" in tabela.column_names:
+            quantidade = pc.cast(tabela["QuantidadePeca"], pa.float64())
+            colunas["ValorTotalNegociadoPrecoParceiro"] = pc.round(
+                pc.multiply(quantidade, unitario), CASAS_CURRENCY, round_mode="half_to_even"
+            )
+        if "ValorUnitarioHierarquiaReferencial" in tabela.column_names:
+            referencial = pc.cast(tabela["ValorUnitarioHierarquiaReferencial"], pa.float64())
+            colunas["DiferencaValorUnitarioReferencialXNeggociado"] = pc.subtract(unitario, referencial)
+
+        for nome, coluna in colunas.items():
+            if nome in tabela.column_names:
+                tabela = tabela.set_column(tabela.column_names.index(nome), nome, coluna)
+            else:
+                tabela = tabela.append_column(nome, coluna)
+    return tabela
+
+
+def divergencias_json(info):
+    """
+    Payloads em que a regra textual do M e um json.loads leem valores diferentes.
+
+    Cada payload distinto é lido uma vez. Devolve DataFrame com o payload, as
+    duas leituras de valornegociar/tempovigenciameses e o nº de linhas.
+    """
+    import json
+    import pandas as pd
+    import pyarrow.compute as pc
+
+    contagem = pc.value_counts(pc.drop_null(info))
+    payloads = contagem.field("values")
+    m_valor = valor_unitario_preco_parceiro(payloads).to_pylist()
+    m_meses = validade_meses(payloads).to_pylist()
+
+    def numero(objeto, chave, conversao):
+        valor = objeto.get(chave) if isinstance(objeto, dict) else None
+        try:
+            return conversao(valor) if valor is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    linhas = []
+    for payload, n, valor, meses in zip(payloads.to_pylist(), contagem.field("counts").to_pylist(), m_valor, m_meses):
+        try:
+            objeto = json.loads(payload)
+            erro = None
+        except ValueError as e:
+            objeto, erro = None, str(e)
+        j_valor = numero(objeto, CHAVE_VALOR, lambda v: round(float(v), CASAS_CURRENCY))
+        j_meses = numero(objeto, CHAVE_VIGENCIA, int)
+        if erro or j_valor != valor or j_meses != meses:
+            linhas.append({
+                "InfoPrecoParceiro": payload,
+                "Linhas": n,
+                "M_valor": valor,
+                "JSON_valor": j_valor,
+                "M_meses": meses,
+                "JSON_meses": j_meses,
+                "ErroJSON": erro,
+            })
+    return pd.DataFrame(linhas, columns=[
+        "InfoPrecoParceiro", "Linhas", "M_valor", "JSON_valor", "M_meses", "JSON_meses", "ErroJSON",
+    ])
+
+
+def main():
+    import pyarrow.compute as pc
+    from consultas import QUERY_FACT
+    from validar_formularios import carregar_tabela, adicionar_argumentos_fact, opcoes_tabela
+
+    parser = argparse.ArgumentParser(description="Confere a leitura de InfoPrecoParceiro (regra do M × JSON)")
+    parser.add_argument("--exemplos", type=int, default=10, help="Payloads divergentes a mostrar (padrão: 10)")
+    adicionar_argumentos_fact(parser, filtros=False)
+    args = parser.parse_args()
+
+    print("\n📊 Carregando FactAprovacaoPrecoParceiro...")
+    tabela = carregar_tabela(QUERY_FACT, **opcoes_tabela(args))
+    tabela = derivar_preco_parceiro(tabela)
+    info = tabela["InfoPrecoParceiro"]
+    preenchidos = len(info) - info.null_count
+    com_valor = len(info) - tabela["ValorUnitarioNegociadoPrecoParceiro"].null_count
+    print(f"   ✅ {len(info):,} itens, {preenchidos:,} com InfoPrecoParceiro, {com_valor:,} com valor negociado")
+    print(f"      ValidadeNegociacaoMeses: {pc.value_counts(tabela['ValidadeNegociacaoMeses']).to_pylist()[:8]}")
+
+    divergentes = divergencias_json(info)
+    if divergentes.empty:
+        print("\n  ✅ Regra do M e json.loads leem os mesmos valores em todos os payloads.")
+        return
+    print(
+        f"\n  ⚠️ {len(divergentes):,} payloads ({divergentes['Linhas'].sum():,} linhas) em que o painel "
+        f"(regra do M) difere de um json.loads:"
+    )
+    exemplos = divergentes.sort_values("Linhas", ascending=False).head(args.exemplos)
+    print(exemplos.to_string(index=False, max_colwidth=70))
+
+
+if __name__ == "__main__":
+    main()
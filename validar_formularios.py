@@ -10,13 +10,27 @@ Dados do formulário: SharePoint Excel (informar caminho local se disponível).
 Uso:
   python validar_formularios.py
   python validar_formularios.py --excel "C:/caminho/para/Projeto Preço Parceiro.xlsx"
+  python validar_formularios.py --refresh     # ignora o snapshot local da Fact
+  python validar_formularios.py --offline     # usa só o snapshot local (sem Databricks)
+  python validar_formularios.py --incremental # snapshot vencido: busca só o que mudou
+  python validar_formularios.py --pushdown    # agrega no Databricks; traz só OS×cliente
+  python validar_formularios.py --paralelo 4  # extrai em fatias mensais, 4 por vez
+  python validar_formularios.py --sql-local   # DuckDB sobre fixtures Parquet (sql_local.py)
+  python validar_formularios.py --assincrono  # Fact em segundo plano enquanto lê a planilha
+  python validar_formularios.py --cliente "Cliente X" --desde 2025-06-01   # filtros no warehouse
+  python validar_formularios.py --watch       # segue a planilha e atualiza as contagens por Id
+  python validar_formularios.py --distintas   # formulário como RespostasFormularioDistintasOS
 """
 
-import os
 import sys
 import argparse
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 
+import perfil
+from perfil import etapa
+
 # ============================================================
 # CONFIG DATABRICKS
 # ============================================================
@@ -29,244 +43,408 @@ def get_databricks_connection():
     """Conecta ao SQL Warehouse via U2M OAuth (databricks-cli profile)."""
     from databricks import sql
     print("🔗 Conectando ao Databricks via CLI profile...")
-    conn = sql.connect(
-        server_hostname=HOST,
-        http_path=HTTP_PATH,
-        auth_type="databricks-cli",
-        profile=PROFILE,
-    )
+    with etapa("conexao"):
+        conn = sql.connect(
+            server_hostname=HOST,
+            http_path=HTTP_PATH,
+            auth_type="databricks-cli",
+            profile=PROFILE,
+        )
     print("   ✅ Conectado!")
     return conn
 
 
+def abrir_conexao(sql_local=None):
+    """
+    Conexão do warehouse ou, com sql_local (diretório de fixtures; "" = padrão),
+    o motor DuckDB local sobre Parquet das tabelas gold (sql_local.py).
+    """
+    if sql_local is None:
+        return get_databricks_connection()
+    from sql_local import conectar_local
+    return conectar_local(sql_local)
+
+
+def http_path_origem(sql_local=None):
+    """HTTP_PATH usado na chave do snapshot: o motor local tem snapshots próprios."""
+    if sql_local is None:
+        return HTTP_PATH
+    from sql_local import http_path_local
+    return http_path_local(sql_local)
+
+
 # ============================================================
 # QUERY: Mesma query da FactAprovacaoPrecoParceiro do Power BI
-# (simplificada para extrair NumeroOS + NomeCliente + NomeEC)
+# (montada em consultas.py, sem as colunas descritivas de peça)
 # ============================================================
-QUERY_FACT = """
-WITH param_logs AS (
-  SELECT
-    dmplv.ClientId AS CodigoCliente,
-    CAST(dmplv.ParameterLogOrgValueModificationTimestamp AS TIMESTAMP) AS ts,
-    COALESCE(dmplv.OldValueDescription, '') AS old_values,
-    COALESCE(dmplv.NewValueDescription, '') AS new_values
-  FROM hive_metastore.gold.Dim_MaintenanceParameterLogValue AS dmplv
-  WHERE dmplv.ParameterId = 586
-),
-sets AS (
-  SELECT
-    CodigoCliente,
-    ts,
-    array_distinct(
-      filter(
-        split(regexp_replace(old_values, '\\\\s+', ''), '[;,]+'),
-        x -> x <> ''
-      )
-    ) AS old_set,
-    array_distinct(
-      filter(
-        split(regexp_replace(new_values, '\\\\s+', ''), '[;,]+'),
-        x -> x <> ''
-      )
-    ) AS new_set
-  FROM param_logs
-),
-adds AS (
-  SELECT CodigoCliente, ts, CAST(approver AS STRING) AS approver
-  FROM sets LATERAL VIEW explode(new_set) ns AS approver
-  WHERE NOT array_contains(old_set, approver)
-),
-removes AS (
-  SELECT CodigoCliente, ts, CAST(approver AS STRING) AS approver
-  FROM sets LATERAL VIEW explode(old_set) os AS approver
-  WHERE NOT array_contains(new_set, approver)
-),
-events AS (
-  SELECT CodigoCliente, approver, ts, 'ADD' AS event_type FROM adds
-  UNION ALL
-  SELECT CodigoCliente, approver, ts, 'REMOVE' AS event_type FROM removes
-),
-ordered_events AS (
-  SELECT
-    CodigoCliente, approver, event_type, ts,
-    LEAD(ts) OVER (PARTITION BY CodigoCliente, approver ORDER BY ts) AS DataFim
-  FROM events
-),
-param_intervals AS (
-  SELECT CodigoCliente, approver AS Aprovador, ts AS DataInicio, DataFim
-  FROM ordered_events WHERE event_type = 'ADD'
-),
-tabela_preco_parceiro AS (
-  SELECT DISTINCT OrderServiceId
-  FROM gold.dim_maintenancelogpriceregulatorpartner
-  WHERE SendDate IS NOT NULL
-)
-
-SELECT
-    fmi.MaintenanceId AS NumeroOS,
-    dfc.CustomerShortName AS NomeCliente,
-    dmm.MerchantShortenedName AS NomeEC,
-    dmm.StateName AS UFEC
-
-FROM hive_metastore.gold.fact_maintenanceitems AS fmi
-
-  LEFT JOIN hive_metastore.gold.fact_maintenanceservices AS fms
-    ON fmi.MaintenanceId = fms.OrderServiceCode
-
-  LEFT JOIN hive_metastore.gold.dim_maintenancetypes AS fmt
-    ON fms.Sk_MaintenanceType = fmt.Sk_MaintenanceType
-
-  LEFT JOIN hive_metastore.gold.dim_maintenancemerchants AS dmm
-    ON fms.Sk_MaintenanceMerchant = dmm.Sk_MaintenanceMerchant
-
-  LEFT JOIN hive_metastore.gold.dim_maintenancevehicles AS dmv
-    ON fms.Sk_MaintenanceVehicle = dmv.Sk_MaintenanceVehicle
-
-  LEFT JOIN hive_metastore.gold.dim_fuelcustomers AS dfc
-    ON fms.Sk_FuelCustomer = dfc.Sk_FuelCustomer
-
-  LEFT JOIN hive_metastore.gold.dim_webusers AS dwu
-    ON fms.FirstApproverCode = dwu.WebUserSourceCode
-
-  LEFT JOIN gold.dim_maintenancelogpriceregulatorpartner AS dmlprp
-    ON fmi.MaintenanceItemSourceCode = dmlprp.OrderServiceItemId
-
-  LEFT JOIN hive_metastore.gold.dim_maintenanceitemmanufacturers AS dmif
-    ON fmi.Sk_ServiceItemManufacturer = dmif.Sk_ServiceItemManufacturer
-
-  LEFT JOIN tabela_preco_parceiro
-    ON fmi.MaintenanceId = tabela_preco_parceiro.OrderServiceId
-
-  LEFT JOIN hive_metastore.gold.dim_maintenancelabors AS dml
-    ON fmi.Sk_MaintenanceLabor = dml.Sk_MaintenanceLabor
-
-WHERE 1=1
-  AND fmi.CancellationTimestamp IS NULL
-  AND fmi.ItemDisapprovalTimestamp IS NULL
-  AND fms.FirstApprovalTimestamp >= TIMESTAMP '2025-04-01'
-  AND (dml.LaborName IS NULL OR dml.LaborName NOT LIKE '%GUINCHO%')
-  AND (
-    tabela_preco_parceiro.OrderServiceId IS NOT NULL
-    OR
-    EXISTS (
-      SELECT 1
-      FROM param_intervals pi
-      WHERE pi.CodigoCliente = dmv.CustomerId
-        AND pi.Aprovador = CAST(dwu.WebUserSourceCode AS STRING)
-        AND fms.FirstApprovalTimestamp >= pi.DataInicio
-        AND (pi.DataFim IS NULL OR fms.FirstApprovalTimestamp < pi.DataFim)
+from consultas import QUERY_FACT  # noqa: E402
+from formulario import load_formulario  # noqa: E402,F401 (reexportado para os outros scripts)
+from filtros_fact import normalizar as normalizar_filtros  # noqa: E402
+
+
+def adicionar_argumentos_fact(parser, filtros=True):
+    """
+    Opções de carga da Fact compartilhadas pelos scripts de auditoria.
+
+    filtros=False omite --desde/--ate/--cliente/--aprovador/--uf (para
+    subcomandos que já usam esses nomes com outro sentido).
+    """
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="Linhas por lote Arrow na leitura da Fact (padrão: 100000)",
+    )
+    parser.add_argument(
+        "--max-memoria-mb",
+        type=int,
+        default=None,
+        help="Teto de memória do resultado da Fact em MB; aborta se ultrapassar (padrão: 4096)",
+    )
+    parser.add_argument(
+        "--ttl-horas",
+        type=float,
+        default=None,
+        help="Validade do snapshot local da Fact em horas (padrão: 12; 0 = sempre vencido)",
+    )
+    modo_cache = parser.add_mutually_exclusive_group()
+    modo_cache.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Ignora o snapshot local e consulta o Databricks de novo",
+    )
+    modo_cache.add_argument(
+        "--offline",
+        action="store_true",
+        help="Não acessa o Databricks; usa o último snapshot local",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Com snapshot vencido, busca só os itens alterados desde o último watermark",
+    )
+    parser.add_argument(
+        "--lookback-dias",
+        type=int,
+        default=None,
+        help="Janela de segurança do modo incremental, em dias (padrão: 7)",
+    )
+    parser.add_argument(
+        "--paralelo",
+        type=int,
+        default=None,
+        help="Extrai a Fact em fatias mensais com N conexões em paralelo (ver extracao_paralela.py)",
+    )
+    parser.add_argument(
+        "--fatia-meses",
+        type=int,
+        default=None,
+        help="Meses por fatia no modo --paralelo (padrão: 1)",
+    )
+    parser.add_argument(
+        "--sql-local",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="DIR",
+        help="Executa as queries no DuckDB sobre fixtures Parquet das tabelas gold (ver sql_local.py)",
+    )
+    if filtros:
+        adicionar_argumentos_filtros(parser)
+
+
+def adicionar_argumentos_filtros(parser):
+    """--desde/--ate/--cliente/--aprovador/--uf (ver filtros_dos_argumentos)."""
+    grupo = parser.add_argument_group("filtros da Fact (bind parameters na query; ver filtros_fact.py)")
+    grupo.add_argument("--desde", dest="filtro_desde", default=None, metavar="AAAA-MM-DD",
+                       help="DataAprovacao1OS a partir deste dia")
+    grupo.add_argument("--ate", dest="filtro_ate", default=None, metavar="AAAA-MM-DD",
+                       help="DataAprovacao1OS até este dia (inclusive)")
+    grupo.add_argument("--cliente", dest="filtro_cliente", action="append", default=None,
+                       help="Nome ou código do cliente (repetível)")
+    grupo.add_argument("--aprovador", dest="filtro_aprovador", action="append", default=None,
+                       help="Nome ou código do aprovador da 1ª aprovação (repetível)")
+    grupo.add_argument("--uf", dest="filtro_uf", action="append", default=None,
+                       help="UF do EC (repetível)")
+
+
+def filtros_dos_argumentos(args):
+    """Filtros normalizados (filtros_fact.normalizar) a partir de adicionar_argumentos_filtros."""
+    return normalizar_filtros(
+        desde=getattr(args, "filtro_desde", None),
+        ate=getattr(args, "filtro_ate", None),
+        cliente=getattr(args, "filtro_cliente", None),
+        aprovador=getattr(args, "filtro_aprovador", None),
+        uf=getattr(args, "filtro_uf", None),
     )
-  )
-"""
 
 
-def load_fact_data(conn):
-    """Carrega os dados da FactAprovacaoPrecoParceiro do Databricks."""
-    import pandas as pd
-    print("\n📊 Carregando FactAprovacaoPrecoParceiro do Databricks...")
-    print("   (isso pode levar alguns minutos)")
-    cursor = conn.cursor()
-    cursor.execute(QUERY_FACT)
-    rows = cursor.fetchall()
-    cols = [desc[0] for desc in cursor.description]
-    df = pd.DataFrame(rows, columns=cols)
-    cursor.close()
-    print(f"   ✅ {len(df):,} linhas carregadas")
+def opcoes_fact(args):
+    """Converte os argumentos de adicionar_argumentos_fact em kwargs de load_fact_data."""
+    return {
+        "batch_size": args.batch_size,
+        "limite_memoria_mb": args.max_memoria_mb,
+        "ttl_horas": args.ttl_horas,
+        "refresh": args.refresh,
+        "offline": args.offline,
+        "incremental": args.incremental,
+        "lookback_dias": args.lookback_dias,
+        "paralelo": args.paralelo,
+        "fatia_meses": args.fatia_meses,
+        "sql_local": args.sql_local,
+        "filtros": filtros_dos_argumentos(args),
+    }
+
+
+# Opções de load_fact_data que carregar_tabela não recebe: o caminho
+# incremental/paralelo e os filtros, que só existem para a QUERY_FACT.
+OPCOES_SO_FACT = ("incremental", "lookback_dias", "paralelo", "fatia_meses", "filtros")
+
+
+def opcoes_tabela(args):
+    """opcoes_fact sem OPCOES_SO_FACT: kwargs de carregar_tabela para as demais queries."""
+    return {k: v for k, v in opcoes_fact(args).items() if k not in OPCOES_SO_FACT}
+
+
+def carregar_tabela(query, conn=None, batch_size=None, limite_memoria_mb=None,
+                    ttl_horas=None, refresh=False, offline=False, atualizar=None,
+                    extrair=None, sql_local=None, cancelar=None, parametros=None,
+                    meta=None, reaproveitar=None, colunas=None):
+    """
+    Executa uma query no warehouse (ou lê o snapshot local) e devolve pyarrow.Table.
+
+    Se conn for None, a conexão só é aberta quando o snapshot local não serve,
+    e é encerrada logo após a extração. atualizar(tabela, executar) é a
+    atualização incremental opcional (ver incremental.py); extrair() substitui
+    a extração completa padrão (ver extracao_paralela.py). sql_local troca o
+    warehouse pelo motor local (ver abrir_conexao). cancelar (threading.Event)
+    cancela o statement em andamento (ver em_segundo_plano). parametros,
+    meta, reaproveitar e colunas seguem para o cache (ver carregar_com_cache).
+    """
+    from extracao import fetch_arrow, BATCH_SIZE_PADRAO, LIMITE_MEMORIA_MB_PADRAO
+    from cache_snapshot import carregar_com_cache, TTL_HORAS_PADRAO
+
+    conexao = {"atual": conn}
+
+    def executar(q, parametros_q=None):
+        if conexao["atual"] is None:
+            conexao["atual"] = abrir_conexao(sql_local)
+        return fetch_arrow(
+            conexao["atual"],
+            q,
+            batch_size=batch_size or BATCH_SIZE_PADRAO,
+            limite_memoria_mb=limite_memoria_mb or LIMITE_MEMORIA_MB_PADRAO,
+            cancelar=cancelar,
+            parametros=parametros_q,
+        )
+
+    def buscar():
+        if sql_local is None:
+            print("   Consultando o Databricks (isso pode levar alguns minutos)")
+        if extrair is not None:
+            return extrair()
+        return executar(query, parametros)
+
+    try:
+        return carregar_com_cache(
+            query,
+            buscar,
+            http_path=http_path_origem(sql_local),
+            ttl_horas=TTL_HORAS_PADRAO if ttl_horas is None else ttl_horas,
+            refresh=refresh,
+            offline=offline,
+            atualizar=(lambda tabela: atualizar(tabela, executar)) if atualizar else None,
+            parametros=parametros,
+            meta=meta,
+            reaproveitar=reaproveitar,
+            colunas=colunas,
+        )
+    finally:
+        if conn is None and conexao["atual"] is not None:
+            conexao["atual"].close()
+            if sql_local is None:
+                print("   🔒 Conexão Databricks encerrada.")
+
+
+def _consulta_filtrada(filtros, sql_local=None):
+    """(query, parâmetros, metadados, reaproveitar) da Fact, com ou sem filtros de auditoria."""
+    if not filtros:
+        return QUERY_FACT, None, None, None
+
+    from cache_snapshot import chave_snapshot
+    from consultas import montar_query_fact_filtrada
+    from filtros_fact import carregar_superconjunto, descrever
+
+    print(f"   🔎 Filtros: {descrever(filtros)}")
+    http_path = http_path_origem(sql_local)
+    query, parametros = montar_query_fact_filtrada(filtros)
+    meta = {"base": chave_snapshot(QUERY_FACT, http_path), "filtros": filtros}
+    return query, parametros, meta, lambda ttl_horas: carregar_superconjunto(filtros, http_path, ttl_horas)
+
+
+def load_fact_data(conn=None, batch_size=None, limite_memoria_mb=None,
+                   ttl_horas=None, refresh=False, offline=False,
+                   incremental=False, lookback_dias=None,
+                   paralelo=None, fatia_meses=None, sql_local=None, cancelar=None, filtros=None,
+                   colunas=None):
+    """
+    Carrega os dados da FactAprovacaoPrecoParceiro (snapshot local ou Databricks).
+
+    Com paralelo, a extração completa é feita em fatias mensais concorrentes
+    (extracao_paralela.py); o snapshot final é o mesmo da extração única.
+    Com filtros (filtros_fact.normalizar), a query leva os filtros como bind
+    parameters e um snapshot mais amplo em cache é reaproveitado se houver.
+    colunas (ex.: consultas.COLUNAS_AUDITORIA) limita o DataFrame a essas
+    colunas, lidas do snapshot sem as demais; sem InfoPrecoParceiro, as
+    colunas derivadas de preço parceiro não são calculadas.
+    """
+    from esquema import para_pandas
+    from transformacoes import derivar_preco_parceiro
+    from incremental import atualizar_incremental, LOOKBACK_DIAS_PADRAO
+    from extracao_paralela import extrair_em_fatias, FATIA_MESES_PADRAO
+
+    print("\n📊 Carregando FactAprovacaoPrecoParceiro...")
+    query, parametros, meta, reaproveitar = _consulta_filtrada(filtros, sql_local)
+    if filtros and (incremental or paralelo):
+        print("   ℹ️ --incremental/--paralelo valem só para a Fact completa; ignorados com filtros.")
+        incremental = paralelo = False
+
+    def atualizar(tabela, executar):
+        return atualizar_incremental(tabela, executar, lookback_dias or LOOKBACK_DIAS_PADRAO)
+
+    def extrair():
+        return extrair_em_fatias(
+            lambda: abrir_conexao(sql_local),
+            http_path_origem(sql_local),
+            paralelo=paralelo,
+            fatia_meses=fatia_meses or FATIA_MESES_PADRAO,
+            batch_size=batch_size,
+            limite_memoria_mb=limite_memoria_mb,
+            ttl_horas=ttl_horas,
+            refresh=refresh,
+            cancelar=cancelar,
+            conn=conn,
+        )
+
+    tabela = carregar_tabela(
+        query,
+        conn=conn,
+        batch_size=batch_size,
+        limite_memoria_mb=limite_memoria_mb,
+        ttl_horas=ttl_horas,
+        refresh=refresh,
+        offline=offline,
+        atualizar=atualizar if incremental else None,
+        extrair=extrair if paralelo else None,
+        sql_local=sql_local,
+        cancelar=cancelar,
+        parametros=parametros,
+        meta=meta,
+        reaproveitar=reaproveitar,
+        colunas=colunas,
+    )
+    df = para_pandas(derivar_preco_parceiro(tabela))
+    print(f"   ✅ {len(df):,} linhas carregadas ({df.memory_usage().sum() / 1024 ** 2:,.1f} MB em memória)")
     return df
 
 
-def load_formulario(excel_path=None):
-    """Carrega os dados do formulário (RespostasFormulario)."""
+def load_fact_agregada(conn=None, batch_size=None, limite_memoria_mb=None,
+                       ttl_horas=None, refresh=False, offline=False,
+                       incremental=False, lookback_dias=None,
+                       paralelo=None, fatia_meses=None, sql_local=None, cancelar=None, filtros=None):
+    """
+    Agregados da Fact calculados no warehouse (--pushdown, ver pushdown.py).
+
+    Devolve {"os_cliente", "cliente", "uf"} → DataFrame. O resultado agregado
+    é pequeno e sempre extraído por inteiro: incremental e paralelo não se aplicam.
+    """
+    from consultas import (
+        QUERY_FACT_AGREGADA, COLUNAS_FACT_AGREGADA, AGRUPAMENTO_FACT_AGREGADA, montar_query_fact_filtrada,
+    )
+    from filtros_fact import descrever
+    from pushdown import separar_niveis
+
+    print("\n📊 Agregando FactAprovacaoPrecoParceiro no Databricks (pushdown)...")
+    if incremental or paralelo:
+        print("   ℹ️ --incremental/--paralelo ignorados no modo pushdown.")
+    query, parametros = QUERY_FACT_AGREGADA, None
+    if filtros:
+        print(f"   🔎 Filtros: {descrever(filtros)}")
+        query, parametros = montar_query_fact_filtrada(
+            filtros, colunas=COLUNAS_FACT_AGREGADA, agrupamento=AGRUPAMENTO_FACT_AGREGADA,
+        )
+
+    tabela = carregar_tabela(
+        query,
+        conn=conn,
+        batch_size=batch_size,
+        limite_memoria_mb=limite_memoria_mb,
+        ttl_horas=ttl_horas,
+        refresh=refresh,
+        offline=offline,
+        sql_local=sql_local,
+        cancelar=cancelar,
+        parametros=parametros,
+    )
+    niveis = separar_niveis(tabela)
+    print(
+        f"   ✅ {len(niveis['os_cliente']):,} pares OS×cliente, "
+        f"{len(niveis['cliente']):,} clientes, {len(niveis['uf']):,} UFs"
+    )
+    return niveis
+
+
+@contextmanager
+def em_segundo_plano(carregar, **opcoes):
+    """
+    Roda carregar(**opcoes, cancelar=evento) em uma thread e devolve o futuro.
+
+    Enquanto o warehouse executa a query e os lotes chegam (e viram DataFrame),
+    a thread principal fica livre para a planilha do formulário. Se o bloco
+    terminar com exceção — inclusive Ctrl-C —, o evento é acionado, a
+    extração cancela o statement remoto e a thread é aguardada antes de sair.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    cancelar = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fact")
+    futuro = executor.submit(carregar, cancelar=cancelar, **opcoes)
+    try:
+        yield futuro
+    except BaseException:
+        if not futuro.done():
+            cancelar.set()
+            print("\n🛑 Cancelando a query da Fact no warehouse...")
+        raise
+    finally:
+        executor.shutdown(wait=True)
+
+
+def aguardar(futuro, intervalo=0.25):
+    """futuro.result() que continua atendendo Ctrl-C (no Windows o result() sem timeout não atende)."""
+    from concurrent.futures import TimeoutError as Pendente
+
+    while True:
+        try:
+            return futuro.result(timeout=intervalo)
+        except Pendente:
+            continue
+
+
+def run_validation(df_fact, df_form, col_itens=None):
+    """
+    Executa a validação comparativa COUNT vs DISTINCTCOUNT.
+
+    df_fact é a Fact item a item ou, com col_itens, os pares (OS, cliente) já
+    agregados no warehouse, onde col_itens é o nº de itens de cada par.
+    """
     import pandas as pd
+    from contagens import contagens_por_cliente
 
-    if excel_path and os.path.exists(excel_path):
-        print(f"\n📋 Carregando formulário de: {excel_path}")
-
-        # Listar abas disponíveis
-        xl = pd.ExcelFile(excel_path)
-        print(f"   Abas disponíveis: {xl.sheet_names}")
-
-        # Tentar nomes comuns
-        target_sheets = ["TabelaPrecoParceiro", "Respostas", "Form1", "Sheet1", "Planilha1"]
-        df = None
-
-        for sheet_name in target_sheets:
-            if sheet_name in xl.sheet_names:
-                df = pd.read_excel(excel_path, sheet_name=sheet_name)
-                print(f"   Usando aba: '{sheet_name}'")
-                break
-
-        if df is None:
-            # Se nenhuma aba conhecida, usa a primeira
-            first_sheet = xl.sheet_names[0]
-            df = pd.read_excel(excel_path, sheet_name=first_sheet)
-            print(f"   Usando primeira aba: '{first_sheet}'")
-
-        # Encontrar a coluna de número da ordem
-        col_ordem = None
-        for col in df.columns:
-            if "mero da ordem" in str(col).lower() or "numero" in str(col).lower().replace("ú", "u"):
-                col_ordem = col
-                break
-            if "ordem" in str(col).lower() and "n" in str(col).lower():
-                col_ordem = col
-                break
-
-        if col_ordem is None:
-            print(f"   Colunas encontradas: {list(df.columns)}")
-            # Tentar a coluna que mais parece ser um número de OS
-            for col in df.columns:
-                if "ordem" in str(col).lower():
-                    col_ordem = col
-                    break
-
-        if col_ordem is None:
-            print("   ❌ Não consegui identificar a coluna de número da ordem.")
-            print(f"   Colunas: {list(df.columns)}")
-            return None
-
-        print(f"   Coluna de OS: '{col_ordem}'")
-        df = df.rename(columns={col_ordem: "Número da ordem"})
-
-        # Encontrar a coluna de aceitação
-        col_aceite = None
-        for col in df.columns:
-            if "aceitou" in str(col).lower() or "aceita" in str(col).lower():
-                col_aceite = col
-                break
-
-        if col_aceite:
-            df = df.rename(columns={col_aceite: "EC aceitou a negociação?"})
-        else:
-            print("   ⚠️ Coluna 'EC aceitou a negociação?' não encontrada.")
-            print(f"   Colunas: {list(df.columns)}")
-
-        df["Número da ordem"] = df["Número da ordem"].astype(str).str.strip()
-        df = df[df["Número da ordem"].notna() & (df["Número da ordem"] != "") & (df["Número da ordem"] != "nan")]
-        print(f"   ✅ {len(df):,} respostas carregadas")
-        return df
+    if col_itens:
+        itens = df_fact[col_itens]
     else:
-        print("\n⚠️  Arquivo Excel do formulário não encontrado.")
-        print("   Procurando localmente...")
-        # Tentar encontrar o arquivo
-        possible_paths = [
-            os.path.expanduser("~/Downloads/Projeto Preço Parceiro.xlsx"),
-            os.path.expanduser("~/Documents/Projeto Preço Parceiro.xlsx"),
-            os.path.expanduser("~/OneDrive - EDENRED/Documents/Projeto Preço Parceiro.xlsx"),
-        ]
-        for p in possible_paths:
-            if os.path.exists(p):
-                print(f"   Encontrado: {p}")
-                return load_formulario(p)
-
-        print("   ❌ Não encontrado. Use --excel para informar o caminho.")
-        print("   O script vai continuar apenas com os dados do Databricks.\n")
-        return None
-
-
-def run_validation(df_fact, df_form):
-    """Executa a validação comparativa COUNT vs DISTINCTCOUNT."""
-    import pandas as pd
+        itens = pd.Series(1, index=df_fact.index)
 
     print("\n" + "=" * 80)
     print("  VALIDAÇÃO: COUNT vs DISTINCTCOUNT — Total de respostas formulário")
@@ -275,10 +453,11 @@ def run_validation(df_fact, df_form):
     if df_form is None:
         print("\n⚠️  Sem dados do formulário — análise parcial (apenas duplicatas na Fact).\n")
         # Mesmo sem formulário, podemos mostrar quantas OS são duplicadas na Fact
-        os_counts = df_fact.groupby("NumeroOS").size().reset_index(name="itens_por_os")
-        duplicadas = os_counts[os_counts["itens_por_os"] > 1]
-        total_os = len(os_counts)
-        total_linhas = len(df_fact)
+        with etapa("validacao.duplicatas"):
+            os_counts = itens.groupby(df_fact["NumeroOS"]).sum().reset_index(name="itens_por_os")
+            duplicadas = os_counts[os_counts["itens_por_os"] > 1]
+            total_os = len(os_counts)
+            total_linhas = int(itens.sum())
 
         print(f"  📊 Total de linhas na FactAprovacaoPrecoParceiro: {total_linhas:,}")
         print(f"  📊 Total de OS distintas: {total_os:,}")
@@ -290,10 +469,16 @@ def run_validation(df_fact, df_form):
         # Por cliente
         print("  📋 Top 10 clientes por fator de multiplicação:")
         print("  " + "-" * 76)
-        cliente_stats = df_fact.groupby("NomeCliente").agg(
-            total_linhas=("NumeroOS", "count"),
-            os_distintas=("NumeroOS", "nunique"),
-        ).reset_index()
+        with etapa("validacao.por_cliente"):
+            com_os = df_fact["NumeroOS"].notna()
+            cliente_stats = pd.DataFrame({
+                "NomeCliente": df_fact.loc[com_os, "NomeCliente"],
+                "NumeroOS": df_fact.loc[com_os, "NumeroOS"],
+                "itens": itens[com_os],
+            }).groupby("NomeCliente", observed=True).agg(
+                total_linhas=("itens", "sum"),
+                os_distintas=("NumeroOS", "nunique"),
+            ).reset_index()
         cliente_stats["fator"] = cliente_stats["total_linhas"] / cliente_stats["os_distintas"]
         cliente_stats = cliente_stats.sort_values("fator", ascending=False).head(10)
 
@@ -309,14 +494,12 @@ def run_validation(df_fact, df_form):
     # COM FORMULÁRIO: Comparação completa
     # ========================================
 
-    # Converter NumeroOS para string para fazer o join
-    df_fact["NumeroOS_str"] = df_fact["NumeroOS"].astype(str).str.strip()
-    df_form["NumeroOS_str"] = df_form["Número da ordem"].astype(str).str.strip()
-
+    # NumeroOS é chave inteira nos dois lados (esquema.py / formulario.py)
     # OS que têm formulário preenchido
-    os_com_formulario = set(df_form["NumeroOS_str"].unique())
-    os_na_fact = set(df_fact["NumeroOS_str"].unique())
-    os_match = os_com_formulario & os_na_fact
+    with etapa("validacao.resumo"):
+        os_com_formulario = set(df_form["NumeroOS"].dropna().unique())
+        os_na_fact = set(df_fact["NumeroOS"].dropna().unique())
+        os_match = os_com_formulario & os_na_fact
 
     print(f"\n  📊 Resumo geral:")
     print(f"     Respostas no formulário (linhas): {len(df_form):,}")
@@ -330,47 +513,14 @@ def run_validation(df_fact, df_form):
     print(f"\n  📋 Comparação COUNT vs DISTINCTCOUNT por Cliente:")
     print("  " + "=" * 100)
 
-    # Fazer o join many-to-many (simula o comportamento do Power BI)
-    # Cada linha da Fact se junta com cada resposta do formulário que tem o mesmo NumeroOS
-    df_fact_form = df_fact.merge(
-        df_form[["NumeroOS_str", "EC aceitou a negociação?"]],
-        on="NumeroOS_str",
-        how="inner"
-    )
-
-    # Agrupamento por cliente — simulando o visual da tabela
-    by_cliente = df_fact.groupby("NomeCliente").agg(
-        os_distintas=("NumeroOS_str", "nunique"),
-    ).reset_index()
-
-    # COUNT por cliente (o que o Power BI fazia ANTES da correção)
-    # Na realidade, o COUNT era sobre RespostasFormulario[Número da ordem]
-    # mas filtrado via o relacionamento com a Fact.
-    # O resultado é o número de linhas no join many-to-many.
-    count_por_cliente = df_fact_form.groupby("NomeCliente").agg(
-        count_formularios=("NumeroOS_str", "count"),
-    ).reset_index()
-
-    # DISTINCTCOUNT por cliente (o que o Power BI faz DEPOIS da correção)
-    distinctcount_por_cliente = df_fact_form.groupby("NomeCliente").agg(
-        distinctcount_formularios=("NumeroOS_str", "nunique"),
-    ).reset_index()
-
-    # Recusas com COUNT
-    df_recusas = df_fact_form[df_fact_form["EC aceitou a negociação?"] == "Não"]
-    count_recusas = df_recusas.groupby("NomeCliente").agg(
-        count_recusas=("NumeroOS_str", "count"),
-    ).reset_index()
-    distinctcount_recusas = df_recusas.groupby("NomeCliente").agg(
-        distinctcount_recusas=("NumeroOS_str", "nunique"),
-    ).reset_index()
-
-    # Merge tudo
-    resultado = by_cliente.merge(count_por_cliente, on="NomeCliente", how="left")
-    resultado = resultado.merge(distinctcount_por_cliente, on="NomeCliente", how="left")
-    resultado = resultado.merge(count_recusas, on="NomeCliente", how="left")
-    resultado = resultado.merge(distinctcount_recusas, on="NomeCliente", how="left")
-    resultado = resultado.fillna(0)
+    # O Power BI fazia COUNT sobre RespostasFormulario[Número da ordem] filtrado
+    # via o relacionamento many-to-many com a Fact: cada linha da Fact se junta
+    # com cada resposta da mesma OS. Em vez de materializar esse join, as
+    # contagens saem da multiplicidade por OS (itens na Fact × respostas).
+    # COUNT = o que o Power BI fazia ANTES da correção;
+    # DISTINCTCOUNT = o que faz DEPOIS da correção.
+    with etapa("validacao.contagens", linhas=len(df_fact)):
+        resultado = contagens_por_cliente(df_fact, df_form, col_itens=col_itens)
 
     # Calcular diferença
     resultado["diff_formularios"] = resultado["count_formularios"] - resultado["distinctcount_formularios"]
@@ -446,32 +596,99 @@ def main():
         default=None,
         help='Caminho para o arquivo "Projeto Preço Parceiro.xlsx" (opcional)',
     )
+    parser.add_argument(
+        "--pushdown",
+        action="store_true",
+        help="Agrega a Fact no Databricks e traz só os pares OS×cliente (ver pushdown.py)",
+    )
+    parser.add_argument(
+        "--assincrono",
+        action="store_true",
+        help="Carrega a Fact em segundo plano enquanto lê a planilha (Ctrl-C cancela a query)",
+    )
+    parser.add_argument(
+        "--distintas",
+        action="store_true",
+        help="Usa o formulário como RespostasFormularioDistintasOS (sem OS de teste, última resposta por OS)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Depois da validação, acompanha a planilha e atualiza as contagens a cada resposta nova (ver formulario_incremental.py)",
+    )
+    parser.add_argument(
+        "--intervalo",
+        type=float,
+        default=5.0,
+        help="Segundos entre as verificações da planilha no --watch (padrão: 5)",
+    )
+    parser.add_argument(
+        "--watch-cache",
+        action="store_true",
+        help="No --watch, regrava o cache da planilha a cada mudança (a próxima execução já começa dele)",
+    )
+    adicionar_argumentos_fact(parser)
+    perfil.adicionar_argumento(parser)
     args = parser.parse_args()
-
-    print("=" * 80)
-    print("  VALIDAÇÃO DE DADOS — Painel Preço Parceiro")
-    print(f"  {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
-    print("=" * 80)
-
-    try:
-        conn = get_databricks_connection()
-        df_fact = load_fact_data(conn)
-        df_form = load_formulario(args.excel)
-
-        run_validation(df_fact, df_form)
-
-        conn.close()
-        print("\n🔒 Conexão Databricks encerrada.")
-
-    except ImportError as e:
-        print(f"\n❌ Dependência faltando: {e}")
-        print("   Instale com: pip install databricks-sql-connector pandas openpyxl")
-        sys.exit(1)
-    except Exception as e:
-        print(f"\n❌ Erro: {e}")
-        import traceback
-        traceback.print_exc()
-        sys.exit(1)
+    if args.watch and args.distintas:
+        parser.error("--watch acompanha as respostas brutas por Id; não combina com --distintas")
+
+    with perfil.sessao(args.profile, "validar_formularios"):
+        print("=" * 80)
+        print("  VALIDAÇÃO DE DADOS — Painel Preço Parceiro")
+        print(f"  {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
+        print("=" * 80)
+
+        try:
+            from consultas import COLUNAS_AUDITORIA
+
+            opcoes = opcoes_fact(args)
+            if args.pushdown:
+                carregar_fact = load_fact_agregada
+            else:
+                carregar_fact = load_fact_data
+                opcoes["colunas"] = COLUNAS_AUDITORIA
+            excel_path = args.excel
+            if args.watch:
+                from formulario import assinatura_planilha, caminho_planilha
+
+                excel_path = caminho_planilha(args.excel)
+                if excel_path is None:
+                    print("\n❌ --watch precisa da planilha do formulário (use --excel).")
+                    sys.exit(1)
+                # Antes da leitura: uma gravação durante ela aparece no primeiro ciclo
+                assinatura = assinatura_planilha(excel_path)
+            if args.assincrono:
+                with em_segundo_plano(carregar_fact, **opcoes) as futuro:
+                    df_form = load_formulario(excel_path, distintas=args.distintas)
+                    df_fact = aguardar(futuro)
+            else:
+                df_fact = carregar_fact(**opcoes)
+                df_form = load_formulario(excel_path, distintas=args.distintas)
+            if args.pushdown:
+                df_fact = df_fact["os_cliente"]
+
+            run_validation(df_fact, df_form, col_itens="Itens" if args.pushdown else None)
+
+            if args.watch:
+                from formulario_incremental import vigiar
+
+                vigiar(excel_path, df_fact, df_form=df_form, assinatura=assinatura,
+                       col_itens="Itens" if args.pushdown else None,
+                       intervalo=args.intervalo, gravar_cache=args.watch_cache)
+
+        except KeyboardInterrupt:
+            print("\n⛔ Interrompido.")
+            sys.exit(130)
+        except ImportError as e:
+            print(f"\n❌ Dependência faltando: {e}")
+            print("   Instale com: pip install databricks-sql-connector pandas pyarrow openpyxl")
+            sys.exit(1)
+        except Exception as e:
+            print(f"\n❌ Erro: {e}")
+            import traceback
+            traceback.print_exc()
+            sys.exit(1)
 
 
 if __name__ == "__main__":